@@ -0,0 +1,487 @@
+"""Columnar analytics store mirrored from the transactional database.
+
+Finished games, their per-player results and their full state timelines are
+exported incrementally into Parquet part files and queried with DuckDB, so
+long-range reports never scan ``app.db`` while ingest is writing to it.
+
+Layout under ``ANALYTICS_DIR``::
+
+    manifest.json
+    games/part-<first>-<last>.parquet
+    results/part-<first>-<last>.parquet
+    states/part-<first>-<last>.parquet
+
+``manifest.json`` lists the live part files of each table and the export
+high-water mark: every game up to ``through`` is exported except the
+``open`` ones (still in progress at the time). Readers only open listed
+files and the manifest is replaced atomically, so a part becomes visible
+(and its games count as exported) in one step. Once
+``ANALYTICS_COMPACT_PARTS`` files of one size class pile up they are merged
+into a single ``L<level>-<first>-<last>.parquet``, keeping the file count
+logarithmic in the number of exports.
+
+Deleting the directory triggers a full re-export. A store written before
+the manifest existed is scanned once to rebuild it.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import models, schemas, timeline, utils
+from .database import AsyncSessionLocal, settings, sqlite_database_path
+
+try:  # pragma: no cover - exercised only when the optional dependency is missing
+    import duckdb
+except ImportError:  # pragma: no cover
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+_TABLES = {
+    "results": (
+        "game_id BIGINT, machine_id BIGINT, machine_name VARCHAR, player_id BIGINT, "
+        "initials VARCHAR, screen_name VARCHAR, player_number BIGINT, score BIGINT, played_at TIMESTAMP"
+    ),
+    "states": (
+        "game_id BIGINT, timestamp TIMESTAMP, seconds_elapsed BIGINT, ball BIGINT, "
+        "player_up BIGINT, player_number BIGINT, score BIGINT"
+    ),
+    # Written last: a games part marks its batch as exported.
+    "games": (
+        "id BIGINT, machine_id BIGINT, machine_name VARCHAR, machine_uid VARCHAR, "
+        "start_time TIMESTAMP, end_time TIMESTAMP, play_seconds BIGINT, player_count BIGINT"
+    ),
+}
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """Raised when DuckDB is not installed."""
+
+
+def available() -> bool:
+    return duckdb is not None
+
+
+def analytics_dir() -> Path:
+    if settings.ANALYTICS_DIR:
+        return Path(settings.ANALYTICS_DIR).expanduser().resolve()
+    database_path = sqlite_database_path()
+    if database_path:
+        return database_path.parent / "analytics"
+    return Path("./data/analytics").resolve()
+
+
+def _naive_utc(dt: datetime | None) -> datetime | None:
+    # DuckDB's TIMESTAMP is timezone-naive; everything is stored as UTC.
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+_PART_NAME = re.compile(r"^(?:part|L(\d+))-(\d+)-(\d+)\.parquet$")
+
+
+@dataclass
+class _Manifest:
+    # Every game id up to ``through`` is exported, except the ``open`` ones.
+    through: int = 0
+    open: list[int] = field(default_factory=list)
+    # Table -> live part file names.
+    files: dict[str, list[str]] = field(default_factory=lambda: {table: [] for table in _TABLES})
+
+
+def _manifest_path() -> Path:
+    return analytics_dir() / "manifest.json"
+
+
+def _read_manifest() -> _Manifest | None:
+    try:
+        raw = json.loads(_manifest_path().read_text())
+    except FileNotFoundError:
+        return None
+    files = {table: list(raw.get("files", {}).get(table, [])) for table in _TABLES}
+    return _Manifest(through=int(raw.get("through", 0)), open=list(raw.get("open", [])), files=files)
+
+
+def _write_manifest(manifest: _Manifest) -> None:
+    path = _manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".json.tmp")
+    temp_path.write_text(json.dumps({"through": manifest.through, "open": manifest.open, "files": manifest.files}))
+    os.replace(temp_path, path)
+
+
+def _parts(table: str) -> list[str]:
+    directory = analytics_dir() / table
+    manifest = _read_manifest()
+    if manifest is not None:
+        return [str(directory / name) for name in manifest.files[table]]
+    if not directory.exists():
+        return []
+    return sorted(str(path) for path in directory.glob("*.parquet"))
+
+
+def _connect():
+    if duckdb is None:
+        raise AnalyticsUnavailable("duckdb is not installed")
+    return duckdb.connect()
+
+
+def _load_manifest() -> tuple[_Manifest, set[int] | None]:
+    """The manifest, plus the exported ids when it had to be rebuilt from the parts."""
+
+    manifest = _read_manifest()
+    if manifest is not None:
+        return manifest, None
+    manifest = _Manifest(files={table: [Path(part).name for part in _parts(table)] for table in _TABLES})
+    parts = _parts("games")
+    if not parts:
+        return manifest, set()
+    with _connect() as conn:
+        rows = conn.execute("SELECT id FROM read_parquet(?)", [parts]).fetchall()
+    return manifest, {row[0] for row in rows}
+
+
+def _part_level(name: str) -> tuple[int, int, int]:
+    match = _PART_NAME.match(name)
+    if match is None:
+        return (0, 0, 0)
+    level, first, last = match.groups()
+    return (int(level or 0), int(first), int(last))
+
+
+def _merge(conn, table: str, names: list[str], level: int) -> str:
+    directory = analytics_dir() / table
+    first, last = _part_level(names[0])[1], _part_level(names[-1])[2]
+    name = f"L{level}-{first}-{last}.parquet"
+    temp_path = directory / f"{name}.tmp"
+    quoted = str(temp_path).replace("'", "''")
+    conn.execute(
+        f"COPY (SELECT * FROM read_parquet(?)) TO '{quoted}' (FORMAT PARQUET)",
+        [[str(directory / part) for part in names]],
+    )
+    os.replace(temp_path, directory / name)
+    return name
+
+
+def _compact(manifest: _Manifest, threshold: int) -> int:
+    """Merge every ``threshold`` parts of one level into one; returns the parts merged.
+
+    The manifest is rewritten before the merged parts are deleted, so readers
+    always see each row exactly once.
+    """
+
+    if threshold < 2:
+        return 0
+    replaced: list[Path] = []
+    with _connect() as conn:
+        for table in _TABLES:
+            names = sorted(manifest.files[table], key=lambda name: _part_level(name)[1:])
+            level = 0
+            while True:
+                at_level = [name for name in names if _part_level(name)[0] == level]
+                if len(at_level) < threshold:
+                    if not any(_part_level(name)[0] > level for name in names):
+                        break
+                    level += 1
+                    continue
+                batch = at_level[:threshold]
+                merged = _merge(conn, table, batch, level + 1)
+                names = sorted(
+                    [name for name in names if name not in batch] + [merged],
+                    key=lambda name: _part_level(name)[1:],
+                )
+                replaced.extend(analytics_dir() / table / name for name in batch)
+            manifest.files[table] = names
+    if replaced:
+        _write_manifest(manifest)
+        for path in replaced:
+            path.unlink(missing_ok=True)
+    return len(replaced)
+
+
+async def _game_rows(db: AsyncSession, game: models.Game) -> tuple[tuple, list[tuple], list[tuple]]:
+    states = await timeline.load_timeline(db, game.id)
+    if states is None:
+        result = await db.execute(
+            select(models.GameState)
+            .where(models.GameState.game_id == game.id)
+            .order_by(models.GameState.timestamp.asc(), models.GameState.id.asc())
+        )
+        states = result.scalars().all()
+
+    machine_name = game.machine.name if game.machine else None
+    final_scores = utils.score_map(states[-1].scores) if states else {}
+    played_at = _naive_utc(states[-1].timestamp if states else game.end_time or game.start_time)
+
+    game_row = (
+        game.id,
+        game.machine_id,
+        machine_name,
+        game.machine.uid if game.machine else None,
+        _naive_utc(game.start_time),
+        _naive_utc(game.end_time),
+        int(states[-1].seconds_elapsed or 0) if states else 0,
+        len(game.game_players),
+    )
+    result_rows = [
+        (
+            game.id,
+            game.machine_id,
+            machine_name,
+            game_player.player_id,
+            game_player.player.initials if game_player.player else None,
+            game_player.player.screen_name if game_player.player else None,
+            game_player.player_number,
+            final_scores.get(game_player.player_number, 0),
+            played_at,
+        )
+        for game_player in game.game_players
+    ]
+    state_rows = [
+        (
+            game.id,
+            _naive_utc(state.timestamp),
+            state.seconds_elapsed,
+            state.ball,
+            state.player_up,
+            player_number,
+            score,
+        )
+        for state in states
+        for player_number, score in utils.score_map(state.scores).items()
+    ]
+    return game_row, result_rows, state_rows
+
+
+def _write_parts(name: str, rows: dict[str, list[tuple]], manifest: _Manifest, game_ids: list[int]) -> list[str]:
+    """Write one part per table, then list them and mark ``game_ids`` exported."""
+
+    written: list[str] = []
+    with _connect() as conn:
+        for table, columns in _TABLES.items():
+            if not rows[table]:
+                continue
+            conn.execute(f"CREATE OR REPLACE TABLE {table} ({columns})")
+            placeholders = ", ".join("?" for _ in columns.split(", "))
+            conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows[table])
+
+            directory = analytics_dir() / table
+            directory.mkdir(parents=True, exist_ok=True)
+            final_path = directory / f"{name}.parquet"
+            temp_path = directory / f"{name}.parquet.tmp"
+            quoted = str(temp_path).replace("'", "''")
+            conn.execute(f"COPY {table} TO '{quoted}' (FORMAT PARQUET)")
+            os.replace(temp_path, final_path)
+            if final_path.name not in manifest.files[table]:
+                manifest.files[table].append(final_path.name)
+            written.append(str(final_path))
+    # Readers only see the parts once the manifest lists them.
+    exported = set(game_ids)
+    manifest.open = [game_id for game_id in manifest.open if game_id not in exported]
+    _write_manifest(manifest)
+    return written
+
+
+async def export_finished_games(batch_size: int | None = None) -> schemas.AnalyticsExportReport:
+    """Mirror finished games that are not yet in the analytics store."""
+
+    report = schemas.AnalyticsExportReport()
+    if not available():
+        logger.info("Skipping analytics export; duckdb is not installed")
+        return report
+
+    batch = max(batch_size or settings.ANALYTICS_BATCH_SIZE, 1)
+    manifest, exported = await asyncio.to_thread(_load_manifest)
+
+    async with AsyncSessionLocal() as db:
+        query = select(models.Game.id, models.Game.is_active).order_by(models.Game.id)
+        if exported is None:
+            # Only games past the high-water mark or left open below it.
+            query = query.where(or_(models.Game.id > manifest.through, models.Game.id.in_(manifest.open)))
+        games = (await db.execute(query)).all()
+        pending = [
+            game_id for game_id, is_active in games if not is_active and (exported is None or game_id not in exported)
+        ]
+        if games:
+            manifest.through = max(manifest.through, games[-1].id)
+        # Games still in progress stay open until an export after they finish.
+        manifest.open = [game_id for game_id, is_active in games if is_active] + pending
+        await asyncio.to_thread(_write_manifest, manifest)
+
+        for start in range(0, len(pending), batch):
+            chunk = pending[start : start + batch]
+            games = await db.execute(
+                select(models.Game)
+                .where(models.Game.id.in_(chunk))
+                .options(
+                    selectinload(models.Game.machine),
+                    selectinload(models.Game.game_players).selectinload(models.GamePlayer.player),
+                )
+                .order_by(models.Game.id)
+            )
+            rows: dict[str, list[tuple]] = {table: [] for table in _TABLES}
+            for game in games.scalars().unique().all():
+                game_row, result_rows, state_rows = await _game_rows(db, game)
+                rows["games"].append(game_row)
+                rows["results"].extend(result_rows)
+                rows["states"].extend(state_rows)
+            # Release the read transaction before the (slow) Parquet write.
+            await db.commit()
+
+            files = await asyncio.to_thread(_write_parts, f"part-{chunk[0]}-{chunk[-1]}", rows, manifest, chunk)
+            report.games_exported += len(rows["games"])
+            report.results_exported += len(rows["results"])
+            report.states_exported += len(rows["states"])
+            report.files_written += len(files)
+
+    report.parts_merged = await asyncio.to_thread(_compact, manifest, settings.ANALYTICS_COMPACT_PARTS)
+    logger.info(
+        "Analytics export wrote %s games (%s results, %s states) in %s files, merged %s parts",
+        report.games_exported,
+        report.results_exported,
+        report.states_exported,
+        report.files_written,
+        report.parts_merged,
+    )
+    return report
+
+
+def _query_top_scores(year: int | None, machine_id: int | None, limit: int) -> list[tuple]:
+    parts = _parts("results")
+    if not parts:
+        return []
+
+    filters = ["player_id IS NOT NULL"]
+    params: list[object] = [parts]
+    if year is not None:
+        filters.append("year(played_at) = ?")
+        params.append(year)
+    if machine_id is not None:
+        filters.append("machine_id = ?")
+        params.append(machine_id)
+    params.append(limit)
+
+    with _connect() as conn:
+        return conn.execute(
+            f"""
+            SELECT player_id,
+                   arg_max(initials, score) AS initials,
+                   arg_max(screen_name, score) AS screen_name,
+                   max(score) AS score,
+                   arg_max(machine_name, score) AS machine_name,
+                   arg_max(game_id, score) AS game_id,
+                   max(played_at) AS last_played,
+                   count(DISTINCT game_id) AS games_played
+            FROM read_parquet(?)
+            WHERE {" AND ".join(filters)}
+            GROUP BY player_id
+            ORDER BY score DESC, last_played DESC
+            LIMIT ?
+            """,
+            params,
+        ).fetchall()
+
+
+def _query_machine_stats(year: int | None) -> list[tuple]:
+    games_parts, results_parts = _parts("games"), _parts("results")
+    if not games_parts:
+        return []
+
+    year_filter = "WHERE year(g.start_time) = ?" if year is not None else ""
+    params: list[object] = [games_parts]
+    if year is not None:
+        params.append(year)
+
+    with _connect() as conn:
+        games = conn.execute(
+            f"""
+            SELECT g.machine_id,
+                   any_value(g.machine_name) AS machine_name,
+                   count(*) AS games_played,
+                   sum(g.play_seconds) AS play_seconds,
+                   max(g.end_time) AS last_played
+            FROM read_parquet(?) g
+            {year_filter}
+            GROUP BY g.machine_id
+            ORDER BY games_played DESC, g.machine_id
+            """,
+            params,
+        ).fetchall()
+
+        top_scores: dict[int, tuple[int, int]] = {}
+        if results_parts:
+            params = [results_parts]
+            if year is not None:
+                params.append(year)
+            for machine, best, players in conn.execute(
+                f"""
+                SELECT machine_id, max(score), count(DISTINCT player_id)
+                FROM read_parquet(?)
+                {"WHERE year(played_at) = ?" if year is not None else ""}
+                GROUP BY machine_id
+                """,
+                params,
+            ).fetchall():
+                top_scores[machine] = (best, players)
+
+    return [(*row, *top_scores.get(row[0], (None, 0))) for row in games]
+
+
+async def _query(query, *args) -> list[tuple]:
+    try:
+        return await asyncio.to_thread(query, *args)
+    except duckdb.IOException:
+        # A compaction removed a part between reading the manifest and opening it.
+        return await asyncio.to_thread(query, *args)
+
+
+async def top_scores(
+    *, year: int | None = None, machine_id: int | None = None, limit: int = 10
+) -> list[schemas.AnalyticsLeaderboardEntry]:
+    if not available():
+        raise AnalyticsUnavailable("duckdb is not installed")
+    rows = await _query(_query_top_scores, year, machine_id, limit)
+    return [
+        schemas.AnalyticsLeaderboardEntry(
+            player_id=player_id,
+            initials=initials or "---",
+            screen_name=screen_name,
+            score=int(score or 0),
+            machine_name=machine_name,
+            game_id=game_id,
+            last_played=utils.ensure_utc(last_played),
+            games_played=int(games_played or 0),
+        )
+        for player_id, initials, screen_name, score, machine_name, game_id, last_played, games_played in rows
+    ]
+
+
+async def machine_stats(*, year: int | None = None) -> list[schemas.AnalyticsMachineStats]:
+    if not available():
+        raise AnalyticsUnavailable("duckdb is not installed")
+    rows = await _query(_query_machine_stats, year)
+    return [
+        schemas.AnalyticsMachineStats(
+            machine_id=machine_id,
+            machine_name=machine_name,
+            games_played=int(games_played or 0),
+            play_seconds=int(play_seconds or 0),
+            last_played=utils.ensure_utc(last_played),
+            top_score=int(top_score) if top_score is not None else None,
+            unique_players=int(players or 0),
+        )
+        for machine_id, machine_name, games_played, play_seconds, last_played, top_score, players in rows
+    ]
@@ -0,0 +1,52 @@
+"""Periodic maintenance jobs tied to the application lifespan."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_periodically(
+    name: str, interval_seconds: float, job: Callable[[], Awaitable[object]]
+) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # pragma: no cover - safeguard
+            logger.exception("Background job %s failed", name)
+
+
+async def _run_once(name: str, job: Callable[[], Awaitable[object]]) -> None:
+    try:
+        await job()
+    except asyncio.CancelledError:
+        raise
+    except Exception:  # pragma: no cover - safeguard
+        logger.exception("Background job %s failed", name)
+
+
+def start_once(name: str, job: Callable[[], Awaitable[object]]) -> asyncio.Task:
+    """Run ``job`` once in the background; await the task to wait for it."""
+
+    return asyncio.create_task(_run_once(name, job), name=name)
+
+
+def start_periodic(
+    name: str, interval_seconds: float, job: Callable[[], Awaitable[object]]
+) -> asyncio.Task | None:
+    if interval_seconds <= 0:
+        logger.info("Background job %s disabled", name)
+        return None
+    logger.info("Scheduling background job %s every %ss", name, interval_seconds)
+    return asyncio.create_task(_run_periodically(name, interval_seconds, job), name=name)
+
+
+async def stop_tasks(tasks: list[asyncio.Task | None]) -> None:
+    running = [task for task in tasks if task is not None]
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
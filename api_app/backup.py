@@ -0,0 +1,219 @@
+"""Online backups of the SQLite database.
+
+Backups use SQLite's online backup API from a worker thread. Pages are copied
+``BACKUP_PAGES_PER_STEP`` at a time with a short sleep between steps, so the
+source is only read-locked while a step runs and ingest commits slot in
+between steps instead of waiting for the whole copy.
+
+A write from another connection makes SQLite restart the copy on its next
+step. Each restart doubles the step size, so the next attempt needs fewer
+steps and is less likely to be caught by a write. After
+``BACKUP_MAX_RESTARTS`` restarts the last attempt copies everything in one
+step: a single read transaction that no write can restart. The database runs
+in WAL mode (see :mod:`.database`), so that read does not block ingest.
+"""
+
+import asyncio
+import gzip
+import logging
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from . import schemas, utils
+from .database import settings, sqlite_database_path
+
+logger = logging.getLogger(__name__)
+
+_BACKUP_SUFFIXES = (".db", ".db.gz")
+_backup_lock = utils.LoopLock()
+_backup_running = False
+
+
+class BackupUnavailable(RuntimeError):
+    """Raised when the configured database cannot be backed up."""
+
+
+class BackupInProgress(RuntimeError):
+    """Raised when a backup is requested while another one is running."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def backup_dir() -> Path:
+    if settings.BACKUP_DIR:
+        return Path(settings.BACKUP_DIR).expanduser().resolve()
+    database_path = sqlite_database_path()
+    if database_path:
+        return database_path.parent / "backups"
+    return Path("./data/backups").resolve()
+
+
+def _is_backup(path: Path) -> bool:
+    return path.is_file() and path.name.endswith(_BACKUP_SUFFIXES)
+
+
+def list_backups() -> list[schemas.BackupFile]:
+    directory = backup_dir()
+    if not directory.exists():
+        return []
+    files = sorted((path for path in directory.iterdir() if _is_backup(path)), key=lambda path: path.name)
+    return [
+        schemas.BackupFile(
+            name=path.name,
+            size_bytes=path.stat().st_size,
+            created_at=datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc),
+        )
+        for path in reversed(files)
+    ]
+
+
+def _copy_database(
+    source: Path, target: Path, pages: int, sleep_seconds: float, max_restarts: int
+) -> tuple[int, int]:
+    """Copy ``source`` into ``target`` and return ``(page_count, restarts)``."""
+
+    restarts = 0
+    last_remaining: int | None = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal last_remaining
+        # Without a restart every step leaves fewer pages to copy.
+        if last_remaining is not None and remaining >= last_remaining:
+            raise _Restarted
+        last_remaining = remaining
+        # Sleeping here (rather than relying on ``sleep``, which only applies
+        # to BUSY/LOCKED) releases the source between every step.
+        time.sleep(sleep_seconds)
+
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        dst = sqlite3.connect(target)
+        try:
+            step = max(pages, 1)
+            while restarts < max_restarts:
+                last_remaining = None
+                try:
+                    src.backup(dst, pages=step, progress=progress, sleep=sleep_seconds)
+                    break
+                except _Restarted:
+                    restarts += 1
+                    step *= 2
+            else:
+                # One step reads a single snapshot, so writes cannot restart it.
+                src.backup(dst, pages=-1, sleep=sleep_seconds)
+            check = dst.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"Backup failed integrity check: {check}")
+            page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    return page_count, restarts
+
+
+def _compress(path: Path) -> Path:
+    final_path = path.with_name(path.name + ".gz")
+    temp_path = path.with_name(final_path.name + ".tmp")
+    with path.open("rb") as raw, gzip.open(temp_path, "wb", compresslevel=6) as compressed:
+        shutil.copyfileobj(raw, compressed, length=1024 * 1024)
+    temp_path.replace(final_path)
+    path.unlink()
+    return final_path
+
+
+def _rotate(directory: Path, keep: int) -> list[str]:
+    if keep <= 0:
+        return []
+    backups = sorted((path for path in directory.iterdir() if _is_backup(path)), key=lambda path: path.name)
+    removed = []
+    for path in backups[:-keep]:
+        path.unlink(missing_ok=True)
+        removed.append(path.name)
+    return removed
+
+
+def _run_backup(source: Path, directory: Path, compress: bool, keep: int) -> schemas.BackupReport:
+    started = time.perf_counter()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    final_path = directory / f"{source.stem}-{stamp}.db"
+    # The ``.tmp`` suffix keeps partial copies out of listings and rotation.
+    temp_path = directory / f"{final_path.name}.tmp"
+
+    try:
+        pages, restarts = _copy_database(
+            source,
+            temp_path,
+            settings.BACKUP_PAGES_PER_STEP,
+            settings.BACKUP_STEP_SLEEP_SECONDS,
+            settings.BACKUP_MAX_RESTARTS,
+        )
+        temp_path.replace(final_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+    database_bytes = final_path.stat().st_size
+    if compress:
+        final_path = _compress(final_path)
+
+    return schemas.BackupReport(
+        name=final_path.name,
+        size_bytes=final_path.stat().st_size,
+        database_bytes=database_bytes,
+        pages=pages,
+        restarts=restarts,
+        compressed=compress,
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        removed=_rotate(directory, keep),
+    )
+
+
+async def create_backup(
+    *, compress: bool | None = None, keep: int | None = None
+) -> schemas.BackupReport:
+    """Write a consistent copy of the database into ``backup_dir()``."""
+
+    source = sqlite_database_path()
+    if source is None or not source.exists():
+        raise BackupUnavailable("Backups require a file-backed SQLite database")
+    global _backup_running
+    if _backup_running:
+        raise BackupInProgress("A backup is already running")
+
+    async with _backup_lock:
+        _backup_running = True
+        try:
+            report = await asyncio.to_thread(
+                _run_backup,
+                source,
+                backup_dir(),
+                settings.BACKUP_COMPRESS if compress is None else compress,
+                settings.BACKUP_KEEP if keep is None else keep,
+            )
+        finally:
+            _backup_running = False
+
+    logger.info(
+        "Backup %s written: %sB from %sB in %sms (restarts=%s, rotated=%s)",
+        report.name,
+        report.size_bytes,
+        report.database_bytes,
+        report.duration_ms,
+        report.restarts,
+        len(report.removed),
+    )
+    return report
+
+
+async def run_scheduled_backup() -> schemas.BackupReport | None:
+    try:
+        return await create_backup()
+    except (BackupUnavailable, BackupInProgress) as exc:
+        logger.info("Skipping scheduled backup: %s", exc)
+        return None
@@ -0,0 +1,166 @@
+"""Commit-time change notifications for in-process read models.
+
+ORM flushes are collected per session and published once the transaction
+commits, so caches never observe rolled-back writes. Bulk ``UPDATE``/``DELETE``
+statements and schema create/drop cannot name the rows they touch and are
+published as a full change for the affected tables.
+
+Every publication bumps :func:`data_version`, which doubles as a cheap
+"has anything changed" token for response caches.
+
+A writer that applies its own change to a read model right after commit
+can :func:`tag` the session with an origin; the read model then skips the
+published change set instead of reloading it.
+
+A bulk statement that knows which rows it writes can say so with
+:func:`bulk_rows`; it is then published as a change to those rows only.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "pending_changes"
+_ORIGIN_KEY = "change_origin"
+_ROWS_OPTION = "changed_rows"
+_subscribers: list[Callable[["ChangeSet"], None]] = []
+_version = 0
+
+
+@dataclass
+class ChangeSet:
+    # Table name -> primary keys written in the transaction.
+    rows: dict[str, set] = field(default_factory=dict)
+    # Games whose rows (or child rows) were written.
+    game_ids: set[int] = field(default_factory=set)
+    # Tables changed in ways that cannot be attributed to rows.
+    full_tables: set[str] = field(default_factory=set)
+    # Schema was dropped or created; every read model must rebuild.
+    reset: bool = False
+    # Set by the writer with tag(); None for untagged or mixed changes.
+    origin: str | None = None
+
+    def touches(self, *tables: str) -> bool:
+        return self.reset or any(table in self.rows or table in self.full_tables for table in tables)
+
+    def is_full(self, *tables: str) -> bool:
+        return self.reset or any(table in self.full_tables for table in tables)
+
+    def ids(self, table: str) -> set:
+        return self.rows.get(table, set())
+
+    def merge(self, other: "ChangeSet") -> None:
+        for table, ids in other.rows.items():
+            self.rows.setdefault(table, set()).update(ids)
+        self.game_ids.update(other.game_ids)
+        self.full_tables.update(other.full_tables)
+        self.reset = self.reset or other.reset
+        if self.origin != other.origin:
+            self.origin = None
+
+    def __bool__(self) -> bool:
+        return bool(self.rows or self.full_tables or self.reset)
+
+
+def subscribe(callback: Callable[[ChangeSet], None]) -> None:
+    """Register ``callback`` to run synchronously after each committed change."""
+
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def tag(session, origin: str) -> None:
+    """Mark the changes ``session`` commits next as coming from ``origin``."""
+
+    session.info[_ORIGIN_KEY] = origin
+
+
+def bulk_rows(ids: Iterable) -> dict:
+    """Execution options naming the primary keys a bulk UPDATE/DELETE writes."""
+
+    return {_ROWS_OPTION: frozenset(ids)}
+
+
+def data_version() -> int:
+    return _version
+
+
+def publish(changes: ChangeSet) -> None:
+    global _version
+    if not changes:
+        return
+    _version += 1
+    for callback in list(_subscribers):
+        try:
+            callback(changes)
+        except Exception:  # pragma: no cover - safeguard
+            logger.exception("Change subscriber %r failed", callback)
+
+
+def _pending(session: Session) -> ChangeSet:
+    return session.info.setdefault(_PENDING_KEY, ChangeSet())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_rows(session: Session, flush_context) -> None:
+    pending = _pending(session)
+    for instances in (session.new, session.dirty, session.deleted):
+        for instance in instances:
+            table = getattr(instance, "__tablename__", None)
+            if table is None:
+                continue
+            state = inspect(instance)
+            # New rows have no identity key until the flush finishes.
+            primary_key = state.mapper.primary_key_from_instance(instance)
+            if primary_key and primary_key[0] is not None:
+                pending.rows.setdefault(table, set()).add(primary_key[0])
+            if table == "games":
+                pending.game_ids.add(instance.id)
+            elif getattr(instance, "game_id", None) is not None:
+                pending.game_ids.add(instance.game_id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_statements(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    pending = _pending(orm_execute_state.session)
+    table = mapper.local_table.name
+    ids = orm_execute_state.execution_options.get(_ROWS_OPTION)
+    if ids is None:
+        pending.full_tables.add(table)
+        return
+    pending.rows.setdefault(table, set()).update(ids)
+    if table == "games":
+        pending.game_ids.update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    changes = session.info.pop(_PENDING_KEY, None)
+    origin = session.info.pop(_ORIGIN_KEY, None)
+    if changes:
+        changes.origin = origin
+        publish(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_ORIGIN_KEY, None)
+
+
+@event.listens_for(Base.metadata, "after_create")
+@event.listens_for(Base.metadata, "after_drop")
+def _publish_schema_reset(target, connection, **kw) -> None:
+    publish(ChangeSet(reset=True))
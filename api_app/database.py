@@ -1,6 +1,8 @@
+import time
 from pathlib import Path
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import event, inspect, text
 from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
@@ -11,6 +13,29 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str = f"sqlite+aiosqlite:///{Path('./data/app.db').resolve()}"
     LOAD_SAMPLE_DATA: bool = True
+    RETENTION_DAYS: int = 90
+    RETENTION_INTERVAL_SECONDS: int = 60 * 60
+    RETENTION_BATCH_SIZE: int = 25
+    ARCHIVE_DIR: str | None = None
+    COMPACT_TIMELINES: bool = True
+    ANALYTICS_DIR: str | None = None
+    ANALYTICS_EXPORT_INTERVAL_SECONDS: int = 15 * 60
+    ANALYTICS_BATCH_SIZE: int = 200
+    ANALYTICS_COMPACT_PARTS: int = 8
+    BACKUP_DIR: str | None = None
+    BACKUP_INTERVAL_SECONDS: int = 6 * 60 * 60
+    BACKUP_KEEP: int = 7
+    BACKUP_COMPRESS: bool = True
+    BACKUP_PAGES_PER_STEP: int = 256
+    BACKUP_STEP_SLEEP_SECONDS: float = 0.005
+    BACKUP_MAX_RESTARTS: int = 3
+    RESPONSE_CACHE_TTL_SECONDS: float = 10
+    PROFILE_QUERY_BUDGET_MS: int = 500
+    STANDINGS_CONCURRENCY: int = 4
+    STANDINGS_TIMEOUT_SECONDS: float = 2.0
+    LIVE_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    GAME_IDLE_TIMEOUT_SECONDS: int = 15 * 60
+    GAME_SWEEP_INTERVAL_SECONDS: int = 60
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -24,10 +49,27 @@ def _prepare_sqlite_storage(database_url: str) -> None:
         Path(url.database).expanduser().parent.mkdir(parents=True, exist_ok=True)
 
 
+def sqlite_database_path(database_url: str | None = None) -> Path | None:
+    url = make_url(database_url or settings.DATABASE_URL)
+    if url.drivername.startswith("sqlite") and url.database not in (None, "", ":memory:"):
+        return Path(url.database).expanduser().resolve()
+    return None
+
+
 _prepare_sqlite_storage(settings.DATABASE_URL)
 
 engine = create_async_engine(settings.DATABASE_URL, echo=False)
 
+
+if sqlite_database_path() is not None:
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _use_wal(dbapi_connection, connection_record) -> None:
+        # Readers (backups, long reports) then never block ingest's commits.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -39,17 +81,86 @@ class Base(DeclarativeBase):
     pass
 
 
+# Bump whenever tables, columns or indexes change so existing databases run
+# ``create_all`` and the idempotent upgrades below on their next boot.
+SCHEMA_VERSION = 3
+
+# ``create_all`` only creates missing tables; objects added to existing
+# tables are created here.
+SCHEMA_UPGRADES = (
+    "CREATE INDEX IF NOT EXISTS ix_game_states_game_id_timestamp ON game_states (game_id, timestamp)",
+)
+
+# Columns added to existing tables, as (table, column, SQL type).
+SCHEMA_COLUMNS = (
+    ("leaderboard_profiles", "compiled_sql", "TEXT"),
+    ("leaderboard_profiles", "query_plan", "JSON"),
+    ("leaderboard_profiles", "compiled_at", "DATETIME"),
+)
+
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
 
-async def init_db():
+def _read_schema_meta(conn) -> dict[str, str]:
+    if not inspect(conn).has_table("schema_meta"):
+        return {}
+    rows = conn.execute(text("SELECT key, value FROM schema_meta"))
+    return {key: value for key, value in rows}
+
+
+def _add_missing_columns(conn) -> None:
+    inspector = inspect(conn)
+    for table, column, sql_type in SCHEMA_COLUMNS:
+        existing = {info["name"] for info in inspector.get_columns(table)}
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+
+
+def _write_schema_meta(conn, key: str, value: str) -> None:
+    conn.execute(
+        text(
+            "INSERT INTO schema_meta (key, value, updated_at) VALUES (:key, :value, CURRENT_TIMESTAMP) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at"
+        ),
+        {"key": key, "value": value},
+    )
+
+
+async def init_db() -> dict[str, float]:
+    """Create the schema and seed demo data unless ``schema_meta`` says it is done.
+
+    Returns per-phase timings in milliseconds so startup cost stays visible.
+    """
+
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        meta = await conn.run_sync(_read_schema_meta)
+        timings["schema_check"] = (time.perf_counter() - started) * 1000
+
+        if meta.get("schema_version") != str(SCHEMA_VERSION):
+            phase = time.perf_counter()
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_add_missing_columns)
+            for statement in SCHEMA_UPGRADES:
+                await conn.execute(text(statement))
+            await conn.run_sync(_write_schema_meta, "schema_version", str(SCHEMA_VERSION))
+            timings["schema_create"] = (time.perf_counter() - phase) * 1000
 
     if settings.LOAD_SAMPLE_DATA:
-        from .sample_data import seed_example_data
-
-        async with AsyncSessionLocal() as session:
-            await seed_example_data(session)
+        from .sample_data import SEED_VERSION, seed_example_data
+
+        if meta.get("seed_version") != str(SEED_VERSION):
+            phase = time.perf_counter()
+            async with AsyncSessionLocal() as session:
+                await seed_example_data(session)
+            async with engine.begin() as conn:
+                await conn.run_sync(_write_schema_meta, "seed_version", str(SEED_VERSION))
+            timings["seed"] = (time.perf_counter() - phase) * 1000
+
+    timings["total"] = (time.perf_counter() - started) * 1000
+    return timings
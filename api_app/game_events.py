@@ -0,0 +1,146 @@
+"""Ball and player-up transitions, recorded as ingest stores states.
+
+Ingest compares each new state with the game's previous one and adds a
+``game_events`` row when the ball or the player up changed, a ``start`` row
+for the first state and an ``end`` row when the game is deactivated. Each
+event opens a segment of play; its ``scores`` are what the previous segment
+ended with. Per-ball time and points therefore come from a handful of rows
+instead of every state.
+
+Games whose first states predate the table have no (or no complete) event
+history; their events are derived from the stored states when read.
+"""
+
+from datetime import datetime
+from typing import Iterable, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, retention, schemas, timeline, utils
+
+START = "start"
+BALL = "ball"
+PLAYER_UP = "player_up"
+END = "end"
+
+
+def _transition(previous, state) -> str | None:
+    if previous is None:
+        return START
+    if state.ball != previous.ball:
+        return BALL
+    if state.player_up != previous.player_up:
+        return PLAYER_UP
+    return None
+
+
+def _event(game_id: int, kind: str, state, scores, timestamp=None) -> models.GameEvent:
+    return models.GameEvent(
+        game_id=game_id,
+        kind=kind,
+        timestamp=timestamp or state.timestamp,
+        seconds_elapsed=int(state.seconds_elapsed or 0),
+        ball=int(state.ball or 0),
+        player_up=int(state.player_up or 0),
+        scores=scores or {},
+    )
+
+
+def derive_events(game_id: int, states: Iterable, *, finished: bool) -> list[models.GameEvent]:
+    """The events ingest would have recorded for chronologically ordered ``states``."""
+
+    events = []
+    previous = None
+    for state in states:
+        kind = _transition(previous, state)
+        if kind is not None:
+            events.append(_event(game_id, kind, state, (previous or state).scores))
+        previous = state
+    if finished and previous is not None:
+        events.append(_event(game_id, END, previous, previous.scores))
+    return events
+
+
+async def _latest_state(db: AsyncSession, game_id: int):
+    result = await db.execute(
+        select(
+            models.GameState.seconds_elapsed,
+            models.GameState.ball,
+            models.GameState.player_up,
+            models.GameState.scores,
+            models.GameState.timestamp,
+        )
+        .where(models.GameState.game_id == game_id)
+        .order_by(models.GameState.timestamp.desc(), models.GameState.id.desc())
+        .limit(1)
+    )
+    return result.first()
+
+
+async def record_state(db: AsyncSession, state: models.GameState, previous=None) -> None:
+    """Add the event ``state`` opens, if any. Call before adding ``state``.
+
+    ``previous`` is the game's newest stored state when the caller already
+    has it (the live store does); otherwise it is read back.
+    """
+
+    if previous is None:
+        previous = await _latest_state(db, state.game_id)
+    kind = _transition(previous, state)
+    if kind is not None:
+        db.add(_event(state.game_id, kind, state, (previous or state).scores))
+
+
+async def record_end(db: AsyncSession, game_id: int, ended_at: datetime | None) -> None:
+    """Close the last segment of a game that was just deactivated."""
+
+    latest = await _latest_state(db, game_id)
+    if latest is not None:
+        db.add(_event(game_id, END, latest, latest.scores, timestamp=ended_at))
+
+
+def ball_summaries(events: Sequence, latest=None) -> list[schemas.BallSummary]:
+    """Time and points per ball and player from ``events`` in order.
+
+    ``latest`` (the newest state) closes the last segment of a game that
+    has no ``end`` event yet.
+    """
+
+    closings = [(event.seconds_elapsed, utils.score_map(event.scores)) for event in events[1:]]
+    if latest is not None and events and events[-1].kind != END:
+        closings.append((int(latest.seconds_elapsed or 0), utils.score_map(latest.scores)))
+
+    totals: dict[tuple[int, int], schemas.BallSummary] = {}
+    for opening, (end_seconds, end_scores) in zip(events, closings):
+        if opening.kind == END:
+            break
+        player_number = opening.player_up
+        start_score = utils.score_map(opening.scores).get(player_number, 0)
+        end_score = end_scores.get(player_number, start_score)
+        summary = totals.get((opening.ball, player_number))
+        if summary is None:
+            summary = totals[(opening.ball, player_number)] = schemas.BallSummary(
+                ball=opening.ball, player_number=player_number, seconds=0, points=0, end_score=start_score
+            )
+        summary.seconds += max(end_seconds - opening.seconds_elapsed, 0)
+        summary.points += max(end_score - start_score, 0)
+        summary.end_score = end_score
+    return [totals[key] for key in sorted(totals)]
+
+
+async def game_ball_summaries(db: AsyncSession, game: models.Game) -> list[schemas.BallSummary]:
+    result = await db.execute(
+        select(models.GameEvent).where(models.GameEvent.game_id == game.id).order_by(models.GameEvent.id)
+    )
+    events = result.scalars().all()
+    if events and events[0].kind == START:
+        latest = None if events[-1].kind == END else await _latest_state(db, game.id)
+        return ball_summaries(events, latest)
+
+    # Only finished games have a compact timeline.
+    states = None if game.is_active else await timeline.load_timeline(db, game.id)
+    if states is None:
+        states = await retention.load_full_timeline(db, game)
+    events = derive_events(game.id, states, finished=not game.is_active)
+    return ball_summaries(events, states[-1] if states else None)
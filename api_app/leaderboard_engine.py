@@ -0,0 +1,628 @@
+"""Incrementally maintained time-window leaderboards.
+
+Every game contributes one snapshot per player: the score in the game's
+latest state, observed at that state's timestamp. The engine keeps the best
+snapshot per player for each window (all time, this year/month/week and the
+last 24 hours) in three kinds of scope:
+
+* ``("game", id)``: the per-game boards served by ``/leaderboard/summary``;
+* ``("machine", id)``: every game played on a machine;
+* ``("global", None)``: every game.
+
+Committed writes are reported by :mod:`.changes`; only the games they touch
+are reloaded. Windows are suffixes of time, so as their start moves forward
+(rolling 24 hours, or a calendar rollover) each board pops the entries that
+fell out of it from a heap ordered by observation time and recomputes just
+those players. Sorted output is cached per board, so serving a board costs
+O(output) once it is up to date.
+
+Timestamps are normalized once, when a snapshot is loaded, into integer
+microseconds since the epoch. Window starts, expiry heaps and rank keys all
+compare those integers, and each player's snapshots in a scope are kept as
+an array sorted by observation time, so the best snapshot in a window is a
+single bisection.
+"""
+
+import bisect
+import heapq
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import DateTime, bindparam, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import changes, models, schemas, utils
+from .database import AsyncSessionLocal
+
+Scope = tuple[str, int | None]
+GLOBAL_SCOPE: Scope = ("global", None)
+
+_WATCHED_TABLES = ("games", "game_players", "game_states", "players", "machines")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# Sort position of snapshots without a timestamp: inside every window.
+_UNDATED = sys.maxsize
+
+
+def timeframes(now: datetime) -> list[tuple[str, str, datetime | None]]:
+    start_of_year = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    start_of_week = (now - timedelta(days=now.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    last_24_hours = now - timedelta(hours=24)
+
+    return [
+        ("all-time", "Top all time", None),
+        ("year", "Top this year", start_of_year),
+        ("month", "Top this month", start_of_month),
+        ("week", "Top this week", start_of_week),
+        ("24h", "Top last 24 hours", last_24_hours),
+    ]
+
+
+WINDOW_SLUGS = tuple(slug for slug, _, _ in timeframes(datetime.now(timezone.utc)))
+
+
+def epoch_us(dt: datetime | None) -> int | None:
+    """Microseconds since the epoch for ``dt`` (naive values are UTC)."""
+
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    game_id: int
+    machine_id: int
+    game_player_id: int
+    player_id: int
+    player_number: int
+    initials: str
+    screen_name: str | None
+    machine_name: str | None
+    observed_at: datetime | None
+    score: int
+    observed_us: int | None = field(init=False, compare=False, repr=False)
+    rank_key: tuple = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        observed_us = epoch_us(self.observed_at)
+        object.__setattr__(self, "observed_us", observed_us)
+        # Matches the SQL ordering: score DESC, observed_at DESC (NULLs last),
+        # then game player id.
+        object.__setattr__(
+            self,
+            "rank_key",
+            (-self.score, observed_us is None, -(observed_us or 0), self.game_player_id),
+        )
+
+    def in_window(self, since_us: int | None) -> bool:
+        return since_us is None or self.observed_us is None or self.observed_us >= since_us
+
+    def entry(self) -> schemas.LeaderboardEntry:
+        return schemas.LeaderboardEntry(
+            player_id=self.player_id,
+            player_number=self.player_number,
+            initials=self.initials,
+            screen_name=self.screen_name,
+            score=self.score,
+            last_played=self.observed_at,
+            machine_name=self.machine_name,
+        )
+
+
+@dataclass(frozen=True)
+class GameInfo:
+    id: int
+    machine_id: int
+    machine_name: str | None
+    is_active: bool
+    last_activity_at: datetime | None
+
+
+def _rank_key(snapshot: Snapshot) -> tuple:
+    return snapshot.rank_key
+
+
+def _sort_time(snapshot: Snapshot) -> int:
+    return _UNDATED if snapshot.observed_us is None else snapshot.observed_us
+
+
+class _History:
+    """One player's snapshots within a scope, indexed by observation time.
+
+    ``times`` is sorted and ``best_from[i]`` is the best of the snapshots
+    from position ``i`` on, so the best snapshot since any window start is
+    one bisection. The arrays are rebuilt lazily after the snapshots change.
+    """
+
+    __slots__ = ("snapshots", "_times", "_best_from")
+
+    def __init__(self) -> None:
+        self.snapshots: dict[int, Snapshot] = {}
+        self._times: list[int] | None = None
+        self._best_from: list[Snapshot] = []
+
+    def put(self, snapshot: Snapshot) -> None:
+        self.snapshots[snapshot.game_player_id] = snapshot
+        self._times = None
+
+    def discard(self, game_player_id: int) -> None:
+        if self.snapshots.pop(game_player_id, None) is not None:
+            self._times = None
+
+    def best_since(self, since_us: int | None) -> Snapshot | None:
+        if len(self.snapshots) == 1:
+            (snapshot,) = self.snapshots.values()
+            return snapshot if snapshot.in_window(since_us) else None
+        if self._times is None:
+            self._index()
+        start = 0 if since_us is None else bisect.bisect_left(self._times, since_us)
+        return self._best_from[start] if start < len(self._best_from) else None
+
+    def _index(self) -> None:
+        ordered = sorted(self.snapshots.values(), key=_sort_time)
+        times: list[int] = []
+        best_from: list[Snapshot] = []
+        best: Snapshot | None = None
+        for snapshot in reversed(ordered):
+            if best is None or snapshot.rank_key < best.rank_key:
+                best = snapshot
+            best_from.append(best)
+            times.append(_sort_time(snapshot))
+        times.reverse()
+        best_from.reverse()
+        self._times = times
+        self._best_from = best_from
+
+
+class _Board:
+    """Best snapshot per player for one scope and window.
+
+    ``ranked`` holds ``(rank_key, player_id)`` for every player in board
+    order, so a player's rank is one bisection and their neighbours are a
+    slice. Updates bisect to the old and new positions and shift the list in
+    C rather than re-sorting the board.
+    """
+
+    __slots__ = ("best", "expiry", "ranked", "_entries")
+
+    def __init__(self) -> None:
+        self.best: dict[int, Snapshot] = {}
+        self.expiry: list[tuple[int, int, int]] = []
+        self.ranked: list[tuple[tuple, int]] = []
+        self._entries: list[schemas.LeaderboardEntry] | None = None
+
+    def set(self, player_id: int, snapshot: Snapshot | None) -> None:
+        current = self.best.get(player_id)
+        if snapshot == current:
+            return
+        if current is not None:
+            del self.ranked[bisect.bisect_left(self.ranked, (current.rank_key, player_id))]
+        if snapshot is None:
+            del self.best[player_id]
+        else:
+            self.best[player_id] = snapshot
+            bisect.insort(self.ranked, (snapshot.rank_key, player_id))
+            if snapshot.observed_us is not None:
+                heapq.heappush(self.expiry, (snapshot.observed_us, player_id, snapshot.game_player_id))
+                if len(self.expiry) > 4 * len(self.best) + 64:
+                    self._compact_expiry()
+        self._entries = None
+
+    def _compact_expiry(self) -> None:
+        # Superseded entries are skipped lazily; drop them once they pile up.
+        self.expiry = [
+            (snapshot.observed_us, player_id, snapshot.game_player_id)
+            for player_id, snapshot in self.best.items()
+            if snapshot.observed_us is not None
+        ]
+        heapq.heapify(self.expiry)
+
+    def entries(self) -> list[schemas.LeaderboardEntry]:
+        if self._entries is None:
+            self._entries = [self.best[player_id].entry() for _, player_id in self.ranked]
+        return self._entries
+
+    def position(self, player_id: int) -> int | None:
+        """Zero-based position of ``player_id``, or ``None`` when absent."""
+
+        snapshot = self.best.get(player_id)
+        if snapshot is None:
+            return None
+        return bisect.bisect_left(self.ranked, (snapshot.rank_key, player_id))
+
+    def ranked_entries(self, start: int, stop: int) -> list[schemas.RankedLeaderboardEntry]:
+        start = max(start, 0)
+        return [
+            schemas.RankedLeaderboardEntry(rank=start + offset + 1, **self.best[player_id].entry().model_dump())
+            for offset, (_, player_id) in enumerate(self.ranked[start:stop])
+        ]
+
+
+class LeaderboardEngine:
+    def __init__(self, *, subscribe: bool = True) -> None:
+        self._games: dict[int, GameInfo] = {}
+        self._game_snapshots: dict[int, list[Snapshot]] = {}
+        # scope -> player -> snapshots by game player
+        self._scoped: dict[Scope, dict[int, _History]] = {}
+        self._boards: dict[tuple[Scope, str], _Board] = {}
+        # window slug -> start in epoch microseconds
+        self._since: dict[str, int | None] = {}
+        self._games_by_player: dict[int, set[int]] = {}
+        self._games_by_machine: dict[int, set[int]] = {}
+        self._dirty_games: set[int] = set()
+        self._needs_rebuild = True
+        self._lock = utils.LoopLock()
+        if subscribe:
+            changes.subscribe(self._on_change)
+
+    # -- change tracking -------------------------------------------------
+
+    def _on_change(self, change: changes.ChangeSet) -> None:
+        if not change.touches(*_WATCHED_TABLES):
+            return
+        if change.is_full(*_WATCHED_TABLES):
+            self._needs_rebuild = True
+            return
+        self._dirty_games.update(change.game_ids)
+        for player_id in change.ids("players"):
+            self._dirty_games.update(self._games_by_player.get(player_id, ()))
+        for machine_id in change.ids("machines"):
+            self._dirty_games.update(self._games_by_machine.get(machine_id, ()))
+
+    def invalidate(self) -> None:
+        self._needs_rebuild = True
+
+    # -- loading ---------------------------------------------------------
+
+    async def refresh(self) -> None:
+        """Apply pending changes; rebuilds from the database when required."""
+
+        if not self._needs_rebuild and not self._dirty_games:
+            return
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                await self._refresh_locked(db)
+
+    async def rebuild(self) -> None:
+        self._needs_rebuild = True
+        await self.refresh()
+
+    async def _refresh_locked(self, db: AsyncSession) -> None:
+        if self._needs_rebuild:
+            # Changes published while loading mark games dirty again.
+            self._needs_rebuild = False
+            self._dirty_games.clear()
+            games, snapshots = await load_games(db)
+            self._reset()
+            self._apply_games({game_id: (info, snapshots.get(game_id, [])) for game_id, info in games.items()})
+        elif self._dirty_games:
+            game_ids = set(self._dirty_games)
+            self._dirty_games.difference_update(game_ids)
+            games, snapshots = await load_games(db, game_ids)
+            self._apply_games(
+                {game_id: (games.get(game_id), snapshots.get(game_id, [])) for game_id in game_ids}
+            )
+
+    def _reset(self) -> None:
+        self._games.clear()
+        self._game_snapshots.clear()
+        self._scoped.clear()
+        self._boards.clear()
+        self._games_by_player.clear()
+        self._games_by_machine.clear()
+
+    # -- incremental maintenance ----------------------------------------
+
+    def _scopes_for(self, game_id: int, machine_id: int) -> tuple[Scope, ...]:
+        return (("game", game_id), ("machine", machine_id), GLOBAL_SCOPE)
+
+    def _board(self, scope: Scope, slug: str) -> _Board:
+        board = self._boards.get((scope, slug))
+        if board is None:
+            board = self._boards[(scope, slug)] = _Board()
+        return board
+
+    def _apply_games(self, updates: dict[int, tuple[GameInfo | None, list[Snapshot]]]) -> None:
+        # Each affected player is recomputed once, however many of the
+        # updated games they played.
+        touched: set[tuple[Scope, int]] = set()
+        for game_id, (info, snapshots) in updates.items():
+            self._apply_game(game_id, info, snapshots, touched)
+        for scope, player_id in touched:
+            self._recompute(scope, player_id)
+
+    def _apply_game(
+        self,
+        game_id: int,
+        info: GameInfo | None,
+        snapshots: list[Snapshot],
+        touched: set[tuple[Scope, int]],
+    ) -> None:
+        previous_info = self._games.get(game_id)
+        previous = self._game_snapshots.pop(game_id, [])
+
+        for snapshot in previous:
+            for scope in self._scopes_for(game_id, snapshot.machine_id):
+                players = self._scoped.get(scope, {})
+                history = players.get(snapshot.player_id)
+                if history is not None:
+                    history.discard(snapshot.game_player_id)
+                    if not history.snapshots:
+                        players.pop(snapshot.player_id, None)
+                touched.add((scope, snapshot.player_id))
+            self._games_by_player.get(snapshot.player_id, set()).discard(game_id)
+        if previous_info is not None:
+            self._games_by_machine.get(previous_info.machine_id, set()).discard(game_id)
+
+        if info is None:
+            self._games.pop(game_id, None)
+            for slug in WINDOW_SLUGS:
+                self._boards.pop((("game", game_id), slug), None)
+            touched.difference_update({item for item in touched if item[0] == ("game", game_id)})
+            self._scoped.pop(("game", game_id), None)
+        else:
+            self._games[game_id] = info
+            self._game_snapshots[game_id] = snapshots
+            self._games_by_machine.setdefault(info.machine_id, set()).add(game_id)
+            for snapshot in snapshots:
+                for scope in self._scopes_for(game_id, snapshot.machine_id):
+                    players = self._scoped.setdefault(scope, {})
+                    history = players.get(snapshot.player_id)
+                    if history is None:
+                        history = players[snapshot.player_id] = _History()
+                    history.put(snapshot)
+                    touched.add((scope, snapshot.player_id))
+                self._games_by_player.setdefault(snapshot.player_id, set()).add(game_id)
+
+    def _recompute(self, scope: Scope, player_id: int, slugs: Iterable[str] = WINDOW_SLUGS) -> None:
+        history = self._scoped.get(scope, {}).get(player_id)
+        for slug in slugs:
+            best = history.best_since(self._since.get(slug)) if history is not None else None
+            board = self._board(scope, slug)
+            if best is not None or player_id in board.best:
+                board.set(player_id, best)
+
+    def advance(self, now: datetime) -> None:
+        """Move every window to ``now``, expiring entries that fell out."""
+
+        for slug, _, since in timeframes(now):
+            since_us = epoch_us(since)
+            previous = self._since.get(slug)
+            self._since[slug] = since_us
+            if since_us == previous or since_us is None:
+                continue
+            if previous is not None and since_us < previous:
+                # The clock moved backwards; entries may re-enter the window.
+                for scope, players in self._scoped.items():
+                    for player_id in list(players):
+                        self._recompute(scope, player_id, (slug,))
+                continue
+
+            for (scope, board_slug), board in self._boards.items():
+                if board_slug != slug:
+                    continue
+                while board.expiry and board.expiry[0][0] < since_us:
+                    _, player_id, game_player_id = heapq.heappop(board.expiry)
+                    current = board.best.get(player_id)
+                    if current is not None and current.game_player_id == game_player_id:
+                        if not current.in_window(since_us):
+                            self._recompute(scope, player_id, (slug,))
+
+    # -- reads -----------------------------------------------------------
+
+    async def prepare(self, now: datetime) -> None:
+        await self.refresh()
+        self.advance(now)
+
+    def games(self, machine_id: int | None = None) -> list[GameInfo]:
+        infos = (self._games[game_id] for game_id in sorted(self._games))
+        return [info for info in infos if machine_id is None or info.machine_id == machine_id]
+
+    def board(self, scope: Scope, slug: str) -> list[schemas.LeaderboardEntry]:
+        board = self._boards.get((scope, slug))
+        return board.entries() if board else []
+
+    def game_bundle(
+        self, info: GameInfo, now: datetime, slugs: Iterable[str] | None = None
+    ) -> schemas.GameLeaderboardBundle:
+        """Build one game's bundle, limited to the windows in ``slugs``."""
+
+        selected = set(WINDOW_SLUGS if slugs is None else slugs)
+        machine_name = info.machine_name or "Unknown game"
+        windows = [
+            schemas.TimeWindowLeaderboard(
+                slug=f"game-{info.id}-{slug}",
+                title=f"{machine_name} · {title}",
+                since=since,
+                leaderboard=self.board(("game", info.id), slug),
+            )
+            for slug, title, since in timeframes(now)
+            if slug in selected
+        ]
+        all_time = self.board(("game", info.id), "all-time")
+        return schemas.GameLeaderboardBundle(
+            id=info.id,
+            machine_name=machine_name,
+            is_active=info.is_active,
+            windows=windows,
+            champion=all_time[0] if all_time else None,
+            last_activity_at=info.last_activity_at,
+        )
+
+    def scope_windows(
+        self, scope: Scope, now: datetime, *, title_prefix: str | None = None, slug_prefix: str = ""
+    ) -> list[schemas.TimeWindowLeaderboard]:
+        windows: list[schemas.TimeWindowLeaderboard] = []
+        for slug, title, since in timeframes(now):
+            entries = self.board(scope, slug)
+            if not entries:
+                continue
+            windows.append(
+                schemas.TimeWindowLeaderboard(
+                    slug=f"{slug_prefix}{slug}",
+                    title=f"{title_prefix + ' · ' if title_prefix else ''}{title}",
+                    since=since,
+                    leaderboard=entries,
+                )
+            )
+        return windows
+
+    def machine_name(self, machine_id: int) -> str | None:
+        for game_id in self._games_by_machine.get(machine_id, ()):
+            return self._games[game_id].machine_name
+        return None
+
+    def rank(
+        self, scope: Scope, slug: str, player_id: int, *, neighbors: int = 2
+    ) -> schemas.LeaderboardRank | None:
+        """Where ``player_id`` stands on one board, or ``None`` if absent."""
+
+        board = self._boards.get((scope, slug))
+        position = board.position(player_id) if board else None
+        if position is None:
+            return None
+        total = len(board.ranked)
+        return schemas.LeaderboardRank(
+            scope=scope[0],
+            scope_id=scope[1],
+            window=slug,
+            rank=position + 1,
+            total=total,
+            # Percentile rank: players below plus half of this one.
+            percentile=round(100 * (total - position - 0.5) / total, 1),
+            entry=board.ranked_entries(position, position + 1)[0],
+            above=board.ranked_entries(position - neighbors, position),
+            below=board.ranked_entries(position + 1, position + 1 + neighbors),
+        )
+
+    # -- consistency -----------------------------------------------------
+
+    def _board_rows(self) -> dict[tuple[Scope, str], list[tuple]]:
+        return {
+            key: [(s.player_id, s.game_player_id, s.score, s.observed_at) for s in board_values]
+            for key, board in self._boards.items()
+            if (board_values := sorted(board.best.values(), key=_rank_key))
+        }
+
+    async def check_consistency(self, now: datetime | None = None) -> schemas.LeaderboardConsistencyReport:
+        """Compare the incremental boards with a fresh rebuild from the database."""
+
+        now = now or datetime.now(timezone.utc)
+        await self.prepare(now)
+        fresh = LeaderboardEngine(subscribe=False)
+        await fresh.prepare(now)
+
+        ours, theirs = self._board_rows(), fresh._board_rows()
+        mismatched = sorted(
+            f"{scope[0]}:{scope[1] if scope[1] is not None else '*'}:{slug}"
+            for scope, slug in set(ours) | set(theirs)
+            if ours.get((scope, slug)) != theirs.get((scope, slug))
+        )
+        return schemas.LeaderboardConsistencyReport(
+            consistent=not mismatched and self._games == fresh._games,
+            games=len(fresh._games),
+            boards_checked=len(set(ours) | set(theirs)),
+            mismatched_boards=mismatched,
+        )
+
+
+_SNAPSHOTS_SQL = """
+SELECT g.id AS game_id,
+       g.machine_id AS machine_id,
+       gp.id AS game_player_id,
+       gp.player_id AS player_id,
+       gp.player_number AS player_number,
+       p.initials AS initials,
+       p.screen_name AS screen_name,
+       m.name AS machine_name,
+       COALESCE(ls.timestamp, g.end_time, g.start_time) AS observed_at,
+       COALESCE(CAST(json_extract(ls.scores, printf('$."%d"', gp.player_number)) AS INTEGER), 0) AS score
+FROM games g
+JOIN game_players gp ON gp.game_id = g.id
+JOIN players p ON p.id = gp.player_id
+LEFT JOIN machines m ON m.id = g.machine_id
+LEFT JOIN game_states ls ON ls.id = (
+    SELECT gs.id FROM game_states gs
+    WHERE gs.game_id = g.id
+    ORDER BY gs.timestamp DESC, gs.id DESC
+    LIMIT 1
+)
+{where}
+ORDER BY g.id, gp.id
+"""
+
+
+async def load_games(
+    db: AsyncSession, game_ids: set[int] | None = None
+) -> tuple[dict[int, GameInfo], dict[int, list[Snapshot]]]:
+    """Load game metadata and player snapshots, reading only each game's latest state."""
+
+    latest_state_at = (
+        select(models.GameState.timestamp)
+        .where(models.GameState.game_id == models.Game.id)
+        .order_by(models.GameState.timestamp.desc(), models.GameState.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    query = (
+        select(
+            models.Game.id,
+            models.Game.machine_id,
+            models.Game.is_active,
+            models.Game.start_time,
+            models.Game.end_time,
+            models.Machine.name.label("machine_name"),
+            latest_state_at.label("latest_state_at"),
+        )
+        .outerjoin(models.Machine, models.Machine.id == models.Game.machine_id)
+        .order_by(models.Game.id)
+    )
+    statement = text(_SNAPSHOTS_SQL.format(where="WHERE g.id IN :game_ids" if game_ids is not None else ""))
+    params: dict[str, object] = {}
+    if game_ids is not None:
+        query = query.where(models.Game.id.in_(game_ids))
+        statement = statement.bindparams(bindparam("game_ids", expanding=True))
+        params["game_ids"] = list(game_ids)
+    statement = statement.columns(observed_at=DateTime(timezone=True))
+
+    games = {
+        row.id: GameInfo(
+            id=row.id,
+            machine_id=row.machine_id,
+            machine_name=row.machine_name,
+            is_active=bool(row.is_active),
+            last_activity_at=utils.ensure_utc(row.latest_state_at or row.end_time or row.start_time),
+        )
+        for row in (await db.execute(query)).all()
+    }
+
+    snapshots: dict[int, list[Snapshot]] = {}
+    if games:
+        for row in (await db.execute(statement, params)).mappings():
+            snapshots.setdefault(row["game_id"], []).append(
+                Snapshot(
+                    game_id=row["game_id"],
+                    machine_id=row["machine_id"],
+                    game_player_id=row["game_player_id"],
+                    player_id=row["player_id"],
+                    player_number=row["player_number"],
+                    initials=row["initials"],
+                    screen_name=row["screen_name"],
+                    machine_name=row["machine_name"],
+                    observed_at=utils.ensure_utc(row["observed_at"]),
+                    score=int(row["score"] or 0),
+                )
+            )
+    return games, snapshots
+
+
+engine = LeaderboardEngine()
@@ -0,0 +1,957 @@
+"""Live game state: an in-memory store fed by ingest, and streams of it.
+
+:class:`LiveStore` holds every active game's players, latest state and
+running play statistics and builds the ``LiveGameState`` served by
+``/games/live`` from memory. Ingest folds each state in right after
+committing it; other writers' commits, reported by :mod:`.changes`, mark
+the games they touch for reloading, which replays their stored states.
+
+:class:`LiveFeed` streams the store while anyone is subscribed: a single
+worker rebuilds the games the store reports as changed and appends an
+event per game whose state changed (or that stopped being live). Every
+subscriber reads the same serialized events, so an idle client costs a
+heartbeat, not a query.
+
+Events carry increasing ids and the most recent ``LIVE_STREAM_HISTORY`` are
+kept so a reconnecting client can resume from ``Last-Event-ID``; anyone
+further behind gets a fresh snapshot instead.
+
+Clients may ask for the delta protocol (version :data:`PATCH_VERSION`):
+instead of every changed ``LiveGameState`` they get it once and then
+``patch`` events carrying only the fields, players and balls that changed.
+Each game's payloads carry ``seq`` (the event id) and patches name the
+``base`` they apply to, so a client that missed one knows to resync.
+
+WebSocket viewers subscribe to topics instead: ``live`` (every live game),
+``game:<id>`` and ``tournament:<id>`` (games on the machines of a running
+tournament). Each event is encoded into one frame that is handed to every
+matching viewer. A viewer holds at most one unsent frame per game, so a
+slow consumer skips intermediate states rather than queueing them (a
+delta viewer gets the whole state in place of a skipped patch).
+"""
+
+import asyncio
+import json
+import logging
+import re
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import changes, models, schemas, timeline, utils
+from .database import AsyncSessionLocal, settings
+
+logger = logging.getLogger(__name__)
+
+LIVE_STALE_SECONDS = 60
+# Events kept for Last-Event-ID resumption.
+LIVE_STREAM_HISTORY = 512
+# How often live games are checked for going stale without a write.
+STALE_CHECK_SECONDS = 5.0
+
+# Commits tagged with this origin (see changes.tag) were applied by ingest.
+INGEST_ORIGIN = "ingest"
+
+_WATCHED_TABLES = ("games", "game_states", "game_players", "players", "machines")
+_TOURNAMENT_TABLES = ("tournaments", "tournament_machines")
+
+# Version of the delta protocol clients request with ``delta=<version>``.
+PATCH_VERSION = 1
+
+ALL_LIVE_TOPIC = "live"
+_TOPIC = re.compile(r"^(?:live|(?:game|tournament):\d+)$")
+
+
+async def _all_states(
+    db: AsyncSession, game: models.Game
+) -> list[models.GameState] | list[timeline.TimelineState]:
+    # Only finished games have a compact timeline; live ones skip the lookup.
+    if not game.is_active:
+        compact = await timeline.load_timeline(db, game.id)
+        if compact is not None:
+            return compact
+
+    result = await db.execute(
+        select(models.GameState)
+        .where(models.GameState.game_id == game.id)
+        .order_by(models.GameState.timestamp.asc())
+    )
+    return result.scalars().all()
+
+
+class PlayStatsAccumulator:
+    """Per-player, per-ball play time and scoring, folded in one state at a time.
+
+    A player's time on a ball runs from the first state in which they scored
+    on it (or were up while nobody scored) to the latest such state. Each
+    state costs O(players); reading a player's totals costs O(balls).
+    """
+
+    __slots__ = ("_balls", "_totals", "_previous", "last_scorer")
+
+    def __init__(self) -> None:
+        # player_number -> ball -> [start_time, start_score, end_time, end_score]
+        self._balls: dict[int, dict[int, list[int]]] = {}
+        self._totals: dict[int, int] = {}
+        self._previous: dict[int, int] = {}
+        self.last_scorer: Optional[int] = None
+
+    @classmethod
+    def replay(cls, states: Iterable) -> "PlayStatsAccumulator":
+        accumulator = cls()
+        for state in states:
+            accumulator.add(state)
+        return accumulator
+
+    def add(self, state) -> None:
+        scores = utils.score_map(state.scores or {})
+        active_players = [
+            player_number
+            for player_number, score in scores.items()
+            if self._previous.get(player_number, score) != score
+        ]
+        if active_players:
+            self.last_scorer = active_players[-1]
+        elif scores:
+            active_players = [state.player_up or min(scores)]
+
+        for player_number in active_players:
+            score = scores.get(player_number, self._previous.get(player_number, 0))
+            prior_score = self._previous.get(player_number, score)
+            balls = self._balls.setdefault(player_number, {})
+            bucket = balls.get(state.ball)
+            if bucket is None:
+                bucket = balls[state.ball] = [state.seconds_elapsed, prior_score, state.seconds_elapsed, score]
+            else:
+                self._totals[player_number] -= max(bucket[2] - bucket[0], 0)
+                bucket[2] = state.seconds_elapsed
+                bucket[3] = score
+            self._totals[player_number] = self._totals.get(player_number, 0) + max(bucket[2] - bucket[0], 0)
+
+        self._previous.update(scores)
+
+    def total_seconds(self, player_number: int) -> int:
+        return int(self._totals.get(player_number, 0))
+
+    def ball_times(self, player_number: int, current_ball: int | None = None) -> list[schemas.BallPlayTime]:
+        ball_times = []
+        for ball, (start_time, start_score, end_time, end_score) in sorted(
+            self._balls.get(player_number, {}).items()
+        ):
+            start_score = start_score or 0
+            end_score = end_score or start_score
+            ball_times.append(
+                schemas.BallPlayTime(
+                    ball=ball,
+                    seconds=int(max(end_time - start_time, 0)),
+                    score=int(max(end_score - start_score, 0)),
+                    is_current=ball == current_ball,
+                )
+            )
+        return ball_times
+
+
+@dataclass(frozen=True)
+class _StateRow:
+    seconds_elapsed: int
+    ball: int
+    player_up: int
+    scores: dict | list | None
+    timestamp: datetime | None
+
+    @classmethod
+    def from_state(cls, state) -> "_StateRow":
+        return cls(
+            seconds_elapsed=state.seconds_elapsed,
+            ball=state.ball,
+            player_up=state.player_up,
+            scores=state.scores,
+            timestamp=utils.ensure_utc(state.timestamp),
+        )
+
+
+@dataclass(frozen=True)
+class _Binding:
+    player_number: int
+    player_id: int | None
+    initials: str | None
+    screen_name: str | None
+
+
+@dataclass(eq=False)
+class _LiveGame:
+    """What a live game's state is built from: game, machine, players, latest state and play stats."""
+
+    game_id: int
+    machine_id: int | None
+    machine_uid: str | None
+    machine_name: str | None
+    machine_ip: str | None
+    is_active: bool
+    players: list[_Binding]
+    latest: _StateRow | None
+    stats: PlayStatsAccumulator
+    _built: schemas.LiveGameState | None = None
+
+    @classmethod
+    def from_game(cls, game: models.Game, states: Iterable) -> "_LiveGame":
+        states = list(states)
+        entry = cls(
+            game_id=game.id,
+            machine_id=game.machine_id,
+            machine_uid=None,
+            machine_name=None,
+            machine_ip=None,
+            is_active=bool(game.is_active),
+            players=[
+                _Binding(
+                    player_number=game_player.player_number,
+                    player_id=game_player.player.id if game_player.player else None,
+                    initials=game_player.player.initials if game_player.player else None,
+                    screen_name=game_player.player.screen_name if game_player.player else None,
+                )
+                for game_player in sorted(game.game_players, key=lambda gp: gp.player_number)
+            ],
+            latest=_StateRow.from_state(states[-1]) if states else None,
+            stats=PlayStatsAccumulator.replay(states),
+        )
+        if game.machine:
+            entry.set_machine(game.machine)
+        return entry
+
+    def set_machine(self, machine: models.Machine) -> None:
+        self.machine_uid = machine.uid
+        self.machine_name = machine.name
+        self.machine_ip = machine.ip_address
+        self._built = None
+
+    def append(self, state) -> None:
+        self.latest = _StateRow.from_state(state)
+        self.stats.add(self.latest)
+        self._built = None
+
+    def live_state(self, now: datetime) -> Optional[schemas.LiveGameState]:
+        """The game's live state, or ``None`` once it went stale."""
+
+        if self.latest is None:
+            return None
+        latest_timestamp = self.latest.timestamp
+        if latest_timestamp and (now - latest_timestamp).total_seconds() > LIVE_STALE_SECONDS:
+            return None
+        if self._built is None:
+            self._built = self._build()
+        return self._built
+
+    def _build(self) -> Optional[schemas.LiveGameState]:
+        state = self.latest
+        scores = utils.score_map(state.scores or {})
+        if not scores:
+            return None
+
+        active_player = self.stats.last_scorer or state.player_up or 1
+
+        def live_score(player_number: int, binding: _Binding | None) -> schemas.LiveScore:
+            is_up = player_number == active_player
+            return schemas.LiveScore(
+                player_id=binding.player_id if binding else None,
+                player_number=player_number,
+                initials=binding.initials if binding else None,
+                screen_name=binding.screen_name if binding else None,
+                score=scores.get(player_number, 0),
+                total_play_seconds=self.stats.total_seconds(player_number),
+                ball_times=self.stats.ball_times(player_number, state.ball if is_up else None),
+                is_player_up=is_up,
+            )
+
+        player_scores = [live_score(binding.player_number, binding) for binding in self.players]
+        bound = {binding.player_number for binding in self.players}
+        player_scores.extend(
+            live_score(player_number, None) for player_number in sorted(scores) if player_number not in bound
+        )
+
+        return schemas.LiveGameState(
+            game_id=self.game_id,
+            machine_id=self.machine_id,
+            machine_uid=self.machine_uid,
+            machine_name=self.machine_name,
+            machine_ip=self.machine_ip,
+            is_active=self.is_active,
+            seconds_elapsed=state.seconds_elapsed,
+            ball=state.ball,
+            player_up=active_player,
+            updated_at=state.timestamp,
+            scores=player_scores,
+        )
+
+
+def _games_query():
+    return select(models.Game).options(
+        selectinload(models.Game.machine),
+        selectinload(models.Game.game_players).selectinload(models.GamePlayer.player),
+    )
+
+
+async def build_live_state(
+    db: AsyncSession, game: models.Game
+) -> Optional[schemas.LiveGameState]:
+    """Build ``game``'s live state from the database."""
+
+    entry = _LiveGame.from_game(game, await _all_states(db, game))
+    return entry.live_state(datetime.now(timezone.utc))
+
+
+def _live_games_query(game_ids: set[int] | None):
+    # Only games that could still be live; others load when they resume.
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=LIVE_STALE_SECONDS)
+    recent = (
+        select(models.GameState.id)
+        .where(models.GameState.game_id == models.Game.id, models.GameState.timestamp >= cutoff)
+        .exists()
+    )
+    query = _games_query().where(models.Game.is_active.is_(True), recent).order_by(models.Game.id)
+    if game_ids is not None:
+        query = query.where(models.Game.id.in_(game_ids))
+    return query
+
+
+async def _load_games(db: AsyncSession, game_ids: set[int] | None) -> dict[int, _LiveGame]:
+    """Load the live games among ``game_ids`` (all when ``None``) with their states.
+
+    Stale games are filtered out in SQL; the states of the remaining games
+    are read in one query along ``(game_id, timestamp)``.
+    """
+
+    games = (await db.execute(_live_games_query(game_ids))).scalars().unique().all()
+    if not games:
+        return {}
+    states: dict[int, list] = defaultdict(list)
+    result = await db.execute(
+        select(
+            models.GameState.game_id,
+            models.GameState.seconds_elapsed,
+            models.GameState.ball,
+            models.GameState.player_up,
+            models.GameState.scores,
+            models.GameState.timestamp,
+        )
+        .where(models.GameState.game_id.in_([game.id for game in games]))
+        .order_by(models.GameState.game_id, models.GameState.timestamp, models.GameState.id)
+    )
+    for row in result:
+        states[row.game_id].append(row)
+    return {game.id: _LiveGame.from_game(game, states[game.id]) for game in games}
+
+
+class LiveStore:
+    """The current state of active games, held in memory.
+
+    Ingest applies every state it stores right after committing it (see
+    :meth:`record_state`) and tags the commit with :data:`INGEST_ORIGIN` so
+    it is not reloaded. Any other write to a game marks it for reloading on
+    the next read; with nothing pending, reads run no queries. Games whose
+    history is not in memory (they were stale at startup) load when they
+    resume.
+    """
+
+    def __init__(self) -> None:
+        self._games: dict[int, _LiveGame] = {}
+        self._full = True
+        self._dirty: set[int] = set()
+        self._loading = False
+        self._listeners: list[Callable[[set[int] | None], None]] = []
+        self._lock = utils.LoopLock()
+        changes.subscribe(self._on_change)
+
+    def listen(self, callback: Callable[[set[int] | None], None]) -> None:
+        """Call ``callback`` with the games that changed (``None``: all of them)."""
+
+        self._listeners.append(callback)
+
+    def _notify(self, game_ids: set[int] | None) -> None:
+        for callback in self._listeners:
+            callback(game_ids)
+
+    def _mark_dirty(self, game_ids: set[int]) -> None:
+        if game_ids:
+            self._dirty.update(game_ids)
+            self._notify(set(game_ids))
+
+    def _on_change(self, change: changes.ChangeSet) -> None:
+        if change.origin == INGEST_ORIGIN or not change.touches(*_WATCHED_TABLES):
+            return
+        if change.is_full(*_WATCHED_TABLES):
+            self._full = True
+            self._notify(None)
+            return
+        dirty = set(change.game_ids)
+        player_ids, machine_ids = change.ids("players"), change.ids("machines")
+        for game_id, entry in self._games.items():
+            if entry.machine_id in machine_ids or any(
+                binding.player_id in player_ids for binding in entry.players
+            ):
+                dirty.add(game_id)
+        self._mark_dirty(dirty)
+
+    # -- ingest ----------------------------------------------------------
+
+    def record_state(self, game: models.Game, machine: models.Machine, state: models.GameState) -> None:
+        """Apply a state ingest has just committed."""
+
+        entry = self._games.get(game.id)
+        if entry is None or self._full or self._loading or game.id in self._dirty:
+            # The history is not (reliably) in memory; read it back.
+            self._mark_dirty({game.id})
+            return
+        entry.set_machine(machine)
+        entry.append(state)
+        self._notify({game.id})
+
+    def latest_state(self, game_id: int) -> _StateRow | None:
+        """The newest state ingest recorded for ``game_id``, if it is reliably in memory."""
+
+        entry = self._games.get(game_id)
+        if entry is None or self._full or self._loading or game_id in self._dirty:
+            return None
+        return entry.latest
+
+    def record_ended(self, game_id: int) -> None:
+        """Forget a game that was just deactivated."""
+
+        self._dirty.discard(game_id)
+        if self._games.pop(game_id, None) is not None:
+            self._notify({game_id})
+
+    def record_machine(self, machine: models.Machine) -> None:
+        """Apply machine details ingest has just committed."""
+
+        changed = set()
+        for game_id, entry in self._games.items():
+            if entry.machine_id == machine.id:
+                entry.set_machine(machine)
+                changed.add(game_id)
+        if changed:
+            self._notify(changed)
+
+    # -- reads -----------------------------------------------------------
+
+    async def refresh(self) -> None:
+        """Reload whatever other writers changed; a no-op when nothing did."""
+
+        if not self._full and not self._dirty:
+            return
+        async with self._lock:
+            if not self._full and not self._dirty:
+                return
+            self._loading = True
+            try:
+                async with AsyncSessionLocal() as db:
+                    if self._full:
+                        self._full = False
+                        self._dirty.clear()
+                        self._games = await _load_games(db, None)
+                    else:
+                        game_ids = set(self._dirty)
+                        self._dirty.difference_update(game_ids)
+                        loaded = await _load_games(db, game_ids)
+                        for game_id in game_ids:
+                            if game_id in loaded:
+                                self._games[game_id] = loaded[game_id]
+                            else:
+                                self._games.pop(game_id, None)
+            finally:
+                self._loading = False
+
+    async def rebuild(self) -> None:
+        self._full = True
+        await self.refresh()
+
+    async def states(self, game_ids: Iterable[int] | None = None) -> dict[int, schemas.LiveGameState]:
+        """Live states by game id, limited to ``game_ids`` when given."""
+
+        await self.refresh()
+        now = datetime.now(timezone.utc)
+        selected = sorted(self._games) if game_ids is None else sorted(set(game_ids) & set(self._games))
+        live_states = {}
+        for game_id in selected:
+            live_state = self._games[game_id].live_state(now)
+            if live_state is not None:
+                live_states[game_id] = live_state
+        return live_states
+
+    async def state(self, game_id: int) -> schemas.LiveGameState | None:
+        return (await self.states([game_id])).get(game_id)
+
+
+def parse_topics(topics: Iterable[str]) -> set[str]:
+    """Validate WebSocket topics; raises ``ValueError`` for unknown ones."""
+
+    parsed = set(topics)
+    invalid = sorted(topic for topic in parsed if not _TOPIC.match(topic))
+    if invalid:
+        raise ValueError(f"Unknown topics: {', '.join(invalid)}")
+    return parsed or {ALL_LIVE_TOPIC}
+
+
+def parse_delta(version: int | None) -> bool:
+    """Whether ``version`` asks for the delta protocol; raises ``ValueError`` if unsupported."""
+
+    if version is None:
+        return False
+    if version != PATCH_VERSION:
+        raise ValueError(f"Unsupported delta protocol version {version}; use {PATCH_VERSION}")
+    return True
+
+
+def _patch(before: dict, after: dict) -> dict | None:
+    """What changed between two dumped ``LiveGameState``s.
+
+    ``None`` when the game's players changed or a ball disappeared, which
+    clients then receive as a whole state.
+    """
+
+    if [score["player_number"] for score in before["scores"]] != [
+        score["player_number"] for score in after["scores"]
+    ]:
+        return None
+    patch: dict = {}
+    changed = {key: value for key, value in after.items() if key != "scores" and before.get(key) != value}
+    if changed:
+        patch["set"] = changed
+    scores = []
+    for old, new in zip(before["scores"], after["scores"]):
+        old_balls = {ball_time["ball"]: ball_time for ball_time in old["ball_times"]}
+        if not old_balls.keys() <= {ball_time["ball"] for ball_time in new["ball_times"]}:
+            return None
+        entry = {
+            key: value
+            for key, value in new.items()
+            if key not in ("player_number", "ball_times") and old.get(key) != value
+        }
+        ball_times = [ball_time for ball_time in new["ball_times"] if old_balls.get(ball_time["ball"]) != ball_time]
+        if ball_times:
+            entry["ball_times"] = ball_times
+        if entry:
+            scores.append({"player_number": new["player_number"], **entry})
+    if scores:
+        patch["scores"] = scores
+    return patch
+
+
+def _delta_state(game_id: int, seq: int, data: str) -> str:
+    return f'{{"v":{PATCH_VERSION},"game_id":{game_id},"seq":{seq},"state":{data}}}'
+
+
+@dataclass(frozen=True)
+class LiveEvent:
+    id: int
+    event: str
+    data: str
+    game_id: int | None = None
+    # The same event in the delta protocol, when it differs.
+    delta: Optional["LiveEvent"] = None
+
+    def encode(self) -> bytes:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {self.data}\n\n".encode()
+
+    def frame(self) -> str:
+        return f'{{"id":{self.id},"event":"{self.event}","data":{self.data}}}'
+
+    def for_protocol(self, delta: bool) -> "LiveEvent":
+        return self.delta if delta and self.delta is not None else self
+
+
+@dataclass(frozen=True)
+class _Current:
+    state: schemas.LiveGameState
+    data: str
+    fields: dict
+    # Id of the event that published this state, and the state in the delta protocol.
+    seq: int
+    delta_data: str
+
+
+@dataclass(frozen=True)
+class _TournamentWindow:
+    machine_ids: frozenset[int]
+    start_time: datetime | None
+    end_time: datetime | None
+
+    def running(self, now: datetime) -> bool:
+        start, end = utils.ensure_utc(self.start_time), utils.ensure_utc(self.end_time)
+        return (start is None or start <= now) and (end is None or now <= end)
+
+
+@dataclass(eq=False)
+class Viewer:
+    """One WebSocket subscriber: its topics and the frames not yet sent."""
+
+    topics: set[str]
+    delta: bool = False
+    pending: dict[int, str] = field(default_factory=dict)
+    dropped: int = 0
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def offer(self, game_id: int, frame: str, resync: str | None = None) -> None:
+        """Queue ``frame``, replacing the game's unsent one.
+
+        ``resync`` is the whole state to send instead when ``frame`` is a
+        patch against the frame it would replace.
+        """
+
+        if self.pending.pop(game_id, None) is not None:
+            self.dropped += 1
+            if resync is not None:
+                frame = resync
+        self.pending[game_id] = frame
+        self.wakeup.set()
+
+
+class LiveFeed:
+    """Live game states with an event log for streaming clients.
+
+    The worker only runs while at least one client is subscribed; it is
+    started by the first subscriber on the running event loop and stops
+    once the last one leaves.
+    """
+
+    def __init__(self, live_store: LiveStore, *, history: int = LIVE_STREAM_HISTORY) -> None:
+        self._store = live_store
+        self._events: deque[LiveEvent] = deque(maxlen=history)
+        self._current: dict[int, _Current] = {}
+        self._last_id = 0
+        self._dirty: set[int] = set()
+        self._full = True
+        self._subscribers = 0
+        self._stopping = False
+        self._worker: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._published: asyncio.Event | None = None
+        self._ready: asyncio.Event | None = None
+        self._viewers: dict[str, set[Viewer]] = defaultdict(set)
+        self._tournaments: dict[int, _TournamentWindow] | None = None
+        live_store.listen(self._on_store_change)
+        changes.subscribe(self._on_change)
+
+    # -- change tracking -------------------------------------------------
+
+    def _on_change(self, change: changes.ChangeSet) -> None:
+        if change.touches(*_TOURNAMENT_TABLES):
+            self._tournaments = None
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _on_store_change(self, game_ids: set[int] | None) -> None:
+        if game_ids is None:
+            self._full = True
+        else:
+            self._dirty.update(game_ids)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # -- worker ----------------------------------------------------------
+
+    def _worker_running(self) -> bool:
+        return (
+            self._worker is not None
+            and not self._worker.done()
+            and self._worker.get_loop() is asyncio.get_running_loop()
+        )
+
+    def _start(self) -> None:
+        if self._worker_running():
+            return
+        # Changes were not applied while nobody was listening.
+        self._full = True
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._published = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._worker = asyncio.create_task(self._run(), name="live-feed")
+
+    async def stop(self) -> None:
+        """Stop the worker and end every open stream."""
+
+        self._stopping = True
+        if self._published is not None:
+            self._published.set()
+        for viewers in self._viewers.values():
+            for viewer in viewers:
+                viewer.wakeup.set()
+        if self._worker_running():
+            self._wakeup.set()
+            await self._worker
+        self._worker = None
+
+    async def _run(self) -> None:
+        while self._subscribers and not self._stopping:
+            self._wakeup.clear()
+            try:
+                await self._sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pragma: no cover - safeguard
+                logger.exception("Live feed refresh failed")
+            self._ready.set()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=STALE_CHECK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _sync(self) -> None:
+        if self._tournaments is None:
+            async with AsyncSessionLocal() as db:
+                self._tournaments = await _load_tournament_windows(db)
+
+        if self._full:
+            self._full = False
+            self._dirty.clear()
+            game_ids = None
+        else:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=LIVE_STALE_SECONDS)
+            game_ids = set(self._dirty) | {
+                game_id
+                for game_id, current in self._current.items()
+                if (utils.ensure_utc(current.state.updated_at) or cutoff) <= cutoff
+            }
+            self._dirty.difference_update(game_ids)
+            if not game_ids:
+                return
+
+        states = await self._store.states(game_ids)
+
+        published = False
+        for game_id in sorted(set(self._current) | set(states) if game_ids is None else game_ids):
+            state = states.get(game_id)
+            if state is None:
+                previous = self._current.pop(game_id, None)
+                if previous is not None:
+                    event_id = self._next_id()
+                    event = self._append(
+                        LiveEvent(
+                            id=event_id,
+                            event="ended",
+                            data=json.dumps({"game_id": game_id}),
+                            game_id=game_id,
+                            delta=LiveEvent(
+                                id=event_id,
+                                event="ended",
+                                data=json.dumps({"v": PATCH_VERSION, "game_id": game_id, "seq": event_id}),
+                                game_id=game_id,
+                            ),
+                        )
+                    )
+                    self._fan_out(event, previous.state.machine_id)
+                    published = True
+                continue
+            data = state.model_dump_json()
+            current = self._current.get(game_id)
+            if current is not None and current.data == data:
+                continue
+            event_id = self._next_id()
+            fields = json.loads(data)
+            delta_data = _delta_state(game_id, event_id, data)
+            patch = _patch(current.fields, fields) if current is not None else None
+            if patch is None:
+                delta = LiveEvent(id=event_id, event="state", data=delta_data, game_id=game_id)
+            else:
+                payload = {"v": PATCH_VERSION, "game_id": game_id, "seq": event_id, "base": current.seq, **patch}
+                delta = LiveEvent(
+                    id=event_id,
+                    event="patch",
+                    data=json.dumps(payload, separators=(",", ":")),
+                    game_id=game_id,
+                )
+            self._current[game_id] = _Current(
+                state=state, data=data, fields=fields, seq=event_id, delta_data=delta_data
+            )
+            event = self._append(LiveEvent(id=event_id, event="state", data=data, game_id=game_id, delta=delta))
+            self._fan_out(event, state.machine_id)
+            published = True
+
+        if published:
+            self._published.set()
+            self._published = asyncio.Event()
+
+    def _next_id(self) -> int:
+        self._last_id += 1
+        return self._last_id
+
+    def _append(self, event: LiveEvent) -> LiveEvent:
+        self._events.append(event)
+        return event
+
+    # -- topics ----------------------------------------------------------
+
+    def _topics(self, game_id: int, machine_id: int | None) -> set[str]:
+        topics = {ALL_LIVE_TOPIC, f"game:{game_id}"}
+        if machine_id is not None and self._tournaments:
+            now = datetime.now(timezone.utc)
+            topics.update(
+                f"tournament:{tournament_id}"
+                for tournament_id, window in self._tournaments.items()
+                if machine_id in window.machine_ids and window.running(now)
+            )
+        return topics
+
+    def _fan_out(self, event: LiveEvent, machine_id: int | None) -> None:
+        viewers: set[Viewer] = set()
+        for topic in self._topics(event.game_id, machine_id):
+            viewers.update(self._viewers.get(topic, ()))
+        if not viewers:
+            return
+        frame = event.frame()
+        delta_frame = event.for_protocol(True).frame()
+        resync = None
+        if event.event == "state":
+            resync = LiveEvent(
+                id=event.id, event="state", data=self._current[event.game_id].delta_data, game_id=event.game_id
+            ).frame()
+        for viewer in viewers:
+            if viewer.delta:
+                viewer.offer(event.game_id, delta_frame, resync)
+            else:
+                viewer.offer(event.game_id, frame)
+
+    # -- reads -----------------------------------------------------------
+
+    def states(self, game_ids: set[int] | None = None) -> list[schemas.LiveGameState]:
+        return [
+            current.state
+            for game_id, current in sorted(self._current.items())
+            if game_ids is None or game_id in game_ids
+        ]
+
+    def _snapshot_event(self, selected: Iterable[_Current], delta: bool) -> LiveEvent:
+        if delta:
+            games = ",".join(current.delta_data for current in selected)
+            data = f'{{"v":{PATCH_VERSION},"seq":{self._last_id},"games":[{games}]}}'
+        else:
+            data = "[" + ",".join(current.data for current in selected) + "]"
+        return LiveEvent(id=self._last_id, event="snapshot", data=data)
+
+    def _viewer_snapshot(self, topics: set[str], delta: bool = False) -> LiveEvent:
+        return self._snapshot_event(
+            (
+                current
+                for game_id, current in sorted(self._current.items())
+                if topics & self._topics(game_id, current.state.machine_id)
+            ),
+            delta,
+        )
+
+    def _snapshot(self, game_ids: set[int] | None, delta: bool = False) -> LiveEvent:
+        return self._snapshot_event(
+            (
+                current
+                for game_id, current in sorted(self._current.items())
+                if game_ids is None or game_id in game_ids
+            ),
+            delta,
+        )
+
+    def _can_resume(self, event_id: int) -> bool:
+        oldest = self._events[0].id if self._events else self._last_id + 1
+        return oldest - 1 <= event_id <= self._last_id
+
+    async def subscribe(
+        self, game_ids: set[int] | None = None, last_event_id: int | None = None, *, delta: bool = False
+    ) -> AsyncIterator[LiveEvent | None]:
+        """Yield live events for ``game_ids``; ``None`` marks a heartbeat.
+
+        Starts with a ``snapshot`` of the current states unless the stream
+        can resume after ``last_event_id``. ``delta`` selects the delta
+        protocol.
+        """
+
+        self._acquire()
+        try:
+            await self._ready.wait()
+            cursor = last_event_id
+            while not self._stopping:
+                if cursor is None or not self._can_resume(cursor):
+                    snapshot = self._snapshot(game_ids, delta)
+                    cursor = snapshot.id
+                    yield snapshot
+                    continue
+                pending = [event for event in self._events if event.id > cursor]
+                if pending:
+                    for event in pending:
+                        cursor = event.id
+                        if game_ids is None or event.game_id in game_ids:
+                            yield event.for_protocol(delta)
+                    continue
+                try:
+                    await asyncio.wait_for(
+                        self._published.wait(), timeout=settings.LIVE_STREAM_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def viewer(self, topics: set[str], *, delta: bool = False) -> AsyncIterator[Viewer]:
+        """Register a WebSocket viewer; its first frame is a snapshot."""
+
+        self._acquire()
+        viewer = Viewer(topics=topics, delta=delta)
+        try:
+            await self._ready.wait()
+            viewer.pending[0] = self._viewer_snapshot(topics, delta).frame()
+            for topic in topics:
+                self._viewers[topic].add(viewer)
+            yield viewer
+        finally:
+            for topic in topics:
+                self._viewers[topic].discard(viewer)
+                if not self._viewers[topic]:
+                    del self._viewers[topic]
+            self._release()
+
+    async def frames(self, viewer: Viewer) -> AsyncIterator[list[str]]:
+        """Yield batches of frames for ``viewer`` until the feed stops."""
+
+        while not self._stopping:
+            if not viewer.pending:
+                viewer.wakeup.clear()
+                await viewer.wakeup.wait()
+                continue
+            batch = list(viewer.pending.values())
+            viewer.pending.clear()
+            yield batch
+
+    def _acquire(self) -> None:
+        self._subscribers += 1
+        self._start()
+
+    def _release(self) -> None:
+        self._subscribers -= 1
+        if not self._subscribers and self._wakeup is not None:
+            self._wakeup.set()
+
+
+async def _load_tournament_windows(db: AsyncSession) -> dict[int, _TournamentWindow]:
+    machine_ids: dict[int, set[int]] = defaultdict(set)
+    for tournament_id, machine_id in await db.execute(
+        select(models.TournamentMachine.tournament_id, models.TournamentMachine.machine_id)
+    ):
+        machine_ids[tournament_id].add(machine_id)
+    result = await db.execute(
+        select(models.Tournament.id, models.Tournament.start_time, models.Tournament.end_time).where(
+            models.Tournament.is_active.is_(True)
+        )
+    )
+    return {
+        tournament_id: _TournamentWindow(frozenset(machine_ids.get(tournament_id, ())), start_time, end_time)
+        for tournament_id, start_time, end_time in result
+    }
+
+
+store = LiveStore()
+feed = LiveFeed(store)
@@ -0,0 +1,226 @@
+"""The machine directory behind ``/games/discovered``, held in memory.
+
+One row per machine uid: the active game of the most recently seen machine
+with that uid, plus the machine's name, address, version and whether the
+game has a password. Rows are built once and reused until a write touches
+their machine or game, so the admin page's polling is served from memory
+along with a cached body and ``ETag``.
+
+Ingest tags its commits with :data:`live.INGEST_ORIGIN` and applies the
+machine it just saw with :meth:`MachineDirectory.record_machine`, so a
+state packet (which only moves ``last_seen``) runs no queries here. Games
+that ingest starts or ends, and every other writer's changes, mark the
+affected uids for reloading on the next read.
+
+``last_seen`` is served to the minute, the finest the admin pages show, so
+the body and its ``ETag`` stay put between a machine's packets.
+"""
+
+from datetime import datetime, timezone
+from typing import Iterable
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import changes, live, models, response_cache, schemas, utils
+from .database import AsyncSessionLocal
+
+_WATCHED_TABLES = ("games", "machines")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_adapter = TypeAdapter(list[schemas.GameWithMachine])
+
+
+def _last_seen(dt: datetime | None) -> datetime | None:
+    dt = utils.ensure_utc(dt)
+    return None if dt is None else dt.replace(second=0, microsecond=0)
+
+
+def _key(row: schemas.GameWithMachine) -> str | int:
+    # Machines without a uid cannot be deduplicated; each game keeps its row.
+    return row.machine_uid or row.id
+
+
+def _order(row: schemas.GameWithMachine) -> tuple:
+    # Most recently seen first (to the minute), then newest game, NULLs last.
+    return (row.machine_last_seen or _EPOCH, row.id)
+
+
+async def _load_rows(db: AsyncSession, uids: set[str] | None) -> list[schemas.GameWithMachine]:
+    """Directory rows for ``uids`` (all machines when ``None``)."""
+
+    query = (
+        select(
+            models.Game.id,
+            models.Game.machine_id,
+            models.Game.start_time,
+            models.Game.end_time,
+            models.Game.is_active,
+            models.Game.admin_password,
+            models.Machine.name,
+            models.Machine.ip_address,
+            models.Machine.last_seen,
+            models.Machine.uid,
+            models.Machine.version,
+            models.Machine.version_checked_at,
+        )
+        .join(models.Game.machine)
+        .where(models.Game.is_active.is_(True))
+        .order_by(models.Machine.last_seen.desc(), models.Game.id.desc())
+    )
+    if uids is not None:
+        query = query.where(models.Machine.uid.in_(uids))
+
+    rows = []
+    seen_uids = set()
+    for game in await db.execute(query):
+        if game.uid and game.uid in seen_uids:
+            continue
+        if game.uid:
+            seen_uids.add(game.uid)
+        rows.append(
+            schemas.GameWithMachine(
+                id=game.id,
+                machine_id=game.machine_id,
+                start_time=utils.ensure_utc(game.start_time),
+                end_time=utils.ensure_utc(game.end_time),
+                is_active=game.is_active,
+                machine_name=game.name,
+                machine_ip=game.ip_address,
+                machine_last_seen=_last_seen(game.last_seen),
+                machine_uid=game.uid,
+                machine_version=game.version,
+                machine_version_checked_at=utils.ensure_utc(game.version_checked_at),
+                has_password=bool(game.admin_password),
+            )
+        )
+    return rows
+
+
+async def _uids_of(db: AsyncSession, machine_ids: set[int], game_ids: set[int]) -> set[str]:
+    query = union(
+        select(models.Machine.uid).where(models.Machine.id.in_(machine_ids)),
+        select(models.Machine.uid).join(models.Game.machine).where(models.Game.id.in_(game_ids)),
+    )
+    return set((await db.execute(query)).scalars())
+
+
+class MachineDirectory:
+    """``/games/discovered`` rows by uid, reloaded only where writes landed."""
+
+    def __init__(self) -> None:
+        self._rows: dict[str | int, schemas.GameWithMachine] = {}
+        self._full = True
+        self._dirty_machines: set[int] = set()
+        self._dirty_games: set[int] = set()
+        self._loading = False
+        # Serialized rows and their ETag; None until the next read builds them.
+        self._body: tuple[bytes, str] | None = None
+        self._lock = utils.LoopLock()
+        changes.subscribe(self._on_change)
+
+    def _on_change(self, change: changes.ChangeSet) -> None:
+        if not change.touches(*_WATCHED_TABLES):
+            return
+        if change.is_full(*_WATCHED_TABLES):
+            self._full = True
+            return
+        # Ingest applies its machines itself (see record_machine).
+        if change.origin != live.INGEST_ORIGIN:
+            self._dirty_machines.update(change.ids("machines"))
+        self._dirty_games.update(change.ids("games"))
+
+    # -- ingest ----------------------------------------------------------
+
+    def record_machine(self, machine: models.Machine) -> None:
+        """Apply machine details ingest has just committed."""
+
+        rows = [row for row in self._rows.values() if row.machine_id == machine.id]
+        current = self._rows.get(machine.uid) if machine.uid else None
+        if (
+            self._full
+            or self._loading
+            # The uid moved, or this machine may now outrank another with its uid.
+            or any(row.machine_uid != machine.uid for row in rows)
+            or (current is not None and current.machine_id != machine.id)
+        ):
+            self._dirty_machines.add(machine.id)
+            return
+        details = {
+            "machine_name": machine.name,
+            "machine_ip": machine.ip_address,
+            "machine_last_seen": _last_seen(machine.last_seen),
+            "machine_version": machine.version,
+            "machine_version_checked_at": utils.ensure_utc(machine.version_checked_at),
+        }
+        for row in rows:
+            # Most packets change nothing served; keep the body and its ETag.
+            if any(getattr(row, name) != value for name, value in details.items()):
+                for name, value in details.items():
+                    setattr(row, name, value)
+                self._body = None
+
+    # -- reads -----------------------------------------------------------
+
+    def _pending(self) -> bool:
+        return self._full or bool(self._dirty_machines or self._dirty_games)
+
+    async def refresh(self) -> None:
+        """Reload the uids other writers changed; a no-op when nothing did."""
+
+        if not self._pending():
+            return
+        async with self._lock:
+            if not self._pending():
+                return
+            self._loading = True
+            try:
+                async with AsyncSessionLocal() as db:
+                    if self._full:
+                        self._full = False
+                        self._dirty_machines.clear()
+                        self._dirty_games.clear()
+                        self._replace(None, await _load_rows(db, None))
+                    else:
+                        machine_ids, game_ids = set(self._dirty_machines), set(self._dirty_games)
+                        self._dirty_machines.difference_update(machine_ids)
+                        self._dirty_games.difference_update(game_ids)
+                        # Rows already listed cover deleted games and machines.
+                        uids = {
+                            row.machine_uid or ""
+                            for row in self._rows.values()
+                            if row.machine_id in machine_ids or row.id in game_ids
+                        }
+                        uids |= await _uids_of(db, machine_ids, game_ids)
+                        self._replace(uids, await _load_rows(db, uids))
+            finally:
+                self._loading = False
+
+    def _replace(self, uids: Iterable[str] | None, rows: list[schemas.GameWithMachine]) -> None:
+        if uids is None:
+            self._rows = {}
+        else:
+            uids = set(uids)
+            self._rows = {key: row for key, row in self._rows.items() if (row.machine_uid or "") not in uids}
+        for row in rows:
+            self._rows[_key(row)] = row
+        self._body = None
+
+    async def rows(self) -> list[schemas.GameWithMachine]:
+        await self.refresh()
+        return sorted(self._rows.values(), key=_order, reverse=True)
+
+    async def response(self, request: Request) -> Response:
+        """The directory as JSON with an ``ETag``; ``304`` when it matches."""
+
+        rows = await self.rows()
+        if self._body is None:
+            body = _adapter.dump_json(rows)
+            self._body = (body, response_cache.etag(body))
+        body, etag = self._body
+        return response_cache.conditional_response(request, body, etag)
+
+
+directory = MachineDirectory()
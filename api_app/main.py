@@ -1,18 +1,72 @@
+import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
-from . import database
+from . import analytics, background, backup, database, leaderboard_engine, live, retention, standings, sweeper
 
 from .paths import STATIC_DIR
 from .routers import api_router, pages_router
 
 
+def _format_phases(timings: dict[str, float]) -> str:
+    return " ".join(f"{phase}={elapsed:.1f}ms" for phase, elapsed in timings.items())
+
+
+async def warm_read_models() -> None:
+    """Build the in-memory read models ahead of the first requests.
+
+    Runs after startup; a read that arrives first builds what it needs.
+    """
+
+    started = time.perf_counter()
+    timings = {}
+    for phase, warm in (
+        ("leaderboards", leaderboard_engine.engine.rebuild),
+        ("live", live.store.rebuild),
+        ("standings", standings.cache.warm),
+    ):
+        phase_started = time.perf_counter()
+        await warm()
+        timings[phase] = (time.perf_counter() - phase_started) * 1000
+    print(
+        f"[startup] read models warm in {(time.perf_counter() - started) * 1000:.1f}ms | {_format_phases(timings)}",
+        flush=True,
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await database.init_db()
+    started = time.perf_counter()
+    timings = await database.init_db()
+    standings.cache.start()
+    warm_up = background.start_once("warm-read-models", warm_read_models)
+    tasks = [
+        background.start_periodic(
+            "retention", database.settings.RETENTION_INTERVAL_SECONDS, retention.run_retention
+        ),
+        background.start_periodic(
+            "analytics-export",
+            database.settings.ANALYTICS_EXPORT_INTERVAL_SECONDS,
+            analytics.export_finished_games,
+        ),
+        background.start_periodic(
+            "backup", database.settings.BACKUP_INTERVAL_SECONDS, backup.run_scheduled_backup
+        ),
+        background.start_periodic("sweeper", database.settings.GAME_SWEEP_INTERVAL_SECONDS, sweeper.run_sweep),
+    ]
+    print(
+        f"[startup] ready in {(time.perf_counter() - started) * 1000:.1f}ms | init_db {_format_phases(timings)}",
+        flush=True,
+    )
     yield
+    # Cancelling the warm-up mid-query can leave its connection holding a read
+    # transaction; it is short, so let it finish.
+    await warm_up
+    await live.feed.stop()
+    await standings.cache.stop()
+    await background.stop_tasks(tasks)
 
 
 app = FastAPI(lifespan=lifespan)
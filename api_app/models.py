@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index, JSON, LargeBinary, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -57,6 +57,7 @@ class GamePlayer(Base):
 
 class GameState(Base):
     __tablename__ = "game_states"
+    __table_args__ = (Index("ix_game_states_game_id_timestamp", "game_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     game_id = Column(Integer, ForeignKey("games.id"), nullable=False)
@@ -69,6 +70,44 @@ class GameState(Base):
     game = relationship("Game", back_populates="game_states")
 
 
+class GameEvent(Base):
+    __tablename__ = "game_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(Integer, ForeignKey("games.id"), nullable=False, index=True)
+    # start, ball, player_up or end; see api_app.game_events.
+    kind = Column(String, nullable=False)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    seconds_elapsed = Column(Integer, nullable=False)
+    ball = Column(Integer, nullable=False)
+    player_up = Column(Integer, nullable=False)
+    # Scores the previous segment ended with.
+    scores = Column(JSON, nullable=False)
+
+
+class GameTimeline(Base):
+    __tablename__ = "game_timelines"
+
+    game_id = Column(Integer, ForeignKey("games.id"), primary_key=True)
+    encoding = Column(Integer, nullable=False)
+    state_count = Column(Integer, nullable=False)
+    last_state_id = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class GameArchive(Base):
+    __tablename__ = "game_archives"
+
+    game_id = Column(Integer, ForeignKey("games.id"), primary_key=True)
+    archive_path = Column(String, nullable=True)
+    rows_archived = Column(Integer, nullable=False, default=0)
+    rows_kept = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    game = relationship("Game")
+
+
 class GameMode(Base):
     __tablename__ = "game_modes"
 
@@ -91,6 +130,10 @@ class LeaderboardProfile(Base):
     description = Column(String, nullable=True)
     sql_template = Column(Text, nullable=False)
     sort_direction = Column(String, nullable=False, default="desc")
+    # Filled by api_app.profiles when the profile is saved.
+    compiled_sql = Column(Text, nullable=True)
+    query_plan = Column(JSON, nullable=True)
+    compiled_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     tournaments = relationship("Tournament", back_populates="scoring_profile")
@@ -140,3 +183,11 @@ class TournamentPlayer(Base):
 
     tournament = relationship("Tournament", back_populates="players")
     player = relationship("Player")
+
+
+class SchemaMeta(Base):
+    __tablename__ = "schema_meta"
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
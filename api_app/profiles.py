@@ -0,0 +1,266 @@
+"""Compilation, vetting and budgeted execution of scoring profiles.
+
+A profile's ``sql_template`` is written against ``games``, ``game_states``
+and ``game_players``. When the profile is saved it is compiled once into a
+complete standings statement in which those names refer to CTEs scoped to
+a tournament. The tournament's machines, players and time range are bound
+parameters, so the stored statement is the same for every tournament.
+
+Compilation vets the statement on the live database:
+
+* an authorizer only permits reads while SQLite prepares it, so templates
+  cannot write, attach databases or change pragmas;
+* ``EXPLAIN QUERY PLAN`` must not scan an indexed table without using an
+  index (the template missed an index it could have used). The scoped
+  CTEs count as their base tables: the wrapper already narrows them
+  through an index, so scanning one as the outer loop is fine, but a scan
+  nested in another loop or a correlated subquery reads every scoped row
+  again for each outer row and is rejected. The plan is stored with the
+  profile.
+
+Execution runs under SQLite's progress handler and is interrupted once it
+exceeds ``PROFILE_QUERY_BUDGET_MS``.
+"""
+
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import settings
+
+# SQLite VM instructions between progress handler calls.
+PROGRESS_INTERVAL = 1_000
+
+_WRAPPER_CTES = {"base", "last_seen"}
+_SCOPED_BASES = {
+    "scoped_games": "games",
+    "scoped_game_states": "game_states",
+    "scoped_game_players": "game_players",
+}
+_SCOPED_TABLES = (
+    (re.compile(r"\bgame_states\b"), "scoped_game_states"),
+    (re.compile(r"\bgame_players\b"), "scoped_game_players"),
+    (re.compile(r"\bgames\b"), "scoped_games"),
+)
+_CLAUSE_KEYWORDS = (
+    "ON|USING|WHERE|JOIN|CROSS|LEFT|INNER|OUTER|NATURAL|GROUP|HAVING|ORDER|LIMIT|UNION|EXCEPT|INTERSECT|WINDOW"
+    "|FROM|SELECT"
+)
+# Also matches comma joins; select-list items after a comma are harmless extras.
+_TABLE_REFERENCE = re.compile(
+    rf"(?:\b(?:FROM|JOIN)\s+|,\s*)([A-Za-z_]\w*)(?![\w.(])"
+    rf"(?:\s+(?:AS\s+)?(?!(?:{_CLAUSE_KEYWORDS})\b)([A-Za-z_]\w*))?",
+    re.IGNORECASE,
+)
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?([A-Za-z_]\w*)$")
+
+# Authorizer actions a standings statement may perform.
+_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+_STANDINGS_SQL = """
+WITH scoped_games AS (
+    SELECT * FROM games w_g
+    WHERE (:machine_ids IS NULL OR w_g.machine_id IN (SELECT value FROM json_each(:machine_ids)))
+),
+scoped_game_states AS (
+    SELECT w_gs.*, w_g.machine_id, w_g.start_time, w_g.end_time
+    FROM game_states w_gs
+    JOIN scoped_games w_g ON w_g.id = w_gs.game_id
+    WHERE (:start_time IS NULL OR w_gs.timestamp >= :start_time)
+      AND (:end_time IS NULL OR w_gs.timestamp <= :end_time)
+),
+scoped_game_players AS (
+    SELECT w_gp.*
+    FROM game_players w_gp
+    JOIN scoped_games w_g ON w_g.id = w_gp.game_id
+    WHERE (:player_ids IS NULL OR w_gp.player_id IN (SELECT value FROM json_each(:player_ids)))
+),
+base AS (
+    {template}
+),
+last_seen AS (
+    SELECT w_gp.player_id AS player_id, MAX(w_gs.timestamp) AS last_played
+    FROM scoped_game_states w_gs
+    JOIN scoped_game_players w_gp ON w_gp.game_id = w_gs.game_id
+    GROUP BY w_gp.player_id
+)
+SELECT base.player_id AS player_id,
+       base.score AS score,
+       w_p.initials AS initials,
+       w_p.screen_name AS screen_name,
+       last_seen.last_played AS last_played
+FROM base
+JOIN players w_p ON w_p.id = base.player_id
+LEFT JOIN last_seen ON last_seen.player_id = base.player_id
+ORDER BY base.score {direction}, (last_played IS NULL), last_played DESC, initials ASC
+LIMIT 10
+"""
+
+# Parameter values used while vetting; the plan does not depend on them.
+_VETTING_PARAMS = {"machine_ids": None, "player_ids": None, "start_time": None, "end_time": None}
+
+
+class ProfileCompileError(ValueError):
+    """Raised when a scoring template is rejected at save time."""
+
+
+class ProfileBudgetExceeded(RuntimeError):
+    """Raised when a profile query runs past ``PROFILE_QUERY_BUDGET_MS``."""
+
+
+@dataclass(frozen=True)
+class CompiledProfile:
+    sql: str
+    query_plan: list[str]
+
+
+def _scope_template(sql_template: str) -> str:
+    template = sql_template.strip().rstrip(";").strip()
+    if ";" in template:
+        raise ProfileCompileError("Scoring template must be a single statement")
+    if not re.match(r"(?is)^(SELECT|WITH)\b", template):
+        raise ProfileCompileError("Scoring template must be a SELECT query")
+    template = template.replace("json_each(gs.scores) AS j(player, value)", "json_each(gs.scores) AS j")
+    for pattern, scoped in _SCOPED_TABLES:
+        template = pattern.sub(scoped, template)
+    return template
+
+
+@lru_cache(maxsize=64)
+def build_statement(sql_template: str, sort_direction: str) -> str:
+    """Complete standings statement for ``sql_template`` (not vetted)."""
+
+    direction = "ASC" if (sort_direction or "").lower() == "asc" else "DESC"
+    return _STANDINGS_SQL.format(template=_scope_template(sql_template), direction=direction)
+
+
+def _table_aliases(sql_template: str) -> dict[str, str]:
+    aliases: dict[str, str] = {}
+    for table, alias in _TABLE_REFERENCE.findall(sql_template):
+        aliases.setdefault(table.lower(), table.lower())
+        if alias:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def _nested_rows(rows: list[tuple]) -> set[int]:
+    """Plan rows that run once per row of an enclosing loop."""
+
+    nested: set[int] = set()
+    loops_seen: set[int] = set()  # parents that already have a loop child
+    for node_id, parent, _, detail in rows:
+        if parent in nested or detail.startswith("CORRELATED "):
+            nested.add(node_id)
+        if detail.startswith(("SCAN ", "SEARCH ")):
+            if parent in loops_seen:
+                nested.add(node_id)
+            loops_seen.add(parent)
+    return nested
+
+
+def _format_plan(rows: list[tuple]) -> list[str]:
+    depth: dict[int, int] = {}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def _authorize(action: int, arg1: str | None, arg2: str | None, *args: Any) -> int:
+    if action == sqlite3.SQLITE_FUNCTION and (arg2 or "").lower() == "load_extension":
+        return sqlite3.SQLITE_DENY
+    if action in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_OK
+    # Table-valued functions such as json_each declare their schema through
+    # an internal write to sqlite_master when first used.
+    if action == sqlite3.SQLITE_UPDATE and arg1 == "sqlite_master":
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+async def _driver_connection(db: AsyncSession):
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    return raw.driver_connection
+
+
+async def _indexed_tables(db: AsyncSession) -> set[str]:
+    result = await db.execute(
+        text("SELECT DISTINCT lower(tbl_name) FROM sqlite_master WHERE type = 'index'")
+    )
+    return set(result.scalars())
+
+
+async def compile_profile(db: AsyncSession, sql_template: str, sort_direction: str) -> CompiledProfile:
+    """Compile and vet a scoring template against the current schema."""
+
+    sql = build_statement(sql_template, sort_direction)
+    driver = await _driver_connection(db)
+    await driver.set_authorizer(_authorize)
+    try:
+        # Pending ORM writes must not flush while only reads are authorized.
+        with db.no_autoflush:
+            result = await db.execute(text("EXPLAIN QUERY PLAN " + sql), _VETTING_PARAMS)
+        rows = [tuple(row) for row in result.all()]
+    except OperationalError as exc:
+        raise ProfileCompileError(f"Scoring template is invalid: {exc.orig}") from exc
+    finally:
+        await driver.set_authorizer(None)
+
+    aliases = _table_aliases(_scope_template(sql_template))
+    indexed = await _indexed_tables(db)
+    nested = _nested_rows(rows)
+    for node_id, _, _, detail in rows:
+        match = _FULL_SCAN.match(detail)
+        if not match:
+            continue
+        name = match.group(1).lower()
+        if name.startswith("w_") or name in _WRAPPER_CTES:
+            continue
+        table = aliases.get(name, name)
+        base = _SCOPED_BASES.get(table)
+        if base is None and table in indexed:
+            raise ProfileCompileError(
+                f"Scoring template scans table {table!r} without using an index ({detail})"
+            )
+        if base in indexed and node_id in nested:
+            raise ProfileCompileError(
+                f"Scoring template scans table {base!r} for every row of an outer query ({detail})"
+            )
+    return CompiledProfile(sql=sql, query_plan=_format_plan(rows))
+
+
+async def execute(db: AsyncSession, sql: str, params: dict[str, Any]) -> list[dict[str, Any]]:
+    """Run a compiled standings statement within the configured budget."""
+
+    budget = settings.PROFILE_QUERY_BUDGET_MS / 1000
+    if budget <= 0:
+        return [dict(row) for row in (await db.execute(text(sql), params)).mappings()]
+
+    deadline = time.monotonic() + budget
+    driver = await _driver_connection(db)
+    await driver.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_INTERVAL)
+    try:
+        result = await db.execute(text(sql), params)
+        return [dict(row) for row in result.mappings()]
+    except OperationalError as exc:
+        if "interrupted" in str(exc.orig):
+            raise ProfileBudgetExceeded(
+                f"Scoring profile query exceeded {settings.PROFILE_QUERY_BUDGET_MS}ms"
+            ) from exc
+        raise
+    finally:
+        await driver.set_progress_handler(None, 0)
@@ -0,0 +1,137 @@
+"""Shared response cache for read-heavy leaderboard endpoints.
+
+Entries are keyed by path, query parameters and :func:`changes.data_version`,
+so any committed ingest or admin write invalidates them. Time-dependent
+output (rolling windows, tournament display periods) is bounded by
+``RESPONSE_CACHE_TTL_SECONDS``. Concurrent misses for the same key share a
+single computation, and every response carries a strong ``ETag`` so clients
+revalidating with ``If-None-Match`` get an empty ``304``.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request, Response, status
+from pydantic import TypeAdapter
+
+from . import changes
+from .database import settings
+
+MAX_ENTRIES = 256
+CACHE_CONTROL = "no-cache"
+
+
+@dataclass(frozen=True)
+class _Entry:
+    version: int
+    expires_at: float
+    body: bytes
+    etag: str
+    headers: dict[str, str]
+
+
+_entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+_inflight: dict[tuple, asyncio.Future] = {}
+_adapters: dict[Any, TypeAdapter] = {}
+
+
+def _cache_key(request: Request) -> tuple:
+    return (request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison function.
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def _serialize(response_model: Any, value: Any) -> bytes:
+    adapter = _adapters.get(response_model)
+    if adapter is None:
+        adapter = _adapters[response_model] = TypeAdapter(response_model)
+    return adapter.dump_json(value)
+
+
+def conditional_response(
+    request: Request, body: bytes, etag: str, headers: dict[str, str] | None = None
+) -> Response:
+    """``body`` as JSON with its ``ETag``, or an empty ``304`` when the client has it."""
+
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _build_response(request: Request, entry: _Entry, cache_status: str) -> Response:
+    return conditional_response(request, entry.body, entry.etag, {**entry.headers, "X-Cache": cache_status})
+
+
+async def cached_response(
+    request: Request,
+    response_model: Any,
+    compute: Callable[[], Awaitable[Any]],
+    *,
+    headers: Callable[[Any], dict[str, str]] | None = None,
+) -> Response:
+    """Serve ``compute()`` serialized as ``response_model`` through the cache.
+
+    ``headers`` derives extra response headers from the computed value; they
+    are cached alongside the body.
+    """
+
+    key = _cache_key(request)
+    version = changes.data_version()
+    now = time.monotonic()
+
+    entry = _entries.get(key)
+    if entry is not None and entry.version == version and entry.expires_at > now:
+        _entries.move_to_end(key)
+        return _build_response(request, entry, "HIT")
+
+    flight_key = (key, version)
+    pending = _inflight.get(flight_key)
+    if pending is not None:
+        entry = await asyncio.shield(pending)
+        return _build_response(request, entry, "HIT")
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[flight_key] = future
+    try:
+        value = await compute()
+        body = _serialize(response_model, value)
+        entry = _Entry(
+            version=version,
+            expires_at=time.monotonic() + settings.RESPONSE_CACHE_TTL_SECONDS,
+            body=body,
+            etag=etag(body),
+            headers=headers(value) if headers else {},
+        )
+        if settings.RESPONSE_CACHE_TTL_SECONDS > 0:
+            _entries[key] = entry
+            _entries.move_to_end(key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+        future.set_result(entry)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        # Nobody may be waiting; mark the exception retrieved.
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(flight_key, None)
+
+    return _build_response(request, entry, "MISS")
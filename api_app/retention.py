@@ -0,0 +1,274 @@
+"""Game-state retention: downsample finished games and archive the full timeline.
+
+Finished games older than ``RETENTION_DAYS`` keep only the rows needed to
+describe the game (ball and player-up transitions, per-player score extremes
+and the final row). The full-resolution timeline is appended to a gzip'd
+JSON-lines file per month so replays can still read it back on demand.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, Sequence
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas, timeline, utils
+from .database import AsyncSessionLocal, settings, sqlite_database_path
+
+logger = logging.getLogger(__name__)
+
+# Keep individual DELETE statements well under SQLite's bound-parameter limit.
+DELETE_CHUNK_SIZE = 500
+
+
+def archive_dir() -> Path:
+    if settings.ARCHIVE_DIR:
+        return Path(settings.ARCHIVE_DIR).expanduser().resolve()
+    database_path = sqlite_database_path()
+    if database_path:
+        return database_path.parent / "archive"
+    return Path("./data/archive").resolve()
+
+
+def _archive_path(game: models.Game) -> Path:
+    started = utils.ensure_utc(game.start_time or game.end_time) or datetime.now(timezone.utc)
+    return archive_dir() / f"game_states-{started:%Y-%m}.jsonl.gz"
+
+
+def _score_items(raw_scores) -> Iterable[tuple[str, int]]:
+    if isinstance(raw_scores, dict):
+        items = raw_scores.items()
+    elif isinstance(raw_scores, list):
+        items = ((str(idx + 1), value) for idx, value in enumerate(raw_scores))
+    else:
+        items = ()
+    for key, value in items:
+        try:
+            yield str(key), int(value or 0)
+        except (TypeError, ValueError):
+            continue
+
+
+def _rows_to_keep(states: Sequence[models.GameState]) -> set[int]:
+    """Return the ids of the states that survive downsampling.
+
+    ``states`` must be ordered chronologically. Besides transitions and the
+    final row, the rows holding each player's highest and lowest score are
+    kept so MAX/MIN based scoring profiles produce the same standings.
+    """
+
+    if not states:
+        return set()
+
+    keep = {states[0].id, states[-1].id}
+    highest: dict[str, tuple[int, int]] = {}
+    lowest: dict[str, tuple[int, int]] = {}
+
+    for previous, state in zip(states, states[1:]):
+        if state.ball != previous.ball or state.player_up != previous.player_up:
+            # The previous row closes the ball; the current one opens the next.
+            keep.add(previous.id)
+            keep.add(state.id)
+
+    for state in states:
+        for player, score in _score_items(state.scores):
+            if player not in highest or score > highest[player][0]:
+                highest[player] = (score, state.id)
+            if player not in lowest or score < lowest[player][0]:
+                lowest[player] = (score, state.id)
+
+    keep.update(state_id for _, state_id in highest.values())
+    keep.update(state_id for _, state_id in lowest.values())
+    return keep
+
+
+def _state_record(state: models.GameState) -> dict:
+    timestamp = utils.ensure_utc(state.timestamp)
+    return {
+        "id": state.id,
+        "game_id": state.game_id,
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "seconds_elapsed": state.seconds_elapsed,
+        "ball": state.ball,
+        "player_up": state.player_up,
+        "scores": state.scores or {},
+    }
+
+
+def _append_archive(path: Path, records: list[dict]) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+    compressed = gzip.compress(payload.encode("utf-8"))
+    # Concatenated gzip members form a valid stream, so appending is safe.
+    with path.open("ab") as handle:
+        handle.write(compressed)
+    return len(compressed)
+
+
+def _read_archive(path: Path, game_id: int) -> list[dict]:
+    if not path.exists():
+        return []
+    records: dict[int, dict] = {}
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("game_id") == game_id:
+                # A run interrupted after writing may archive a game twice.
+                records[record["id"]] = record
+    return list(records.values())
+
+
+async def _freelist_bytes(db: AsyncSession) -> int:
+    if db.bind.dialect.name != "sqlite":
+        return 0
+    page_size = (await db.execute(text("PRAGMA page_size"))).scalar_one()
+    free_pages = (await db.execute(text("PRAGMA freelist_count"))).scalar_one()
+    return int(page_size) * int(free_pages)
+
+
+async def _candidate_game_ids(db: AsyncSession, cutoff: datetime, limit: int | None) -> list[int]:
+    archived = select(models.GameArchive.game_id)
+    query = (
+        select(models.Game.id)
+        .where(
+            models.Game.is_active.is_(False),
+            func.coalesce(models.Game.end_time, models.Game.start_time) < cutoff,
+            models.Game.id.not_in(archived),
+        )
+        .order_by(models.Game.id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+async def compact_game(db: AsyncSession, game: models.Game) -> tuple[int, int, int]:
+    """Archive and downsample a single game inside one short transaction.
+
+    Returns ``(rows_archived, rows_deleted, archived_bytes)``.
+    """
+
+    result = await db.execute(
+        select(models.GameState)
+        .where(models.GameState.game_id == game.id)
+        .order_by(models.GameState.timestamp.asc(), models.GameState.id.asc())
+    )
+    states = result.scalars().all()
+    keep = _rows_to_keep(states)
+    dropped = [state.id for state in states if state.id not in keep]
+
+    if settings.COMPACT_TIMELINES:
+        # Full-game reads keep their resolution through the compact timeline.
+        await timeline.store_timeline(db, game.id, states)
+
+    path: Path | None = None
+    archived_bytes = 0
+    if dropped:
+        path = _archive_path(game)
+        records = [_state_record(state) for state in states]
+        archived_bytes = await asyncio.to_thread(_append_archive, path, records)
+        for start in range(0, len(dropped), DELETE_CHUNK_SIZE):
+            chunk = dropped[start : start + DELETE_CHUNK_SIZE]
+            await db.execute(
+                delete(models.GameState)
+                .where(models.GameState.id.in_(chunk))
+                .execution_options(synchronize_session=False)
+            )
+
+    db.add(
+        models.GameArchive(
+            game_id=game.id,
+            archive_path=path.name if path else None,
+            rows_archived=len(states) if dropped else 0,
+            rows_kept=len(states) - len(dropped),
+        )
+    )
+    await db.commit()
+    return (len(states) if dropped else 0), len(dropped), archived_bytes
+
+
+async def run_retention(
+    *,
+    now: datetime | None = None,
+    retention_days: int | None = None,
+    batch_size: int | None = None,
+    max_games: int | None = None,
+) -> schemas.RetentionReport:
+    """Compact finished games older than the retention window.
+
+    Games are processed in batches with one commit per game so ingest never
+    waits on a long-held write lock. ``max_games`` bounds a single run; the
+    remaining backlog is reported and picked up on the next run.
+    """
+
+    report = schemas.RetentionReport()
+    days = settings.RETENTION_DAYS if retention_days is None else retention_days
+    if days <= 0:
+        return report
+
+    now = utils.ensure_utc(now) or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=days)
+    batch = max(batch_size or settings.RETENTION_BATCH_SIZE, 1)
+
+    async with AsyncSessionLocal() as db:
+        free_before = await _freelist_bytes(db)
+
+        while max_games is None or report.games_compacted < max_games:
+            limit = batch if max_games is None else min(batch, max_games - report.games_compacted)
+            game_ids = await _candidate_game_ids(db, cutoff, limit)
+            await db.commit()
+            if not game_ids:
+                break
+
+            for game_id in game_ids:
+                game = await db.get(models.Game, game_id)
+                if game is None:
+                    continue
+                archived, deleted, written = await compact_game(db, game)
+                report.games_compacted += 1
+                report.rows_archived += archived
+                report.rows_deleted += deleted
+                report.archived_bytes += written
+                # Let ingest and API requests run between games.
+                await asyncio.sleep(0)
+
+        report.remaining_games = len(await _candidate_game_ids(db, cutoff, None))
+        report.reclaimed_bytes = max(await _freelist_bytes(db) - free_before, 0)
+        await db.commit()
+
+    logger.info(
+        "Retention compacted %s games: archived=%s deleted=%s reclaimed=%sB remaining=%s",
+        report.games_compacted,
+        report.rows_archived,
+        report.rows_deleted,
+        report.reclaimed_bytes,
+        report.remaining_games,
+    )
+    return report
+
+
+async def load_full_timeline(db: AsyncSession, game: models.Game) -> list[schemas.GameState]:
+    """Return every state recorded for ``game``, reading archived rows back in."""
+
+    result = await db.execute(
+        select(models.GameState)
+        .where(models.GameState.game_id == game.id)
+        .order_by(models.GameState.timestamp.asc(), models.GameState.id.asc())
+    )
+    states = {state.id: schemas.GameState.model_validate(state) for state in result.scalars().all()}
+
+    archive = await db.get(models.GameArchive, game.id)
+    if archive and archive.archive_path:
+        records = await asyncio.to_thread(_read_archive, archive_dir() / archive.archive_path, game.id)
+        for record in records:
+            states.setdefault(record["id"], schemas.GameState.model_validate(record))
+
+    return sorted(states.values(), key=lambda state: (utils.ensure_utc(state.timestamp), state.id))
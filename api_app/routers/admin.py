@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import hmac
 import logging
@@ -13,7 +14,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from .. import database, models, schemas, udp
+from .. import analytics, backup, database, leaderboard_engine, models, retention, schemas, sweeper, udp
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 security = HTTPBasic()
@@ -203,3 +204,53 @@ async def apply_machine_updates(
 ):
     game = await _get_game_with_machine(game_id, db)
     return await _apply_machine_update(game, payload.url)
+
+
+@router.post("/retention/run", response_model=schemas.RetentionReport)
+async def run_retention(
+    max_games: int | None = None,
+    _: None = Depends(_verify_admin),
+):
+    return await retention.run_retention(max_games=max_games)
+
+
+@router.post("/sweeper/run", response_model=schemas.SweepReport)
+async def run_sweeper(_: None = Depends(_verify_admin)):
+    return await sweeper.run_sweep()
+
+
+@router.get("/sweeper", response_model=schemas.SweeperMetrics)
+async def sweeper_metrics(_: None = Depends(_verify_admin)):
+    return sweeper.metrics
+
+
+@router.post("/analytics/export", response_model=schemas.AnalyticsExportReport)
+async def export_analytics(_: None = Depends(_verify_admin)):
+    if not analytics.available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Analytics store unavailable"
+        )
+    return await analytics.export_finished_games()
+
+
+@router.get("/leaderboards/check", response_model=schemas.LeaderboardConsistencyReport)
+async def check_leaderboards(_: None = Depends(_verify_admin)):
+    return await leaderboard_engine.engine.check_consistency()
+
+
+@router.get("/backups", response_model=List[schemas.BackupFile])
+async def list_backups(_: None = Depends(_verify_admin)):
+    return await asyncio.to_thread(backup.list_backups)
+
+
+@router.post("/backups", response_model=schemas.BackupReport, status_code=status.HTTP_201_CREATED)
+async def create_backup(
+    compress: bool | None = None,
+    _: None = Depends(_verify_admin),
+):
+    try:
+        return await backup.create_backup(compress=compress)
+    except backup.BackupUnavailable as exc:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)) from exc
+    except backup.BackupInProgress as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
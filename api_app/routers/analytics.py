@@ -0,0 +1,30 @@
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, status
+
+from .. import analytics, schemas
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+def _require_store() -> None:
+    if not analytics.available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Analytics store unavailable"
+        )
+
+
+@router.get("/leaderboard", response_model=List[schemas.AnalyticsLeaderboardEntry])
+async def historical_leaderboard(
+    year: int | None = None,
+    machine_id: int | None = None,
+    limit: int = Query(10, ge=1, le=500),
+):
+    _require_store()
+    return await analytics.top_scores(year=year, machine_id=machine_id, limit=limit)
+
+
+@router.get("/machines", response_model=List[schemas.AnalyticsMachineStats])
+async def machine_analytics(year: int | None = None):
+    _require_store()
+    return await analytics.machine_stats(year=year)
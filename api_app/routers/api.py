@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from .analytics import router as analytics_router
 from .games import router as games_router
 from .leaderboard import router as leaderboard_router
 from .machines import router as machines_router
@@ -24,5 +25,6 @@ for router in (
     admin_router,
     tournaments_router,
     ray_router,
+    analytics_router,
 ):
     api_router.include_router(router)
@@ -1,23 +1,17 @@
-from collections import defaultdict
-from datetime import datetime, timezone
-from typing import List, Optional
+import asyncio
+from typing import AsyncIterator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import database, models, schemas
+from .. import database, game_events, live, machine_directory, models, retention, schemas, score_history
 
-LIVE_STALE_SECONDS = 60
-
-
-def _ensure_utc(dt: datetime | None) -> datetime | None:
-    if dt is None:
-        return None
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
+SSE_MEDIA_TYPE = "text/event-stream"
+# Reconnect delay suggested to EventSource clients.
+SSE_RETRY_MS = 2000
 
 router = APIRouter(prefix="/games", tags=["games"])
 
@@ -32,204 +26,19 @@ async def _latest_state(db: AsyncSession, game_id: int) -> Optional[models.GameS
     return result.scalars().first()
 
 
-async def _all_states(db: AsyncSession, game_id: int) -> list[models.GameState]:
-    result = await db.execute(
-        select(models.GameState)
-        .where(models.GameState.game_id == game_id)
-        .order_by(models.GameState.timestamp.asc())
-    )
-    return result.scalars().all()
+async def _live_event_stream(
+    game_ids: set[int] | None, last_event_id: int | None, delta: bool
+) -> AsyncIterator[bytes]:
+    yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+    async for event in live.feed.subscribe(game_ids, last_event_id, delta=delta):
+        yield b": heartbeat\n\n" if event is None else event.encode()
 
 
-def _parse_scores(raw_scores) -> dict[int, int]:
-    parsed: dict[int, int] = {}
-    if isinstance(raw_scores, dict):
-        iterable = raw_scores.items()
-    elif isinstance(raw_scores, list):
-        iterable = ((idx + 1, value) for idx, value in enumerate(raw_scores))
-    else:
-        iterable = []
-
-    for key, value in iterable:
-        try:
-            player_number = int(key)
-            parsed[player_number] = int(value or 0)
-        except (TypeError, ValueError):
-            continue
-    return parsed
-
-
-def _collect_play_stats(
-    states: list[models.GameState],
-) -> tuple[dict[int, dict[str, object]], Optional[int]]:
-    timelines: dict[int, dict[int, dict[str, int | None]]] = defaultdict(
-        lambda: defaultdict(
-            lambda: {
-                "start_time": None,
-                "end_time": None,
-                "start_score": None,
-                "end_score": None,
-            }
-        )
-    )
-    previous_scores: dict[int, int] = {}
-    last_scorer: Optional[int] = None
-    last_state_second = 0
-
-    for state in states:
-        scores = _parse_scores(state.scores or {})
-        priors: dict[int, int] = {}
-        active_players: set[int] = set()
-
-        for player_number, score in scores.items():
-            prior_score = previous_scores.get(player_number, score)
-            priors[player_number] = prior_score
-            if prior_score != score:
-                active_players.add(player_number)
-                last_scorer = player_number
-
-        if not active_players and scores:
-            active_players.add(state.player_up or min(scores))
-
-        for player_number in active_players:
-            score = scores.get(player_number, previous_scores.get(player_number, 0))
-            prior_score = priors.get(player_number, score)
-            bucket = timelines[player_number][state.ball]
-            if bucket["start_time"] is None:
-                bucket["start_time"] = state.seconds_elapsed
-                bucket["start_score"] = prior_score
-
-            bucket["end_time"] = state.seconds_elapsed
-            bucket["end_score"] = score
-
-        for player_number, score in scores.items():
-            previous_scores[player_number] = score
-
-        last_state_second = state.seconds_elapsed
-
-    active_ball = states[-1].ball if states else None
-
-    totals: dict[int, dict[str, object]] = {}
-    for player_number, balls in timelines.items():
-        total_seconds = 0
-        ball_times: list[schemas.BallPlayTime] = []
-        for ball, bounds in sorted(balls.items()):
-            start = bounds["start_time"]
-            end = bounds["end_time"] if bounds["end_time"] is not None else last_state_second
-            start_score = bounds.get("start_score") or 0
-            end_score = bounds.get("end_score") or start_score
-
-            if start is None:
-                continue
-
-            elapsed = max(end - start, 0)
-            score_delta = max(end_score - start_score, 0)
-            total_seconds += elapsed
-            ball_times.append(
-                schemas.BallPlayTime(
-                    ball=ball,
-                    seconds=int(elapsed),
-                    score=int(score_delta),
-                    is_current=ball == active_ball,
-                )
-            )
-
-        totals[player_number] = {
-            "total_seconds": total_seconds,
-            "ball_times": ball_times,
-        }
-
-    return totals, last_scorer
-
-
-async def _build_live_state(
-    db: AsyncSession, game: models.Game
-) -> Optional[schemas.LiveGameState]:
-    states = await _all_states(db, game.id)
-    if not states:
-        return None
-
-    state = states[-1]
-    latest_timestamp = _ensure_utc(state.timestamp)
-    if latest_timestamp:
-        age = (datetime.now(timezone.utc) - latest_timestamp).total_seconds()
-        if age > LIVE_STALE_SECONDS:
-            return None
-
-    player_scores: list[schemas.LiveScore] = []
-    scores = _parse_scores(state.scores or {})
-    if not scores:
-        return None
-
-    play_times, last_scorer = _collect_play_stats(states)
-
-    active_player = last_scorer or state.player_up or 1
-
-    for game_player in sorted(game.game_players, key=lambda gp: gp.player_number):
-        player = game_player.player
-        score_value = scores.get(game_player.player_number, 0)
-        durations = play_times.get(game_player.player_number, {})
-        ball_times = [
-            schemas.BallPlayTime(
-                ball=bt.ball,
-                seconds=bt.seconds,
-                score=bt.score,
-                is_current=bt.ball == state.ball and game_player.player_number == active_player,
-            )
-            for bt in durations.get("ball_times", [])
-        ]
-        player_scores.append(
-            schemas.LiveScore(
-                player_id=player.id if player else None,
-                player_number=game_player.player_number,
-                initials=player.initials if player else None,
-                screen_name=player.screen_name if player else None,
-                score=score_value,
-                total_play_seconds=int(durations.get("total_seconds", 0)),
-                ball_times=ball_times,
-                is_player_up=game_player.player_number == active_player,
-            )
-        )
-
-    for player_number, score_value in sorted(scores.items()):
-        if any(entry.player_number == player_number for entry in player_scores):
-            continue
-        durations = play_times.get(player_number, {})
-        ball_times = [
-            schemas.BallPlayTime(
-                ball=bt.ball,
-                seconds=bt.seconds,
-                score=bt.score,
-                is_current=bt.ball == state.ball and player_number == active_player,
-            )
-            for bt in durations.get("ball_times", [])
-        ]
-        player_scores.append(
-            schemas.LiveScore(
-                player_id=None,
-                player_number=player_number,
-                initials=None,
-                screen_name=None,
-                score=score_value,
-                total_play_seconds=int(durations.get("total_seconds", 0)),
-                ball_times=ball_times,
-                is_player_up=player_number == active_player,
-            )
-        )
-
-    return schemas.LiveGameState(
-        game_id=game.id,
-        machine_id=game.machine_id,
-        machine_uid=game.machine.uid if game.machine else None,
-        machine_name=game.machine.name if game.machine else None,
-        machine_ip=game.machine.ip_address if game.machine else None,
-        is_active=game.is_active,
-        seconds_elapsed=state.seconds_elapsed,
-        ball=state.ball,
-        player_up=active_player,
-        updated_at=state.timestamp,
-        scores=player_scores,
-    )
+async def _send_frames(websocket: WebSocket, viewer: live.Viewer) -> None:
+    async for frames in live.feed.frames(viewer):
+        for frame in frames:
+            await websocket.send_text(frame)
+    await websocket.close()
 
 
 @router.post("/", response_model=schemas.Game)
@@ -248,72 +57,100 @@ async def read_games(skip: int = 0, limit: int = 100, db: AsyncSession = Depends
 
 
 @router.get("/discovered", response_model=List[schemas.GameWithMachine])
-async def discovered_games(db: AsyncSession = Depends(database.get_db)):
-    result = await db.execute(
-        select(models.Game)
-        .join(models.Game.machine)
-        .options(selectinload(models.Game.machine))
-        .where(models.Game.is_active.is_(True))
-        .order_by(models.Machine.last_seen.desc(), models.Game.id.desc())
-    )
+async def discovered_games(request: Request):
+    """One active game per machine uid, served from the machine directory.
 
-    seen_uids = set()
-    games = []
-
-    for game in result.scalars().unique().all():
-        uid = game.machine.uid if game.machine else None
-        if uid and uid in seen_uids:
-            continue
-        if uid:
-            seen_uids.add(uid)
-        games.append(game)
-
-    return [
-        schemas.GameWithMachine(
-            id=game.id,
-            machine_id=game.machine_id,
-            start_time=game.start_time,
-            end_time=game.end_time,
-            is_active=game.is_active,
-            machine_name=game.machine.name if game.machine else None,
-            machine_ip=game.machine.ip_address if game.machine else None,
-            machine_last_seen=game.machine.last_seen if game.machine else None,
-            machine_uid=game.machine.uid if game.machine else None,
-            machine_version=game.machine.version if game.machine else None,
-            machine_version_checked_at=game.machine.version_checked_at if game.machine else None,
-            has_password=bool(game.admin_password),
-        )
-        for game in games
-    ]
+    Responses carry an ``ETag``; revalidating with ``If-None-Match`` gets an
+    empty ``304`` until a machine or game in the directory changes.
+    """
+
+    return await machine_directory.directory.response(request)
 
 
 @router.get("/live", response_model=List[schemas.LiveGameState])
-async def live_games(db: AsyncSession = Depends(database.get_db)):
-    result = await db.execute(
-        select(models.Game)
-            .where(models.Game.is_active.is_(True))
-            .options(
-                selectinload(models.Game.machine),
-                selectinload(models.Game.game_players).selectinload(models.GamePlayer.player),
-            )
-            .order_by(models.Game.id)
-    )
+async def live_games():
+    return list((await live.store.states()).values())
+
 
-    games = result.scalars().unique().all()
-    live_states: list[schemas.LiveGameState] = []
+@router.get("/live/stream")
+async def live_games_stream(
+    game_id: list[int] | None = Query(None),
+    delta: int | None = Query(None),
+    last_event_id: str | None = Header(None),
+):
+    """Server-Sent Events with the state of live games as it changes.
+
+    The stream opens with a ``snapshot`` event (a JSON list of live games)
+    and continues with ``state`` events carrying one ``LiveGameState`` and
+    ``ended`` events when a game stops being live. Reconnecting with
+    ``Last-Event-ID`` resumes where the client left off. ``game_id`` limits
+    the stream to the given games.
+
+    ``delta=1`` selects the delta protocol: the snapshot is
+    ``{"v", "seq", "games"}`` with one ``{"v", "game_id", "seq", "state"}``
+    per game, ``state`` events carry the same objects, and later changes
+    arrive as ``patch`` events with ``seq``, the ``base`` they apply to, the
+    top-level fields that changed (``set``) and the changed fields and ball
+    times of each player whose entry changed (``scores``).
+    """
+
+    try:
+        resume_after = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an event id")
+    try:
+        use_delta = live.parse_delta(delta)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return StreamingResponse(
+        _live_event_stream(set(game_id) if game_id else None, resume_after, use_delta),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    for game in games:
-        live_state = await _build_live_state(db, game)
-        if live_state:
-            live_states.append(live_state)
 
-    return live_states
+@router.websocket("/live/ws")
+async def live_games_socket(
+    websocket: WebSocket, topic: list[str] = Query(["live"]), delta: int | None = Query(None)
+):
+    """Live game states pushed over a WebSocket.
+
+    ``topic`` selects ``live`` (every live game), ``game:<id>`` or
+    ``tournament:<id>`` and may be repeated. Messages are JSON objects with
+    ``id``, ``event`` (``snapshot``, ``state`` or ``ended``) and ``data``
+    shaped as on ``/games/live/stream``, including ``patch`` events with
+    ``delta=1``. Slow clients skip intermediate states of a game.
+    """
+
+    try:
+        topics = live.parse_topics(topic)
+        use_delta = live.parse_delta(delta)
+    except ValueError as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc))
+        return
+    await websocket.accept()
+    async with live.feed.viewer(topics, delta=use_delta) as viewer:
+        sender = asyncio.create_task(_send_frames(websocket, viewer))
+        try:
+            # Nothing is expected from the client; this notices the disconnect.
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
 
 
 @router.get("/{game_id}/live", response_model=schemas.LiveGameState)
 async def live_game(
     game_id: int, db: AsyncSession = Depends(database.get_db)
 ):
+    live_state = await live.store.state(game_id)
+    if live_state is not None:
+        return live_state
+
+    # Not live in memory: a game that just ended or went quiet.
     result = await db.execute(
         select(models.Game)
         .where(models.Game.id == game_id)
@@ -326,13 +163,50 @@ async def live_game(
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    live_state = await _build_live_state(db, game)
+    live_state = await live.build_live_state(db, game)
     if not live_state:
         raise HTTPException(status_code=404, detail="No game state available")
 
     return live_state
 
 
+@router.get("/{game_id}/states", response_model=List[schemas.GameState])
+async def game_states(game_id: int, db: AsyncSession = Depends(database.get_db)):
+    game = await db.get(models.Game, game_id)
+    if game is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return await retention.load_full_timeline(db, game)
+
+
+@router.get("/{game_id}/balls", response_model=List[schemas.BallSummary])
+async def game_balls(game_id: int, db: AsyncSession = Depends(database.get_db)):
+    """Time played and points scored per ball and player."""
+
+    game = await db.get(models.Game, game_id)
+    if game is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return await game_events.game_ball_summaries(db, game)
+
+
+@router.get("/{game_id}/timeline", response_model=schemas.ScoreTimeline)
+async def game_timeline(
+    game_id: int,
+    points: int = Query(score_history.DEFAULT_POINTS, ge=3, le=score_history.MAX_POINTS),
+    db: AsyncSession = Depends(database.get_db),
+):
+    """Each player's score over the game clock, downsampled to ``points`` per player."""
+
+    result = await db.execute(
+        select(models.Game)
+        .where(models.Game.id == game_id)
+        .options(selectinload(models.Game.game_players).selectinload(models.GamePlayer.player))
+    )
+    game = result.scalars().first()
+    if game is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return await score_history.score_timeline(db, game, points)
+
+
 @router.get("/{game_id}", response_model=schemas.Game)
 async def read_game(game_id: int, db: AsyncSession = Depends(database.get_db)):
     result = await db.execute(select(models.Game).where(models.Game.id == game_id))
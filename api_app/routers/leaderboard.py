@@ -1,24 +1,24 @@
+import bisect
+import re
 from datetime import datetime, timedelta, timezone
-from typing import Iterable, List, Optional
+from itertools import groupby
+from typing import AsyncIterator, List, Literal, Optional
 
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import bindparam, select, text
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import database, models, schemas
+from .. import database, leaderboard_engine, models, response_cache, schemas
+from .. import standings as tournament_standings
 
 router = APIRouter(tags=["leaderboard"])
 
-
-def _latest_scores(game: models.Game) -> dict:
-    if not game.game_states:
-        return {}
-
-    latest_state = _latest_state(game)
-    return latest_state.scores or {}
+LEADERBOARD_BATCH_SIZE = 200
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
 
 def _score_for_player(scores: dict, player_number: int) -> int:
@@ -38,34 +38,11 @@ def _coerce_timestamp(timestamp: datetime | None) -> datetime | None:
     return timestamp
 
 
-def _latest_state(game: models.Game) -> models.GameState | None:
-    if not game.game_states:
-        return None
-
-    return max(
-        game.game_states,
-        key=lambda state: state.timestamp or datetime.min,
+def _build_leaderboard(game: models.Game, latest_state: models.GameState | None) -> schemas.LeaderboardGame:
+    scores = (latest_state.scores or {}) if latest_state else {}
+    last_played = _coerce_timestamp(
+        latest_state.timestamp if latest_state else game.end_time or game.start_time
     )
-
-
-def _latest_state_timestamp(game: models.Game) -> datetime | None:
-    state = _latest_state(game)
-    if state:
-        return _coerce_timestamp(state.timestamp)
-    return _coerce_timestamp(game.end_time or game.start_time)
-
-
-def _game_last_activity(game: models.Game) -> datetime | None:
-    timestamp = _latest_state_timestamp(game)
-    if timestamp:
-        return timestamp
-    if game.updated_at:
-        return _coerce_timestamp(game.updated_at)
-    return _coerce_timestamp(game.start_time)
-
-
-def _build_leaderboard(game: models.Game) -> schemas.LeaderboardGame:
-    scores = _latest_scores(game)
     entries: list[schemas.LeaderboardEntry] = []
 
     for game_player in game.game_players:
@@ -77,7 +54,7 @@ def _build_leaderboard(game: models.Game) -> schemas.LeaderboardGame:
                 initials=player.initials,
                 screen_name=player.screen_name,
                 score=_score_for_player(scores, game_player.player_number),
-                last_played=_latest_state_timestamp(game),
+                last_played=last_played,
                 machine_name=game.machine.name if game.machine else None,
             )
         )
@@ -94,102 +71,6 @@ def _build_leaderboard(game: models.Game) -> schemas.LeaderboardGame:
     )
 
 
-def _player_snapshots(games: Iterable[models.Game]) -> list[schemas.LeaderboardEntry]:
-    snapshots: list[schemas.LeaderboardEntry] = []
-
-    for game in games:
-        scores = _latest_scores(game)
-        observed_at = _latest_state_timestamp(game)
-        for game_player in game.game_players:
-            player = game_player.player
-            snapshots.append(
-                schemas.LeaderboardEntry(
-                    player_id=player.id,
-                    player_number=game_player.player_number,
-                    initials=player.initials,
-                    screen_name=player.screen_name,
-                    score=_score_for_player(scores, game_player.player_number),
-                    last_played=observed_at,
-                    machine_name=game.machine.name if game.machine else None,
-                )
-            )
-
-    return snapshots
-
-
-def _aggregate_by_timeframe(
-    snapshots: Iterable[schemas.LeaderboardEntry], since: datetime | None
-) -> list[schemas.LeaderboardEntry]:
-    best_scores: dict[int, schemas.LeaderboardEntry] = {}
-
-    for snapshot in snapshots:
-        last_played = _coerce_timestamp(snapshot.last_played)
-        if since and last_played and last_played < since:
-            continue
-
-        existing = best_scores.get(snapshot.player_id)
-        if not existing:
-            best_scores[snapshot.player_id] = snapshot
-            continue
-
-        if snapshot.score > existing.score or (
-            snapshot.score == existing.score
-            and (_coerce_timestamp(snapshot.last_played) or datetime.min)
-            > (_coerce_timestamp(existing.last_played) or datetime.min)
-        ):
-            best_scores[snapshot.player_id] = snapshot
-
-    return sorted(
-        best_scores.values(),
-        key=lambda entry: (entry.score, entry.last_played or datetime.min),
-        reverse=True,
-    )
-
-
-def _timeframes(now: datetime) -> list[tuple[str, str, datetime | None]]:
-    start_of_year = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    start_of_week = (now - timedelta(days=now.weekday())).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-    last_24_hours = now - timedelta(hours=24)
-
-    return [
-        ("all-time", "Top all time", None),
-        ("year", "Top this year", start_of_year),
-        ("month", "Top this month", start_of_month),
-        ("week", "Top this week", start_of_week),
-        ("24h", "Top last 24 hours", last_24_hours),
-    ]
-
-
-def _build_time_leaderboards(
-    snapshots: list[schemas.LeaderboardEntry],
-    now: datetime,
-    *,
-    title_prefix: str | None = None,
-    slug_prefix: str | None = None,
-    include_empty: bool = False,
-) -> list[schemas.TimeWindowLeaderboard]:
-    leaderboards: list[schemas.TimeWindowLeaderboard] = []
-
-    for slug, title, since in _timeframes(now):
-        entries = _aggregate_by_timeframe(snapshots, since)
-        if not entries and not include_empty:
-            continue
-
-        leaderboards.append(
-            schemas.TimeWindowLeaderboard(
-                slug=f"{slug_prefix or ''}{slug}",
-                title=f"{title_prefix + ' · ' if title_prefix else ''}{title}",
-                since=since,
-                leaderboard=entries,
-            )
-        )
-
-    return leaderboards
-
-
 def _should_display_tournament(tournament: models.Tournament, now: datetime) -> bool:
     start = _coerce_timestamp(tournament.start_time)
     display_until = _coerce_timestamp(tournament.display_until)
@@ -212,114 +93,6 @@ def _should_display_tournament(tournament: models.Tournament, now: datetime) ->
     return False
 
 
-def _scoped_template(sql_template: str) -> str:
-    sanitized = sql_template.replace(
-        "json_each(gs.scores) AS j(player, value)", "json_each(gs.scores) AS j"
-    )
-    return (
-        sanitized.replace("game_states", "scoped_game_states")
-        .replace("game_players", "scoped_game_players")
-        .replace("games", "scoped_games")
-    )
-
-
-async def _tournament_standings(
-    db: AsyncSession, tournament: models.Tournament
-) -> list[schemas.TournamentStanding]:
-    profile = tournament.scoring_profile
-    if not profile:
-        return []
-
-    scoped_sql = _scoped_template(profile.sql_template)
-
-    params: dict[str, object] = {}
-    game_filters: list[str] = ["1=1"]
-    state_filters: list[str] = ["1=1"]
-    player_filters: list[str] = ["1=1"]
-
-    if tournament.machines:
-        params["machine_ids"] = [link.machine_id for link in tournament.machines]
-        game_filters.append("g.machine_id IN :machine_ids")
-    if tournament.players:
-        params["player_ids"] = [link.player_id for link in tournament.players]
-        player_filters.append("gp.player_id IN :player_ids")
-
-    start_time = _coerce_timestamp(tournament.start_time)
-    end_time = _coerce_timestamp(tournament.end_time)
-
-    if start_time:
-        params["start_time"] = start_time
-        state_filters.append("gs.timestamp >= :start_time")
-    if end_time:
-        params["end_time"] = end_time
-        state_filters.append("gs.timestamp <= :end_time")
-
-    game_where = " AND ".join(game_filters)
-    state_where = " AND ".join(state_filters)
-    player_where = " AND ".join([*game_filters, *player_filters])
-
-    order_direction = "DESC" if profile.sort_direction.lower() != "asc" else "ASC"
-
-    statement = text(
-        f"""
-        WITH scoped_games AS (
-            SELECT * FROM games g
-            WHERE {game_where}
-        ),
-        scoped_game_states AS (
-            SELECT gs.*, g.machine_id, g.start_time, g.end_time
-            FROM game_states gs
-            JOIN scoped_games g ON g.id = gs.game_id
-            WHERE {state_where}
-        ),
-        scoped_game_players AS (
-            SELECT gp.*
-            FROM game_players gp
-            JOIN scoped_games g ON g.id = gp.game_id
-            WHERE {player_where}
-        ),
-        base AS (
-            {scoped_sql}
-        ),
-        last_seen AS (
-            SELECT gp.player_id AS player_id, MAX(gs.timestamp) AS last_played
-            FROM scoped_game_states gs
-            JOIN scoped_game_players gp ON gp.game_id = gs.game_id
-            GROUP BY gp.player_id
-        )
-        SELECT base.player_id AS player_id,
-               base.score AS score,
-               p.initials AS initials,
-               p.screen_name AS screen_name,
-               last_seen.last_played AS last_played
-        FROM base
-        JOIN players p ON p.id = base.player_id
-        LEFT JOIN last_seen ON last_seen.player_id = base.player_id
-        ORDER BY base.score {order_direction}, (last_played IS NULL), last_played DESC, initials ASC
-        LIMIT 10
-        """
-    )
-
-    if "machine_ids" in params:
-        statement = statement.bindparams(bindparam("machine_ids", expanding=True))
-    if "player_ids" in params:
-        statement = statement.bindparams(bindparam("player_ids", expanding=True))
-
-    result = await db.execute(statement, params)
-    rows = result.mappings().all()
-
-    return [
-        schemas.TournamentStanding(
-            player_id=row.get("player_id"),
-            initials=row.get("initials") or "---",
-            screen_name=row.get("screen_name"),
-            score=int(row.get("score") or 0),
-            last_played=_coerce_timestamp(row.get("last_played")),
-        )
-        for row in rows
-    ]
-
-
 def _tournament_last_activity(
     tournament: models.Tournament, standings: list[schemas.TournamentStanding], now: datetime
 ) -> Optional[datetime]:
@@ -343,79 +116,102 @@ def _tournament_last_activity(
     return max(valid) if valid else None
 
 
-@router.get("/leaderboard", response_model=List[schemas.LeaderboardGame])
-async def leaderboard(db: AsyncSession = Depends(database.get_db)):
-    result = await db.execute(
-        select(models.Game)
-        .options(
-            selectinload(models.Game.machine),
-            selectinload(models.Game.game_players).selectinload(models.GamePlayer.player),
-            selectinload(models.Game.game_states),
-        )
-        .order_by(models.Game.id)
+async def _latest_states(db: AsyncSession, game_ids: list[int]) -> dict[int, models.GameState]:
+    latest_state_id = (
+        select(models.GameState.id)
+        .where(models.GameState.game_id == models.Game.id)
+        .order_by(models.GameState.timestamp.desc(), models.GameState.id.desc())
+        .limit(1)
+        .scalar_subquery()
     )
-    games = result.scalars().unique().all()
-    return [_build_leaderboard(game) for game in games]
-
-
-@router.get("/leaderboard/summary", response_model=schemas.LeaderboardSummary)
-async def leaderboard_summary(
-    db: AsyncSession = Depends(database.get_db),
-    offset: int = Query(0, ge=0),
-    limit: int | None = Query(None, ge=1),
-):
     result = await db.execute(
-        select(models.Game)
-        .options(
-            selectinload(models.Game.machine),
-            selectinload(models.Game.game_players).selectinload(models.GamePlayer.player),
-            selectinload(models.Game.game_states),
+        select(models.GameState).where(
+            models.GameState.id.in_(select(latest_state_id).where(models.Game.id.in_(game_ids)))
         )
-        .order_by(models.Game.id)
     )
-    games = result.scalars().unique().all()
-    now = datetime.now(timezone.utc)
-    leaderboards: list[schemas.TimeWindowLeaderboard] = []
-    grouped_games: list[schemas.GameLeaderboardBundle] = []
-    for game in games:
-        windows = _build_time_leaderboards(
-            _player_snapshots([game]),
-            now,
-            title_prefix=game.machine.name if game.machine else "Unknown game",
-            slug_prefix=f"game-{game.id}-",
-            include_empty=True,
-        )
+    return {state.game_id: state for state in result.scalars().all()}
 
-        champion = None
-        if windows and windows[0].leaderboard:
-            champion = windows[0].leaderboard[0]
 
-        last_activity = _game_last_activity(game)
+def _as_utc(dt: datetime | None) -> datetime | None:
+    timestamp = _coerce_timestamp(dt)
+    return timestamp.astimezone(timezone.utc) if timestamp else None
 
-        grouped_games.append(
-            schemas.GameLeaderboardBundle(
-                id=game.id,
-                machine_name=game.machine.name if game.machine else "Unknown game",
-                is_active=game.is_active,
-                windows=windows,
-                champion=champion,
-                last_activity_at=last_activity,
+
+async def _game_leaderboard_batches(
+    db: AsyncSession,
+    *,
+    after_id: int | None = None,
+    limit: int | None = None,
+    machine_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> AsyncIterator[list[schemas.LeaderboardGame]]:
+    """Yield leaderboards in game id order, one bounded batch at a time.
+
+    Only each game's latest state is read, and the session is emptied between
+    batches so memory stays flat however many games the hub has recorded.
+    """
+
+    filters = []
+    if machine_id is not None:
+        filters.append(models.Game.machine_id == machine_id)
+    if since is not None:
+        filters.append(models.Game.start_time >= _as_utc(since))
+    if until is not None:
+        filters.append(models.Game.start_time < _as_utc(until))
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = LEADERBOARD_BATCH_SIZE if remaining is None else min(LEADERBOARD_BATCH_SIZE, remaining)
+        query = (
+            select(models.Game)
+            .where(*filters)
+            .options(
+                selectinload(models.Game.machine),
+                selectinload(models.Game.game_players).selectinload(models.GamePlayer.player),
             )
+            .order_by(models.Game.id)
+            .limit(size)
         )
+        if after_id is not None:
+            query = query.where(models.Game.id > after_id)
+        games = (await db.execute(query)).scalars().unique().all()
+        if not games:
+            return
+
+        latest = await _latest_states(db, [game.id for game in games])
+        yield [_build_leaderboard(game, latest.get(game.id)) for game in games]
+
+        after_id = games[-1].id
+        if remaining is not None:
+            remaining -= len(games)
+        if len(games) < size:
+            return
+        db.expunge_all()
 
-        leaderboards.extend(windows)
 
-    total = len(leaderboards)
+async def _stream_game_leaderboards(**filters) -> AsyncIterator[bytes]:
+    # The request-scoped session is closed before a streamed body is sent.
+    async with database.AsyncSessionLocal() as db:
+        async for batch in _game_leaderboard_batches(db, **filters):
+            yield b"".join(game.model_dump_json().encode() + b"\n" for game in batch)
 
-    if limit is not None and total:
-        end = min(offset + limit, total)
-        if offset >= total:
-            offset = 0
-            end = min(limit, total)
-        leaderboards = leaderboards[offset:end]
-    elif limit is not None:
-        leaderboards = []
 
+async def _window_leaderboards(machine_id: int | None) -> list[schemas.TimeWindowLeaderboard]:
+    engine = leaderboard_engine.engine
+    now = datetime.now(timezone.utc)
+    await engine.prepare(now)
+    if machine_id is None:
+        return engine.scope_windows(leaderboard_engine.GLOBAL_SCOPE, now)
+    return engine.scope_windows(
+        ("machine", machine_id),
+        now,
+        title_prefix=engine.machine_name(machine_id) or "Unknown game",
+        slug_prefix=f"machine-{machine_id}-",
+    )
+
+
+async def _tournament_boards(db: AsyncSession, now: datetime) -> list[schemas.TournamentBoard]:
     tournament_result = await db.execute(
         select(models.Tournament)
         .options(
@@ -427,12 +223,16 @@ async def leaderboard_summary(
         .order_by(models.Tournament.start_time)
     )
 
-    tournaments: list[schemas.TournamentBoard] = []
-    for tournament in tournament_result.scalars().unique().all():
-        if not _should_display_tournament(tournament, now):
-            continue
+    displayed = [
+        tournament
+        for tournament in tournament_result.scalars().unique().all()
+        if _should_display_tournament(tournament, now)
+    ]
+    standings_by_id = await tournament_standings.cache.get_many(displayed, now)
 
-        standings = await _tournament_standings(db, tournament)
+    tournaments: list[schemas.TournamentBoard] = []
+    for tournament in displayed:
+        standings = standings_by_id[tournament.id]
         activity = _tournament_last_activity(tournament, standings, now)
         tournaments.append(
             schemas.TournamentBoard(
@@ -450,10 +250,158 @@ async def leaderboard_summary(
                 last_activity_at=activity,
             )
         )
+    return tournaments
+
+
+_CURSOR_PATTERN = re.compile(r"^game-(\d+)-(.+)$")
+_WINDOW_PATTERN = "^(" + "|".join(leaderboard_engine.WINDOW_SLUGS) + ")$"
+
+
+def _cursor_position(cursor: str) -> tuple[int, int]:
+    match = _CURSOR_PATTERN.match(cursor)
+    if not match or match.group(2) not in leaderboard_engine.WINDOW_SLUGS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return int(match.group(1)), leaderboard_engine.WINDOW_SLUGS.index(match.group(2))
+
+
+async def _summary(
+    db: AsyncSession,
+    offset: int,
+    limit: int | None,
+    cursor: str | None = None,
+    machine_id: int | None = None,
+    window: str | None = None,
+) -> schemas.LeaderboardSummary:
+    now = datetime.now(timezone.utc)
+    engine = leaderboard_engine.engine
+    await engine.prepare(now)
+
+    # Boards are ordered by game id, then window; only the page is built.
+    positions = [
+        position
+        for position, slug in enumerate(leaderboard_engine.WINDOW_SLUGS)
+        if window is None or slug == window
+    ]
+    boards = [(info, position) for info in engine.games(machine_id) for position in positions]
+    total = len(boards)
+
+    start = 0
+    if cursor is not None:
+        target = _cursor_position(cursor)
+        start = bisect.bisect_left(boards, target, key=lambda board: (board[0].id, board[1]))
+    elif limit is not None and offset < total:
+        start = offset
+    end = total if limit is None else min(start + limit, total)
+
+    grouped_games: list[schemas.GameLeaderboardBundle] = []
+    for _, page_boards in groupby(boards[start:end], key=lambda board: board[0].id):
+        page_boards = list(page_boards)
+        grouped_games.append(
+            engine.game_bundle(
+                page_boards[0][0],
+                now,
+                [leaderboard_engine.WINDOW_SLUGS[position] for _, position in page_boards],
+            )
+        )
+    leaderboards = [board for game in grouped_games for board in game.windows]
+
+    next_cursor = None
+    if end < total:
+        info, position = boards[end]
+        next_cursor = f"game-{info.id}-{leaderboard_engine.WINDOW_SLUGS[position]}"
+
+    # Tournament boards ride along with the first unfiltered page.
+    tournaments: list[schemas.TournamentBoard] = []
+    if start == 0 and machine_id is None and window is None:
+        tournaments = await _tournament_boards(db, now)
 
     return schemas.LeaderboardSummary(
         games=grouped_games,
         leaderboards=leaderboards,
         total_boards=total,
         tournaments=tournaments,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/leaderboard", response_model=List[schemas.LeaderboardGame])
+async def leaderboard(
+    request: Request,
+    db: AsyncSession = Depends(database.get_db),
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=1000),
+    machine_id: int | None = Query(None, ge=1),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    filters = {"after_id": after_id, "limit": limit, "machine_id": machine_id, "since": since, "until": until}
+    if format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(_stream_game_leaderboards(**filters), media_type=NDJSON_MEDIA_TYPE)
+
+    async def compute() -> list[schemas.LeaderboardGame]:
+        games: list[schemas.LeaderboardGame] = []
+        async for batch in _game_leaderboard_batches(db, **filters):
+            games.extend(batch)
+        return games
+
+    def next_page(games: list[schemas.LeaderboardGame]) -> dict[str, str]:
+        # A full page may have more games after it; keyset clients follow this.
+        if limit is not None and len(games) == limit:
+            return {"X-Next-After-Id": str(games[-1].id)}
+        return {}
+
+    return await response_cache.cached_response(
+        request, List[schemas.LeaderboardGame], compute, headers=next_page
+    )
+
+
+@router.get("/leaderboard/windows", response_model=List[schemas.TimeWindowLeaderboard])
+async def leaderboard_windows(request: Request, machine_id: int | None = Query(None, ge=1)):
+    return await response_cache.cached_response(
+        request, List[schemas.TimeWindowLeaderboard], lambda: _window_leaderboards(machine_id)
+    )
+
+
+@router.get("/leaderboard/rank", response_model=schemas.LeaderboardRank)
+async def leaderboard_rank(
+    player_id: int = Query(..., ge=1),
+    machine_id: int | None = Query(None, ge=1),
+    game_id: int | None = Query(None, ge=1),
+    window: str = Query("all-time", pattern=_WINDOW_PATTERN),
+    neighbors: int = Query(2, ge=0, le=25),
+):
+    if machine_id is not None and game_id is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Use either machine_id or game_id"
+        )
+    if game_id is not None:
+        scope: leaderboard_engine.Scope = ("game", game_id)
+    elif machine_id is not None:
+        scope = ("machine", machine_id)
+    else:
+        scope = leaderboard_engine.GLOBAL_SCOPE
+
+    engine = leaderboard_engine.engine
+    await engine.prepare(datetime.now(timezone.utc))
+    ranking = engine.rank(scope, window, player_id, neighbors=neighbors)
+    if ranking is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player not ranked on this board")
+    return ranking
+
+
+@router.get("/leaderboard/summary", response_model=schemas.LeaderboardSummary)
+async def leaderboard_summary(
+    request: Request,
+    db: AsyncSession = Depends(database.get_db),
+    offset: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = Query(None, max_length=64),
+    machine_id: int | None = Query(None, ge=1),
+    window: str | None = Query(None, pattern=_WINDOW_PATTERN),
+):
+    return await response_cache.cached_response(
+        request,
+        schemas.LeaderboardSummary,
+        lambda: _summary(db, offset, limit, cursor=cursor, machine_id=machine_id, window=window),
     )
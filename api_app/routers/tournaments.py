@@ -1,5 +1,5 @@
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -7,7 +7,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from .. import database, models, schemas
+from .. import database, models, profiles, schemas
 from .admin import _verify_admin
 
 router = APIRouter(prefix="/tournaments", tags=["tournaments"])
@@ -117,7 +117,17 @@ async def create_leaderboard_profile(
     if existing.scalar_one_or_none():
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Slug already in use")
 
-    profile = models.LeaderboardProfile(**payload.model_dump())
+    try:
+        compiled = await profiles.compile_profile(db, payload.sql_template, payload.sort_direction)
+    except profiles.ProfileCompileError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+    profile = models.LeaderboardProfile(
+        **payload.model_dump(),
+        compiled_sql=compiled.sql,
+        query_plan=compiled.query_plan,
+        compiled_at=datetime.now(timezone.utc),
+    )
     db.add(profile)
     await db.commit()
     await db.refresh(profile)
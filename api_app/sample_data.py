@@ -3,20 +3,24 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 from typing import Iterable, Sequence
 
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import models
+from . import models, profiles
 
+# Bump when the demo content changes; ``init_db`` records the applied version
+# in ``schema_meta`` and skips seeding entirely once it matches.
+SEED_VERSION = 1
 
-async def _existing_records(session: AsyncSession) -> int:
-    result = await session.execute(select(func.count(models.Game.id)))
-    return int(result.scalar_one())
 
+async def _existing_records(session: AsyncSession) -> bool:
+    result = await session.execute(select(models.Game.id).limit(1))
+    return result.first() is not None
 
-async def _existing_tournaments(session: AsyncSession) -> int:
-    result = await session.execute(select(func.count(models.Tournament.id)))
-    return int(result.scalar_one())
+
+async def _existing_tournaments(session: AsyncSession) -> bool:
+    result = await session.execute(select(models.Tournament.id).limit(1))
+    return result.first() is not None
 
 
 def _player_payloads() -> list[dict]:
@@ -146,9 +150,13 @@ async def _ensure_leaderboard_profiles(session: AsyncSession) -> dict[str, model
             stored.sql_template = payload["sql_template"]
             stored.sort_direction = payload["sort_direction"]
         else:
-            profile = models.LeaderboardProfile(**payload)
-            session.add(profile)
-            existing[payload["slug"]] = profile
+            stored = models.LeaderboardProfile(**payload)
+            session.add(stored)
+            existing[payload["slug"]] = stored
+        compiled = await profiles.compile_profile(session, stored.sql_template, stored.sort_direction)
+        stored.compiled_sql = compiled.sql
+        stored.query_plan = compiled.query_plan
+        stored.compiled_at = datetime.now(timezone.utc)
     await session.flush()
     return existing
 
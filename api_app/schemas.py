@@ -151,6 +151,14 @@ class BallPlayTime(BaseModel):
     is_current: bool = False
 
 
+class BallSummary(BaseModel):
+    ball: int
+    player_number: int
+    seconds: int
+    points: int
+    end_score: int
+
+
 class LiveScore(BaseModel):
     player_id: Optional[int] = None
     player_number: int
@@ -162,6 +170,32 @@ class LiveScore(BaseModel):
     is_player_up: bool = False
 
 
+class ScorePoint(BaseModel):
+    seconds: int
+    score: int
+
+
+class PlayerScoreSeries(BaseModel):
+    player_number: int
+    player_id: Optional[int] = None
+    initials: Optional[str] = None
+    screen_name: Optional[str] = None
+    points: List[ScorePoint] = Field(default_factory=list)
+
+
+class BallStart(BaseModel):
+    ball: int
+    seconds: int
+
+
+class ScoreTimeline(BaseModel):
+    game_id: int
+    is_active: bool
+    state_count: int
+    balls: List[BallStart] = Field(default_factory=list)
+    players: List[PlayerScoreSeries] = Field(default_factory=list)
+
+
 class LiveGameState(BaseModel):
     game_id: int
     machine_id: int
@@ -216,6 +250,22 @@ class LeaderboardEntry(BaseModel):
     machine_name: Optional[str] = None
 
 
+class RankedLeaderboardEntry(LeaderboardEntry):
+    rank: int
+
+
+class LeaderboardRank(BaseModel):
+    scope: Literal["global", "machine", "game"]
+    scope_id: Optional[int] = None
+    window: str
+    rank: int
+    total: int
+    percentile: float
+    entry: RankedLeaderboardEntry
+    above: List[RankedLeaderboardEntry]
+    below: List[RankedLeaderboardEntry]
+
+
 class LeaderboardGame(BaseModel):
     id: int
     machine_name: str
@@ -246,6 +296,7 @@ class LeaderboardSummary(BaseModel):
     leaderboards: List[TimeWindowLeaderboard]
     total_boards: int
     tournaments: List[TournamentBoard] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
 
 
 class GameModeBase(BaseModel):
@@ -280,6 +331,8 @@ class LeaderboardProfileCreate(LeaderboardProfileBase):
 
 class LeaderboardProfile(LeaderboardProfileBase):
     id: int
+    query_plan: Optional[List[str]] = None
+    compiled_at: Optional[datetime] = None
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
@@ -369,3 +422,79 @@ class TournamentBoard(BaseModel):
     game_mode: Optional[GameMode] = None
     leaderboard: List[TournamentStanding] = Field(default_factory=list)
     last_activity_at: Optional[datetime] = None
+
+
+class RetentionReport(BaseModel):
+    games_compacted: int = 0
+    rows_archived: int = 0
+    rows_deleted: int = 0
+    archived_bytes: int = 0
+    reclaimed_bytes: int = 0
+    remaining_games: int = 0
+
+
+class SweepReport(BaseModel):
+    games_closed: int = 0
+    timelines_stored: int = 0
+    duration_ms: float = 0.0
+
+
+class SweeperMetrics(BaseModel):
+    runs: int = 0
+    games_closed: int = 0
+    last_run_at: Optional[datetime] = None
+    last_games_closed: int = 0
+    last_duration_ms: float = 0.0
+
+
+class AnalyticsExportReport(BaseModel):
+    games_exported: int = 0
+    results_exported: int = 0
+    states_exported: int = 0
+    files_written: int = 0
+    parts_merged: int = 0
+
+
+class AnalyticsLeaderboardEntry(BaseModel):
+    player_id: int
+    initials: str
+    screen_name: Optional[str] = None
+    score: int
+    machine_name: Optional[str] = None
+    game_id: Optional[int] = None
+    last_played: Optional[datetime] = None
+    games_played: int = 0
+
+
+class AnalyticsMachineStats(BaseModel):
+    machine_id: int
+    machine_name: Optional[str] = None
+    games_played: int = 0
+    play_seconds: int = 0
+    last_played: Optional[datetime] = None
+    top_score: Optional[int] = None
+    unique_players: int = 0
+
+
+class LeaderboardConsistencyReport(BaseModel):
+    consistent: bool
+    games: int = 0
+    boards_checked: int = 0
+    mismatched_boards: List[str] = Field(default_factory=list)
+
+
+class BackupFile(BaseModel):
+    name: str
+    size_bytes: int
+    created_at: datetime
+
+
+class BackupReport(BaseModel):
+    name: str
+    size_bytes: int
+    database_bytes: int
+    pages: int
+    restarts: int = 0
+    compressed: bool = False
+    duration_ms: float = 0.0
+    removed: List[str] = Field(default_factory=list)
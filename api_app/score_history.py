@@ -0,0 +1,189 @@
+"""Downsampled per-player score series for charts.
+
+A player's score only moves in steps, so each series first keeps just the
+states where the score changed (plus the first and last), then reduces
+what is left to at most ``points`` with Largest-Triangle-Three-Buckets,
+which keeps the spikes and plateaus a chart needs to look right.
+
+States come from the game's compact timeline when it has one, so a
+finished game decodes a blob instead of loading thousands of rows.
+Finished games' series are cached per ``(game, points)``; commits that
+touch a game (see :mod:`.changes`) drop its entries. Player names are
+attached on every read so renames show up without invalidating anything.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import changes, models, retention, schemas, timeline, utils
+
+DEFAULT_POINTS = 300
+MAX_POINTS = 2_000
+MAX_CACHED = 256
+
+_GAME_TABLES = ("games", "game_states", "game_timelines")
+
+Point = tuple[int, int]
+
+
+def lttb(points: Sequence[Point], threshold: int) -> list[Point]:
+    """Reduce ``points`` to ``threshold`` with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between contributes
+    the point forming the largest triangle with the previously kept point
+    and the average of the next bucket.
+    """
+
+    count = len(points)
+    if threshold >= count:
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+
+    sampled = [points[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    kept = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        following = points[end:next_end] or points[-1:]
+        average_x = sum(x for x, _ in following) / len(following)
+        average_y = sum(y for _, y in following) / len(following)
+
+        anchor_x, anchor_y = points[kept]
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            x, y = points[index]
+            area = abs((anchor_x - average_x) * (y - anchor_y) - (anchor_x - x) * (average_y - anchor_y))
+            if area > best_area:
+                best, best_area = index, area
+        sampled.append(points[best])
+        kept = best
+    sampled.append(points[-1])
+    return sampled
+
+
+@dataclass(frozen=True)
+class _Series:
+    state_count: int
+    balls: list[schemas.BallStart]
+    # player_number -> downsampled (seconds_elapsed, score) points
+    players: dict[int, list[Point]]
+
+
+def _build_series(states: Iterable, points: int) -> _Series:
+    steps: dict[int, list[Point]] = {}
+    # The last point seen per player, kept to close each series.
+    latest: dict[int, Point] = {}
+    balls: list[schemas.BallStart] = []
+    state_count = 0
+    for state in states:
+        state_count += 1
+        seconds = int(state.seconds_elapsed or 0)
+        if state.ball and (not balls or balls[-1].ball != state.ball):
+            balls.append(schemas.BallStart(ball=state.ball, seconds=seconds))
+        for player_number, score in utils.score_map(state.scores).items():
+            series = steps.setdefault(player_number, [])
+            if not series or series[-1][1] != score:
+                series.append((seconds, score))
+            latest[player_number] = (seconds, score)
+
+    players = {}
+    for player_number, series in steps.items():
+        if latest[player_number] != series[-1]:
+            series.append(latest[player_number])
+        players[player_number] = lttb(series, points)
+    return _Series(state_count=state_count, balls=balls, players=players)
+
+
+async def _load_states(db: AsyncSession, game: models.Game) -> Sequence:
+    if not game.is_active:
+        # Only finished games have a compact timeline.
+        compact = await timeline.load_timeline(db, game.id)
+        if compact is not None:
+            return compact
+        # Also reads back rows retention moved to the archive.
+        return await retention.load_full_timeline(db, game)
+    result = await db.execute(
+        select(
+            models.GameState.seconds_elapsed,
+            models.GameState.ball,
+            models.GameState.scores,
+        )
+        .where(models.GameState.game_id == game.id)
+        .order_by(models.GameState.timestamp, models.GameState.id)
+    )
+    return result.all()
+
+
+class ScoreHistoryCache:
+    """Downsampled series of finished games, least recently used first out."""
+
+    def __init__(self, *, max_entries: int = MAX_CACHED, subscribe: bool = True) -> None:
+        self._entries: "OrderedDict[tuple[int, int], _Series]" = OrderedDict()
+        self._max_entries = max_entries
+        if subscribe:
+            changes.subscribe(self._on_change)
+
+    def _on_change(self, change: changes.ChangeSet) -> None:
+        if change.is_full(*_GAME_TABLES):
+            self._entries.clear()
+            return
+        if not change.game_ids:
+            return
+        for key in [key for key in self._entries if key[0] in change.game_ids]:
+            del self._entries[key]
+
+    async def series(self, db: AsyncSession, game: models.Game, points: int) -> _Series:
+        key = (game.id, points)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            return cached
+        series = _build_series(await _load_states(db, game), points)
+        if not game.is_active:
+            self._entries[key] = series
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return series
+
+
+cache = ScoreHistoryCache()
+
+
+async def score_timeline(db: AsyncSession, game: models.Game, points: int) -> schemas.ScoreTimeline:
+    """``game``'s per-player score series, each at most ``points`` long.
+
+    ``game`` must have ``game_players`` and their players loaded.
+    """
+
+    series = await cache.series(db, game, points)
+    bindings = {game_player.player_number: game_player for game_player in game.game_players}
+    players = []
+    for player_number in sorted(set(series.players) | set(bindings)):
+        binding = bindings.get(player_number)
+        player = binding.player if binding else None
+        players.append(
+            schemas.PlayerScoreSeries(
+                player_number=player_number,
+                player_id=player.id if player else None,
+                initials=player.initials if player else None,
+                screen_name=player.screen_name if player else None,
+                points=[
+                    schemas.ScorePoint(seconds=seconds, score=score)
+                    for seconds, score in series.players.get(player_number, [])
+                ],
+            )
+        )
+    return schemas.ScoreTimeline(
+        game_id=game.id,
+        is_active=bool(game.is_active),
+        state_count=series.state_count,
+        balls=series.balls,
+        players=players,
+    )
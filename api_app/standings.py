@@ -0,0 +1,361 @@
+"""Tournament standings and their per-tournament cache.
+
+Standings come from the tournament's scoring profile, a SQL template run
+against the games, states and players in the tournament's scope. The result
+only changes when the tournament itself is edited or when a state lands in
+scope, so each cached entry is keyed by the tournament's ``updated_at`` and
+the highest relevant ``game_states.id`` (its *watermark*).
+
+Committed writes reported by :mod:`.changes` wake a background worker
+started with the application. It moves each watermark forward with a query
+that only scans states newer than the current one, and recomputes the
+tournaments whose key changed. Reads return whatever is cached and never
+wait for that work; only a tournament that has never been computed is
+evaluated inline. Once a tournament's ``end_time`` has passed and its
+standings were computed after it, the entry is frozen and ingest no longer
+refreshes it.
+
+Tournaments that need work are evaluated concurrently, each on its own
+connection, at most ``STANDINGS_CONCURRENCY`` at a time. One that takes
+longer than ``STANDINGS_TIMEOUT_SECONDS`` falls back to its last cached
+standings.
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from functools import partial
+from typing import Awaitable, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import changes, models, profiles, schemas
+from .database import AsyncSessionLocal, settings
+
+logger = logging.getLogger(__name__)
+
+# Admin edits to a tournament's definition; these thaw frozen entries too.
+# ``updated_at`` alone misses link-table edits and has one-second resolution.
+_DEFINITION_TABLES = ("tournaments", "tournament_machines", "tournament_players", "leaderboard_profiles")
+# Writes that can change live standings without moving the watermark.
+_SCOPE_TABLES = ("games", "game_players", "players")
+
+
+def _coerce_timestamp(timestamp: datetime | str | None) -> datetime | None:
+    if not timestamp:
+        return None
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+async def compute_standings(
+    db: AsyncSession, tournament: models.Tournament
+) -> list[schemas.TournamentStanding]:
+    """Evaluate ``tournament``'s scoring profile; always hits the database."""
+
+    profile = tournament.scoring_profile
+    if not profile:
+        return []
+
+    sql = profile.compiled_sql or profiles.build_statement(profile.sql_template, profile.sort_direction)
+    machine_ids = [link.machine_id for link in tournament.machines]
+    player_ids = [link.player_id for link in tournament.players]
+    params = {
+        "machine_ids": json.dumps(machine_ids) if machine_ids else None,
+        "player_ids": json.dumps(player_ids) if player_ids else None,
+        "start_time": _coerce_timestamp(tournament.start_time),
+        "end_time": _coerce_timestamp(tournament.end_time),
+    }
+    rows = await profiles.execute(db, sql, params)
+
+    return [
+        schemas.TournamentStanding(
+            player_id=row.get("player_id"),
+            initials=row.get("initials") or "---",
+            screen_name=row.get("screen_name"),
+            score=int(row.get("score") or 0),
+            last_played=_coerce_timestamp(row.get("last_played")),
+        )
+        for row in rows
+    ]
+
+
+async def state_watermark(db: AsyncSession, tournament: models.Tournament, floor: int = 0) -> int:
+    """Highest ``game_states.id`` in the tournament's scope, or ``floor``.
+
+    Only states above ``floor`` are considered, so moving a known watermark
+    forward is a rowid range scan over the states written since.
+    """
+
+    query = select(func.max(models.GameState.id)).where(models.GameState.id > floor)
+    if tournament.machines:
+        query = query.join(models.Game, models.Game.id == models.GameState.game_id).where(
+            models.Game.machine_id.in_([link.machine_id for link in tournament.machines])
+        )
+    start_time = _coerce_timestamp(tournament.start_time)
+    end_time = _coerce_timestamp(tournament.end_time)
+    if start_time:
+        query = query.where(models.GameState.timestamp >= start_time)
+    if end_time:
+        query = query.where(models.GameState.timestamp <= end_time)
+    latest = (await db.execute(query)).scalar_one_or_none()
+    return max(floor, latest or 0)
+
+
+@dataclass(frozen=True)
+class _Entry:
+    updated_at: datetime | None
+    watermark: int
+    generation: int
+    definition: int
+    # Value of the cache's change counter when the entry was last validated.
+    seen: int
+    standings: list[schemas.TournamentStanding]
+    frozen: bool
+
+
+class StandingsCache:
+    def __init__(self, *, subscribe: bool = True) -> None:
+        self._entries: dict[int, _Entry] = {}
+        # Bumped by writes outside game_states that may change standings.
+        self._generation = 0
+        self._definition = 0
+        self._changes = 0
+        self._semaphore: asyncio.Semaphore | None = None
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
+        self._worker: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._stopping = False
+        if subscribe:
+            changes.subscribe(self._on_change)
+
+    # -- change tracking -------------------------------------------------
+
+    def _on_change(self, change: changes.ChangeSet) -> None:
+        if change.reset:
+            self._entries.clear()
+            return
+        if change.touches(*_DEFINITION_TABLES):
+            self._definition += 1
+        if change.touches(*_SCOPE_TABLES):
+            self._generation += 1
+        if not change.touches("game_states", *_DEFINITION_TABLES, *_SCOPE_TABLES):
+            return
+        self._changes += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    def _key_changed(self, entry: _Entry, tournament: models.Tournament) -> bool:
+        if entry.updated_at != _coerce_timestamp(tournament.updated_at):
+            return True
+        if entry.definition != self._definition:
+            return True
+        return not entry.frozen and entry.generation != self._generation
+
+    def _worker_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    # -- reads -----------------------------------------------------------
+
+    async def get_many(
+        self, tournaments: list[models.Tournament], now: datetime | None = None
+    ) -> dict[int, list[schemas.TournamentStanding]]:
+        """Cached standings for each of ``tournaments``, keyed by id.
+
+        With the background worker running, stale entries are served as-is
+        and refreshed by the worker. Without it (scripts, tests) they are
+        revalidated inline. Work that has to happen here runs concurrently,
+        see :meth:`_run_bounded`.
+        """
+
+        now = now or datetime.now(timezone.utc)
+        results: dict[int, list[schemas.TournamentStanding]] = {}
+        pending: list[tuple[models.Tournament, Callable[[AsyncSession], Awaitable[_Entry]]]] = []
+        for tournament in tournaments:
+            entry = self._entries.get(tournament.id)
+            if entry is None:
+                pending.append((tournament, partial(self._compute, tournament=tournament, floor=0, now=now)))
+            elif entry.seen == self._changes and not self._key_changed(entry, tournament):
+                results[tournament.id] = entry.standings
+            elif self._worker_running():
+                self._wake.set()
+                results[tournament.id] = entry.standings
+            else:
+                pending.append((tournament, partial(self._revalidate, tournament=tournament, entry=entry, now=now)))
+
+        computed = await asyncio.gather(*(self._run_bounded(tournament, work) for tournament, work in pending))
+        for (tournament, _), standings in zip(pending, computed):
+            results[tournament.id] = standings
+        return results
+
+    # -- computation -----------------------------------------------------
+
+    async def _compute(
+        self,
+        db: AsyncSession,
+        *,
+        tournament: models.Tournament,
+        floor: int,
+        now: datetime | None = None,
+    ) -> _Entry:
+        seen, generation, definition = self._changes, self._generation, self._definition
+        # Read the watermark first: a state landing in between only makes the
+        # next refresh recompute once more.
+        watermark = await state_watermark(db, tournament, floor)
+        try:
+            standings = await compute_standings(db, tournament)
+        except profiles.ProfileBudgetExceeded:
+            logger.warning("Standings for tournament %s exceeded the query budget", tournament.id)
+            previous = self._entries.get(tournament.id)
+            standings = previous.standings if previous is not None else []
+        now = now or datetime.now(timezone.utc)
+        end_time = _coerce_timestamp(tournament.end_time)
+        entry = _Entry(
+            updated_at=_coerce_timestamp(tournament.updated_at),
+            watermark=watermark,
+            generation=generation,
+            definition=definition,
+            seen=seen,
+            standings=standings,
+            frozen=end_time is not None and end_time < now,
+        )
+        self._entries[tournament.id] = entry
+        return entry
+
+    async def _revalidate(
+        self, db: AsyncSession, *, tournament: models.Tournament, entry: _Entry, now: datetime
+    ) -> _Entry:
+        if self._key_changed(entry, tournament):
+            # The scope itself may have changed; start from scratch.
+            return await self._compute(db, tournament=tournament, floor=0, now=now)
+        seen = self._changes
+        if not entry.frozen:
+            end_time = _coerce_timestamp(tournament.end_time)
+            watermark = await state_watermark(db, tournament, entry.watermark)
+            if watermark != entry.watermark or (end_time is not None and end_time < now):
+                return await self._compute(db, tournament=tournament, floor=entry.watermark, now=now)
+        entry = replace(entry, seen=seen)
+        self._entries[tournament.id] = entry
+        return entry
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # A semaphore is bound to one event loop (tests run one per case).
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(max(1, settings.STANDINGS_CONCURRENCY))
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _run_isolated(self, work: Callable[[AsyncSession], Awaitable[_Entry]]) -> _Entry:
+        async with self._get_semaphore():
+            async with AsyncSessionLocal() as db:
+                return await work(db)
+
+    async def _run_bounded(
+        self, tournament: models.Tournament, work: Callable[[AsyncSession], Awaitable[_Entry]]
+    ) -> list[schemas.TournamentStanding]:
+        """Run ``work`` on its own connection with bounded concurrency.
+
+        After ``STANDINGS_TIMEOUT_SECONDS``, including the wait for a slot,
+        the last cached standings are returned instead.
+        """
+
+        timeout = settings.STANDINGS_TIMEOUT_SECONDS
+        try:
+            entry = await asyncio.wait_for(self._run_isolated(work), timeout if timeout > 0 else None)
+        except asyncio.TimeoutError:
+            logger.warning("Standings for tournament %s timed out after %ss", tournament.id, timeout)
+            previous = self._entries.get(tournament.id)
+            return previous.standings if previous is not None else []
+        return entry.standings
+
+    async def refresh(self) -> None:
+        """Revalidate every cached tournament, recomputing those whose key moved."""
+
+        if not self._entries:
+            return
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            tournaments = await _load_tournaments(db, list(self._entries))
+
+        pending = []
+        for tournament_id, entry in list(self._entries.items()):
+            tournament = tournaments.get(tournament_id)
+            if tournament is None:
+                self._entries.pop(tournament_id, None)
+            elif entry.frozen and not self._key_changed(entry, tournament):
+                self._entries[tournament_id] = replace(entry, seen=self._changes)
+            else:
+                pending.append((tournament, partial(self._revalidate, tournament=tournament, entry=entry, now=now)))
+        await asyncio.gather(*(self._run_bounded(tournament, work) for tournament, work in pending))
+
+    async def warm(self) -> None:
+        """Compute standings for every tournament up front."""
+
+        async with AsyncSessionLocal() as db:
+            tournaments = list((await _load_tournaments(db)).values())
+        await self.get_many(tournaments)
+
+    # -- background worker -----------------------------------------------
+
+    def start(self) -> None:
+        """Start refreshing in the background until :meth:`stop`."""
+
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._worker = asyncio.create_task(self._run(), name="standings-refresh")
+
+    async def stop(self) -> None:
+        """Stop the worker, letting an in-flight refresh close its session."""
+
+        worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await asyncio.gather(worker, return_exceptions=True)
+        self._wake = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                await self.refresh()
+            except Exception:  # pragma: no cover - safeguard
+                logger.exception("Tournament standings refresh failed")
+
+    async def wait_idle(self) -> None:
+        """Wait until the worker has caught up with every published change."""
+
+        while self._worker_running() and any(entry.seen != self._changes for entry in self._entries.values()):
+            await asyncio.sleep(0.01)
+
+
+async def _load_tournaments(
+    db: AsyncSession, tournament_ids: list[int] | None = None
+) -> dict[int, models.Tournament]:
+    query = select(models.Tournament).options(
+        selectinload(models.Tournament.scoring_profile),
+        selectinload(models.Tournament.machines),
+        selectinload(models.Tournament.players),
+    )
+    if tournament_ids is not None:
+        query = query.where(models.Tournament.id.in_(tournament_ids))
+    result = await db.execute(query)
+    return {tournament.id: tournament for tournament in result.scalars().unique()}
+
+
+cache = StandingsCache()
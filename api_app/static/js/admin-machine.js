@@ -38,7 +38,7 @@ const AUTH_STORAGE_KEY = "adminAuthHeader";
 let authHeader = "";
 let selectedMachine = null;
 let selectedMachineUpdate = null;
-let livePollTimer = null;
+let liveStream = null;
 const updateCheckCache = new Map();
 let statusClearTimer = null;
 
@@ -280,37 +280,32 @@ const hideLiveGame = (message = "No active game.", { visible = false } = {}) =>
     liveScores.innerHTML = "";
 };
 
-const fetchLiveGameState = async (gameId) => {
-    const response = await fetch(`/api/v1/games/${gameId}/live`);
-    if (!response.ok) {
-        throw new Error("Unable to load live game state.");
-    }
-
-    return response.json();
-};
-
-const startLivePolling = (machine) => {
-    if (livePollTimer) {
-        clearInterval(livePollTimer);
+const startLiveStream = (machine) => {
+    if (liveStream) {
+        liveStream.close();
+        liveStream = null;
     }
 
     if (!machine?.is_active || !machine.id) {
         hideLiveGame();
-        livePollTimer = null;
         return;
     }
 
-    const loadState = async () => {
-        try {
-            const state = await fetchLiveGameState(machine.id);
+    // Pushed by the server as soon as a new state is stored.
+    liveStream = new EventSource(`/api/v1/games/live/stream?game_id=${encodeURIComponent(machine.id)}`);
+    liveStream.addEventListener("snapshot", (event) => {
+        const [state] = JSON.parse(event.data);
+        if (state) {
             showLiveGame(state);
-        } catch (error) {
-            hideLiveGame(error.message, { visible: true });
+        } else {
+            hideLiveGame("No game state available.", { visible: true });
         }
+    });
+    liveStream.addEventListener("state", (event) => showLiveGame(JSON.parse(event.data)));
+    liveStream.addEventListener("ended", () => hideLiveGame("No game state available.", { visible: true }));
+    liveStream.onerror = () => {
+        liveUpdated.textContent = "Reconnecting to live updates…";
     };
-
-    loadState();
-    livePollTimer = setInterval(loadState, 2000);
 };
 
 const openGamePasswordModal = (game) => {
@@ -384,7 +379,7 @@ const renderMachine = async (machine) => {
         ? "Password stored for authenticated requests."
         : "Use the password modal to store credentials for this machine.";
 
-    startLivePolling(machine);
+    startLiveStream(machine);
     
     const checkedAgo = formatRelative(machine.machine_version_checked_at);
     const versionText = machine.machine_version || "Unknown";
@@ -5,7 +5,12 @@
   const liveGamesEl = document.getElementById("live-games");
   const SUMMARY_URL = "/api/v1/leaderboard/summary";
   const LIVE_URL = "/api/v1/games/live";
+  const LIVE_STREAM_URL = "/api/v1/games/live/stream";
+  // Delta protocol version: a snapshot, then patches with only what changed.
+  const LIVE_DELTA_VERSION = 1;
   const REFRESH_MS = 15000;
+  const SUMMARY_PAGE_SIZE = 30;
+  // Polling interval for browsers without EventSource.
   const LIVE_REFRESH_MS = 2000;
   const TITLE_ROTATE_MS = 12000;
   const LIVE_PAGE_MS = 9000;
@@ -26,6 +31,13 @@
     },
   };
   let refreshTimer = null;
+  // Boards are fetched a page at a time by following `next_cursor`. Every
+  // refresh walks all pages; unchanged ones come back as cheap 304s.
+  let summaryLoaded = false;
+  let summaryRefreshing = false;
+  let summaryTournaments = [];
+  let summaryGames = new Map();
+  const summaryPageEtags = new Map();
   let rotationTimer = null;
   let liveTimer = null;
   let liveTimeTimer = null;
@@ -33,6 +45,11 @@
   let hasLiveGames = false;
   let livePages = [];
   let livePageIndex = 0;
+  let liveReceivedAt = 0;
+  // Live games by id, kept current by the live stream, and the sequence
+  // number each state was last updated to.
+  const liveGameStates = new Map();
+  const liveGameSeqs = new Map();
   let cardEntries = [];
   let boardSchedule = [];
   let boardPages = [];
@@ -852,12 +869,11 @@
       fetchLeaderboard();
     }
 
-    if (livePageTimer) {
-      clearInterval(livePageTimer);
-      livePageTimer = null;
-    }
-
     if (!liveGames?.length) {
+      if (livePageTimer) {
+        clearInterval(livePageTimer);
+        livePageTimer = null;
+      }
       clearChildren(liveGamesEl);
       if (liveTimeTimer) {
         clearInterval(liveTimeTimer);
@@ -866,15 +882,20 @@
       return;
     }
 
+    // Updates arrive as games are played; stay on the page being shown.
     livePages = paginateLiveGames(liveGames);
-    livePageIndex = 0;
+    livePageIndex = livePageIndex < livePages.length ? livePageIndex : 0;
+    liveReceivedAt = receivedAt;
     renderLivePage(receivedAt);
 
-    if (livePages.length > 1) {
+    if (livePages.length > 1 && !livePageTimer) {
       livePageTimer = setInterval(() => {
         livePageIndex = (livePageIndex + 1) % livePages.length;
-        renderLivePage(receivedAt);
+        renderLivePage(liveReceivedAt);
       }, LIVE_PAGE_MS);
+    } else if (livePages.length <= 1 && livePageTimer) {
+      clearInterval(livePageTimer);
+      livePageTimer = null;
     }
 
     if (!liveTimeTimer) {
@@ -882,17 +903,68 @@
     }
   }
 
+  async function fetchSummaryPage(cursor) {
+    const params = new URLSearchParams({ limit: String(SUMMARY_PAGE_SIZE) });
+    if (cursor) params.set("cursor", cursor);
+
+    const response = await fetch(`${SUMMARY_URL}?${params}`);
+    if (!response.ok) {
+      throw new Error(`Failed to load leaderboard (${response.status})`);
+    }
+
+    // The browser revalidates with If-None-Match; an unchanged ETag means the
+    // page is identical to the one already merged.
+    const etag = response.headers.get("ETag");
+    const key = cursor || "";
+    const unchanged = Boolean(etag) && summaryPageEtags.get(key) === etag;
+    summaryPageEtags.set(key, etag);
+    return { page: await response.json(), unchanged };
+  }
+
+  function mergeSummaryPage(page, isFirstPage, sweepGameIds) {
+    if (isFirstPage) {
+      summaryTournaments = page.tournaments || [];
+    }
+
+    (page.games || []).forEach((game) => {
+      const windows = new Map((summaryGames.get(game.id)?.windows || []).map((window) => [window.slug, window]));
+      (game.windows || []).forEach((window) => windows.set(window.slug, window));
+      summaryGames.set(game.id, { ...game, windows: Array.from(windows.values()) });
+      sweepGameIds.add(game.id);
+    });
+  }
+
   async function fetchLeaderboard() {
+    // A slow walk must not overlap the next refresh.
+    if (summaryRefreshing) return;
+    summaryRefreshing = true;
     try {
-      const response = await fetch(SUMMARY_URL);
-      if (!response.ok) {
-        throw new Error(`Failed to load leaderboard (${response.status})`);
-      }
+      const sweepGameIds = new Set();
+      let changed = false;
+      let cursor = null;
+      do {
+        const { page, unchanged } = await fetchSummaryPage(cursor);
+        mergeSummaryPage(page, !cursor, sweepGameIds);
+        changed = changed || !unchanged;
+        cursor = page.next_cursor || null;
+      } while (cursor);
+
+      // The walk finished; drop games that no longer exist.
+      Array.from(summaryGames.keys()).forEach((gameId) => {
+        if (!sweepGameIds.has(gameId)) {
+          summaryGames.delete(gameId);
+          changed = true;
+        }
+      });
 
-      const data = await response.json();
-      renderLeaderboard(data);
+      if (changed || !summaryLoaded) {
+        renderLeaderboard({ tournaments: summaryTournaments, games: Array.from(summaryGames.values()) });
+      }
+      summaryLoaded = true;
     } catch (error) {
       console.error(error);
+    } finally {
+      summaryRefreshing = false;
     }
   }
 
@@ -910,6 +982,76 @@
     }
   }
 
+  function renderLiveGameStates() {
+    const games = Array.from(liveGameStates.values()).sort((a, b) => a.game_id - b.game_id);
+    renderLiveGames(games, Date.now());
+  }
+
+  // Applies a delta-protocol patch: top-level fields in `set`, and per
+  // player the changed fields plus any ball times that changed.
+  function applyLivePatch(state, patch) {
+    const changes = new Map((patch.scores || []).map((entry) => [entry.player_number, entry]));
+    const scores = state.scores.map((entry) => {
+      const change = changes.get(entry.player_number);
+      if (!change) return entry;
+      const { ball_times: ballTimes, ...fields } = change;
+      const patched = { ...entry, ...fields };
+      if (ballTimes) {
+        const balls = new Map(entry.ball_times.map((item) => [item.ball, item]));
+        ballTimes.forEach((item) => balls.set(item.ball, item));
+        patched.ball_times = Array.from(balls.values()).sort((a, b) => a.ball - b.ball);
+      }
+      return patched;
+    });
+    return { ...state, ...(patch.set || {}), scores };
+  }
+
+  function storeLiveGame(entry) {
+    liveGameStates.set(entry.game_id, entry.state);
+    liveGameSeqs.set(entry.game_id, entry.seq);
+  }
+
+  function openLiveStream() {
+    if (typeof EventSource === "undefined") {
+      fetchLiveGames();
+      liveTimer = setInterval(fetchLiveGames, LIVE_REFRESH_MS);
+      return;
+    }
+
+    // EventSource reconnects on its own and resumes from the last event id.
+    const stream = new EventSource(`${LIVE_STREAM_URL}?delta=${LIVE_DELTA_VERSION}`);
+    stream.addEventListener("snapshot", (event) => {
+      const snapshot = JSON.parse(event.data);
+      liveGameStates.clear();
+      liveGameSeqs.clear();
+      snapshot.games.forEach(storeLiveGame);
+      renderLiveGameStates();
+    });
+    stream.addEventListener("state", (event) => {
+      storeLiveGame(JSON.parse(event.data));
+      renderLiveGameStates();
+    });
+    stream.addEventListener("patch", (event) => {
+      const patch = JSON.parse(event.data);
+      const state = liveGameStates.get(patch.game_id);
+      if (!state || liveGameSeqs.get(patch.game_id) !== patch.base) {
+        // Missed an update; a fresh connection starts with a snapshot.
+        stream.close();
+        openLiveStream();
+        return;
+      }
+      storeLiveGame({ game_id: patch.game_id, seq: patch.seq, state: applyLivePatch(state, patch) });
+      renderLiveGameStates();
+    });
+    stream.addEventListener("ended", (event) => {
+      const { game_id: gameId } = JSON.parse(event.data);
+      liveGameSeqs.delete(gameId);
+      if (liveGameStates.delete(gameId)) {
+        renderLiveGameStates();
+      }
+    });
+  }
+
   document.addEventListener("DOMContentLoaded", () => {
     boardPages = [{ node: buildEmptyBoard("Loading leaderboards…") }];
     mountBoardPages(boardPages);
@@ -920,8 +1062,7 @@
     fetchLeaderboard();
     refreshTimer = setInterval(fetchLeaderboard, REFRESH_MS);
 
-    fetchLiveGames();
-    liveTimer = setInterval(fetchLiveGames, LIVE_REFRESH_MS);
+    openLiveStream();
 
     window.addEventListener("resize", () => {
       const activeBoard = leaderboardEl.querySelector(".game-board--active");
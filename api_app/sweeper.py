@@ -0,0 +1,100 @@
+"""Close games that went silent.
+
+A game normally ends when its machine reports ``game_active=false``. One
+whose machine lost power or network never does and would stay active
+forever, kept in every active-game query. The sweep closes all active
+games without a state in the last ``GAME_IDLE_TIMEOUT_SECONDS`` with one
+bulk ``UPDATE`` per chunk, ending each at its last state. It then writes
+what a normal end writes: the ``end`` event and the compact timeline.
+
+The update names the games it closes (see :func:`changes.bulk_rows`), so
+read models reload just those games, and the live store drops them at once.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import changes, game_events, live, models, schemas, timeline
+from .database import AsyncSessionLocal, settings
+
+logger = logging.getLogger(__name__)
+
+# Keep individual UPDATE statements well under SQLite's bound-parameter limit.
+SWEEP_CHUNK_SIZE = 500
+
+metrics = schemas.SweeperMetrics()
+
+
+def _silent_since(cutoff: datetime):
+    recent = (
+        select(models.GameState.id)
+        .where(models.GameState.game_id == models.Game.id, models.GameState.timestamp >= cutoff)
+        .exists()
+    )
+    return and_(
+        models.Game.is_active.is_(True),
+        ~recent,
+        or_(models.Game.start_time.is_(None), models.Game.start_time < cutoff),
+    )
+
+
+async def _close(db: AsyncSession, game_ids: list[int], cutoff: datetime, now: datetime) -> list[tuple[int, datetime]]:
+    last_state = (
+        select(func.max(models.GameState.timestamp))
+        .where(models.GameState.game_id == models.Game.id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(models.Game)
+        # Re-checked here: a state may have arrived since the games were picked.
+        .where(models.Game.id.in_(game_ids), _silent_since(cutoff))
+        .values(is_active=False, end_time=func.coalesce(last_state, now))
+        .returning(models.Game.id, models.Game.end_time)
+        .execution_options(synchronize_session=False, **changes.bulk_rows(game_ids))
+    )
+    return [(game_id, end_time) for game_id, end_time in result]
+
+
+async def run_sweep(*, now: datetime | None = None, idle_seconds: int | None = None) -> schemas.SweepReport:
+    """Close active games that have been silent for ``idle_seconds``."""
+
+    started = time.perf_counter()
+    report = schemas.SweepReport()
+    idle = settings.GAME_IDLE_TIMEOUT_SECONDS if idle_seconds is None else idle_seconds
+    if idle <= 0:
+        return report
+
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=idle)
+    closed: list[int] = []
+    async with AsyncSessionLocal() as db:
+        candidates = (
+            await db.execute(select(models.Game.id).where(_silent_since(cutoff)).order_by(models.Game.id))
+        ).scalars().all()
+        for offset in range(0, len(candidates), SWEEP_CHUNK_SIZE):
+            chunk = candidates[offset : offset + SWEEP_CHUNK_SIZE]
+            ended = await _close(db, chunk, cutoff, now)
+            for game_id, end_time in ended:
+                await game_events.record_end(db, game_id, end_time)
+                if settings.COMPACT_TIMELINES and await timeline.store_timeline(db, game_id) is not None:
+                    report.timelines_stored += 1
+            await db.commit()
+            closed.extend(game_id for game_id, _ in ended)
+
+    for game_id in closed:
+        live.store.record_ended(game_id)
+
+    report.games_closed = len(closed)
+    report.duration_ms = (time.perf_counter() - started) * 1000
+    metrics.runs += 1
+    metrics.games_closed += report.games_closed
+    metrics.last_run_at = now
+    metrics.last_games_closed = report.games_closed
+    metrics.last_duration_ms = report.duration_ms
+    if closed:
+        logger.info("Sweeper closed %s silent games in %.1fms", report.games_closed, report.duration_ms)
+    return report
@@ -0,0 +1,197 @@
+"""Compact, delta-encoded game timelines.
+
+A finished game's states are packed into two column groups:
+
+* one row per state: ``(timestamp_delta_us, seconds_elapsed, ball, player_up, change_count)``
+* one row per score change: ``(player_number, score_delta)``
+
+Each column is an ``array('q')`` of little-endian int64 values and the whole
+payload is zlib-compressed, so a 45-minute game fits in a few kilobytes and
+decodes without touching the ORM.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, utils
+from .database import settings
+
+ENCODING_VERSION = 1
+_HEADER = struct.Struct("<2sBII")
+_MAGIC = b"GT"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class TimelineState:
+    """Decoded state exposing the attributes consumers read from ``GameState``."""
+
+    __slots__ = ("id", "game_id", "timestamp", "seconds_elapsed", "ball", "player_up", "scores")
+
+    def __init__(self, game_id, timestamp, seconds_elapsed, ball, player_up, scores):
+        self.id = None
+        self.game_id = game_id
+        self.timestamp = timestamp
+        self.seconds_elapsed = seconds_elapsed
+        self.ball = ball
+        self.player_up = player_up
+        self.scores = scores
+
+
+def _epoch_us(timestamp: datetime | None) -> int:
+    if timestamp is None:
+        return 0
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int((timestamp - _EPOCH) / timedelta(microseconds=1))
+
+
+def _pack(columns: Sequence[array]) -> bytes:
+    if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+        columns = [array("q", column) for column in columns]
+        for column in columns:
+            column.byteswap()
+    return b"".join(column.tobytes() for column in columns)
+
+
+def _unpack(payload: bytes, count: int, offset: int) -> tuple[array, int]:
+    size = count * 8
+    column = array("q")
+    column.frombytes(payload[offset : offset + size])
+    if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+        column.byteswap()
+    return column, offset + size
+
+
+def encode_states(states: Sequence[models.GameState]) -> bytes:
+    """Encode chronologically ordered states into a compact blob."""
+
+    timestamps, seconds, balls, players_up, change_counts = (array("q") for _ in range(5))
+    player_numbers, score_deltas = array("q"), array("q")
+
+    previous_us = 0
+    previous_scores: dict[int, int] = {}
+    for state in states:
+        current_us = _epoch_us(state.timestamp)
+        timestamps.append(current_us - previous_us)
+        previous_us = current_us
+        seconds.append(int(state.seconds_elapsed or 0))
+        balls.append(int(state.ball or 0))
+        players_up.append(int(state.player_up or 0))
+
+        changes = 0
+        for player_number, score in utils.score_map(state.scores).items():
+            prior = previous_scores.get(player_number)
+            if prior is not None and prior == score:
+                continue
+            # New players are always recorded so decoders see every score key.
+            player_numbers.append(player_number)
+            score_deltas.append(score - (prior or 0))
+            previous_scores[player_number] = score
+            changes += 1
+        change_counts.append(changes)
+
+    header = _HEADER.pack(_MAGIC, ENCODING_VERSION, len(states), len(player_numbers))
+    body = _pack([timestamps, seconds, balls, players_up, change_counts, player_numbers, score_deltas])
+    return header + zlib.compress(body)
+
+
+def decode_timeline(blob: bytes, game_id: int | None = None) -> list[TimelineState]:
+    """Expand a blob produced by :func:`encode_states` back into states."""
+
+    magic, version, state_count, change_count = _HEADER.unpack_from(blob)
+    if magic != _MAGIC or version != ENCODING_VERSION:
+        raise ValueError("Unsupported timeline encoding")
+
+    payload = zlib.decompress(blob[_HEADER.size :])
+    offset = 0
+    timestamps, offset = _unpack(payload, state_count, offset)
+    seconds, offset = _unpack(payload, state_count, offset)
+    balls, offset = _unpack(payload, state_count, offset)
+    players_up, offset = _unpack(payload, state_count, offset)
+    change_counts, offset = _unpack(payload, state_count, offset)
+    player_numbers, offset = _unpack(payload, change_count, offset)
+    score_deltas, offset = _unpack(payload, change_count, offset)
+
+    states: list[TimelineState] = []
+    running: dict[str, int] = {}
+    current_us = 0
+    cursor = 0
+    for idx in range(state_count):
+        current_us += timestamps[idx]
+        for _ in range(change_counts[idx]):
+            key = str(player_numbers[cursor])
+            running[key] = running.get(key, 0) + score_deltas[cursor]
+            cursor += 1
+        states.append(
+            TimelineState(
+                game_id=game_id,
+                timestamp=_EPOCH + timedelta(microseconds=current_us),
+                seconds_elapsed=seconds[idx],
+                ball=balls[idx],
+                player_up=players_up[idx],
+                scores=dict(running),
+            )
+        )
+    return states
+
+
+async def store_timeline(
+    db: AsyncSession, game_id: int, states: Sequence[models.GameState] | None = None
+) -> models.GameTimeline | None:
+    """Encode the game's states and upsert its compact timeline.
+
+    ``states`` may be passed when the caller already loaded them in
+    chronological order. The caller commits. Games without states are skipped.
+    """
+
+    if states is None:
+        result = await db.execute(
+            select(models.GameState)
+            .where(models.GameState.game_id == game_id)
+            .order_by(models.GameState.timestamp.asc(), models.GameState.id.asc())
+        )
+        states = result.scalars().all()
+    if not states:
+        return None
+
+    record = await db.get(models.GameTimeline, game_id)
+    if record is None:
+        record = models.GameTimeline(game_id=game_id)
+        db.add(record)
+    record.encoding = ENCODING_VERSION
+    record.state_count = len(states)
+    record.last_state_id = max(state.id for state in states)
+    record.data = encode_states(states)
+    await db.flush()
+    return record
+
+
+async def load_timeline(db: AsyncSession, game_id: int) -> list[TimelineState] | None:
+    """Return decoded states when a current compact timeline exists.
+
+    A timeline is current when no state newer than its watermark was stored
+    after it was encoded; retention may delete rows but never adds them.
+    """
+
+    if not settings.COMPACT_TIMELINES:
+        return None
+
+    record = await db.get(models.GameTimeline, game_id)
+    if record is None or record.encoding != ENCODING_VERSION:
+        return None
+
+    newest = await db.execute(
+        select(func.max(models.GameState.id)).where(models.GameState.game_id == game_id)
+    )
+    newest_id = newest.scalar_one_or_none()
+    if newest_id is not None and newest_id > record.last_state_id:
+        return None
+
+    return decode_timeline(record.data, game_id)
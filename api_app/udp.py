@@ -8,8 +8,8 @@ import httpx
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import models
-from .database import AsyncSessionLocal
+from . import changes, game_events, live, machine_directory, models, timeline, utils
+from .database import AsyncSessionLocal, settings
 
 logger = logging.getLogger(__name__)
 
@@ -23,14 +23,6 @@ def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def _ensure_utc(dt: datetime | None) -> datetime | None:
-    if dt is None:
-        return None
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
-
-
 _uid_fetch_cache: dict[str, tuple[datetime, str | None]] = {}
 _version_fetch_cache: dict[str, tuple[datetime, str | None]] = {}
 _machine_locks: dict[str, asyncio.Lock] = {}
@@ -276,11 +268,15 @@ async def _ensure_active_game(db: AsyncSession, machine: models.Machine) -> mode
     return game
 
 
-async def _deactivate_active_game(db: AsyncSession, machine: models.Machine) -> None:
+async def _deactivate_active_game(db: AsyncSession, machine: models.Machine) -> models.Game | None:
     active = await _get_active_game(db, machine)
     if active:
         active.is_active = False
         active.end_time = _utcnow()
+        await game_events.record_end(db, active.id, active.end_time)
+        if settings.COMPACT_TIMELINES:
+            await timeline.store_timeline(db, active.id)
+    return active
 
 
 async def _upsert_machine(
@@ -402,7 +398,7 @@ async def _get_or_create_machine_by_uid(
 
 async def _maybe_refresh_version(db: AsyncSession, machine: models.Machine) -> None:
     now = _utcnow()
-    last_checked = _ensure_utc(machine.version_checked_at)
+    last_checked = utils.ensure_utc(machine.version_checked_at)
     if last_checked:
         age = (now - last_checked).total_seconds()
         if age < VERSION_FETCH_COOLDOWN_SECONDS:
@@ -438,15 +434,24 @@ async def ingest_discovery(
             machine = await _upsert_machine(db, ip, name, commit=False)
             if machine:
                 await _ensure_active_game(db, machine)
+                changes.tag(db, live.INGEST_ORIGIN)
                 await db.commit()
+                live.store.record_machine(machine)
+                machine_directory.directory.record_machine(machine)
             return
 
+    machines = []
     for peer_ip, peer_name in peers:
         async with _machine_lock(peer_ip):
             machine = await _upsert_machine(db, peer_ip, peer_name, commit=False)
             if machine:
                 await _ensure_active_game(db, machine)
+                machines.append(machine)
+    changes.tag(db, live.INGEST_ORIGIN)
     await db.commit()
+    for machine in machines:
+        live.store.record_machine(machine)
+        machine_directory.directory.record_machine(machine)
 
 
 def _coerce_score(value) -> int:
@@ -488,8 +493,13 @@ async def ingest_game_state(db: AsyncSession, data: dict, ip: str) -> None:
         if game_active:
             game = await _ensure_active_game(db, machine)
         else:
-            await _deactivate_active_game(db, machine)
+            ended = await _deactivate_active_game(db, machine)
+            changes.tag(db, live.INGEST_ORIGIN)
             await db.commit()
+            live.store.record_machine(machine)
+            machine_directory.directory.record_machine(machine)
+            if ended:
+                live.store.record_ended(ended.id)
             return
 
         game_state = models.GameState(
@@ -498,9 +508,15 @@ async def ingest_game_state(db: AsyncSession, data: dict, ip: str) -> None:
             ball=ball,
             player_up=player_up,
             scores=_normalize_scores(data.get("scores", {})),
+            # Set here rather than by the database so the live store has it.
+            timestamp=_utcnow(),
         )
+        await game_events.record_state(db, game_state, live.store.latest_state(game.id))
         db.add(game_state)
+        changes.tag(db, live.INGEST_ORIGIN)
         await db.commit()
+        live.store.record_state(game, machine, game_state)
+        machine_directory.directory.record_machine(machine)
         logger.info(
             f"Saved game state for machine {machine.ip_address} on game {game.id}"
         )
@@ -0,0 +1,61 @@
+"""Small helpers shared by ingest and the read models."""
+
+import asyncio
+from datetime import datetime, timezone
+
+
+def ensure_utc(dt: datetime | None) -> datetime | None:
+    """``dt`` as an aware UTC datetime; naive values (as SQLite returns them) are UTC."""
+
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+class LoopLock:
+    """An ``asyncio.Lock`` for module-level singletons, used as ``async with``.
+
+    An asyncio.Lock is bound to one event loop (tests run one per case), so a
+    fresh lock is made whenever the running loop changes.
+    """
+
+    def __init__(self) -> None:
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def __aenter__(self) -> None:
+        await self._get().acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._lock.release()
+
+
+def score_map(raw_scores) -> dict[int, int]:
+    """Player number -> score from a stored ``scores`` value.
+
+    States store a ``{"1": score, ...}`` mapping; older rows may hold a list
+    in player order. Entries that are not numbers are skipped.
+    """
+
+    if isinstance(raw_scores, dict):
+        items = raw_scores.items()
+    elif isinstance(raw_scores, list):
+        items = ((idx + 1, value) for idx, value in enumerate(raw_scores))
+    else:
+        items = ()
+    parsed: dict[int, int] = {}
+    for key, value in items:
+        try:
+            parsed[int(key)] = int(value or 0)
+        except (TypeError, ValueError):
+            continue
+    return parsed
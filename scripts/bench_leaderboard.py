@@ -0,0 +1,156 @@
+"""Micro-benchmark for leaderboard window filtering.
+
+Builds 100k synthetic snapshots and compares picking players' best
+snapshots per window by scanning datetimes (how boards were recomputed
+before timestamps were normalized, once per game applied) with the engine,
+which recomputes each player once per rebuild by bisecting per-player
+arrays of epoch timestamps.
+
+    python scripts/bench_leaderboard.py [--snapshots 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import leaderboard_engine, utils  # noqa: E402
+from api_app.leaderboard_engine import GameInfo, Snapshot  # noqa: E402
+
+PLAYERS_PER_GAME = 4
+
+
+def _build_rows(count: int, now: datetime, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    rows = []
+    for index in range(count):
+        game_id = index // PLAYERS_PER_GAME + 1
+        rows.append(
+            {
+                "game_id": game_id,
+                "machine_id": game_id % 20 + 1,
+                "game_player_id": index + 1,
+                "player_id": rng.randrange(1, 501),
+                "player_number": index % PLAYERS_PER_GAME + 1,
+                "initials": "AAA",
+                "screen_name": None,
+                "machine_name": "Bench",
+                # Naive, as SQLite returns them.
+                "observed_at": (now - timedelta(seconds=rng.randrange(0, 2 * 365 * 86400))).replace(
+                    tzinfo=None
+                ),
+                "score": rng.randrange(0, 10_000_000),
+            }
+        )
+    return rows
+
+
+def _datetime_best(candidates, since: datetime | None):
+    def rank_key(snapshot):
+        observed = snapshot.observed_at.timestamp() if snapshot.observed_at else 0.0
+        return (-snapshot.score, snapshot.observed_at is None, -observed, snapshot.game_player_id)
+
+    return min(
+        (s for s in candidates if since is None or s.observed_at is None or s.observed_at >= since),
+        key=rank_key,
+        default=None,
+    )
+
+
+def _datetime_rebuild(by_game: dict[int, list[Snapshot]], windows: list[datetime | None]) -> dict:
+    scoped: dict[tuple, dict[int, Snapshot]] = {}
+    best: dict[tuple, Snapshot | None] = {}
+    for game_id, snapshots in by_game.items():
+        touched = set()
+        for snapshot in snapshots:
+            for scope in (("game", game_id), ("machine", snapshot.machine_id), ("global", None)):
+                key = (scope, snapshot.player_id)
+                scoped.setdefault(key, {})[snapshot.game_player_id] = snapshot
+                touched.add(key)
+        for key in touched:
+            for index, since in enumerate(windows):
+                best[key + (index,)] = _datetime_best(scoped[key].values(), since)
+    return best
+
+
+def _timed(label: str, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms")
+    return result, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshots", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    rows = _build_rows(args.snapshots, now, args.seed)
+    print(f"{args.snapshots} snapshots, {len({row['player_id'] for row in rows})} players")
+
+    snapshots, _ = _timed(
+        "normalize timestamps (load)",
+        lambda: [
+            Snapshot(**{**row, "observed_at": utils.ensure_utc(row["observed_at"])})
+            for row in rows
+        ],
+    )
+    by_game: dict[int, list[Snapshot]] = {}
+    for snapshot in snapshots:
+        by_game.setdefault(snapshot.game_id, []).append(snapshot)
+    updates = {
+        game_id: (GameInfo(game_id, items[0].machine_id, "Bench", False, items[0].observed_at), items)
+        for game_id, items in by_game.items()
+    }
+
+    windows = [since for _, _, since in leaderboard_engine.timeframes(now)]
+    _, scan_time = _timed("rebuild: datetime scan per game", lambda: _datetime_rebuild(by_game, windows))
+    board_engine = leaderboard_engine.LeaderboardEngine(subscribe=False)
+    board_engine.advance(now)
+    _, engine_time = _timed("rebuild: engine (epoch bisect)", lambda: board_engine._apply_games(updates))
+    print(f"{'speedup':<40} {scan_time / engine_time:9.1f}x")
+
+    for kind in ("game", "machine", "global"):
+        histories = [
+            history
+            for scope, players in board_engine._scoped.items()
+            if scope[0] == kind
+            for history in players.values()
+        ]
+
+        def scan():
+            return [
+                _datetime_best(history.snapshots.values(), since) for history in histories for since in windows
+            ]
+
+        def bisect_arrays(reindex: bool):
+            if reindex:
+                for history in histories:
+                    history._times = None
+            return [
+                history.best_since(leaderboard_engine.epoch_us(since))
+                for history in histories
+                for since in windows
+            ]
+
+        print(f"{kind} scope: {len(histories)} player histories x {len(windows)} windows")
+        expected, scan_time = _timed("  window filter: datetime scan", scan)
+        for label, reindex in (("  window filter: bisect, reindexed", True), ("  window filter: bisect", False)):
+            actual, bisect_time = _timed(label, lambda: bisect_arrays(reindex))
+            assert [s.game_player_id if s else None for s in expected] == [
+                s.game_player_id if s else None for s in actual
+            ], "bisected windows disagree with the datetime scan"
+            print(f"{'  speedup':<40} {scan_time / bisect_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
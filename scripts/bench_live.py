@@ -0,0 +1,139 @@
+"""Benchmark for loading live games into the live store.
+
+Seeds a throwaway SQLite database with 50 active games (plus stale active
+games and finished games) and compares loading them the way
+``/games/live`` used to, with one state query per active game and the stale
+check done in Python afterwards, with the batched loader, which filters
+stale games in SQL and reads all states in one query.
+
+    python scripts/bench_live.py [--games 50] [--states 600]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+_DB_PATH = Path(tempfile.mkdtemp()) / "bench_live.db"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB_PATH}"
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import event  # noqa: E402
+
+from api_app import database, live, models  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+
+PLAYERS_PER_GAME = 4
+
+
+async def _seed(live_games: int, stale_games: int, finished_games: int, states_per_game: int, seed: int) -> None:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with database.AsyncSessionLocal() as session:
+        players = [models.Player(initials=f"P{index:02d}"[:3]) for index in range(40)]
+        session.add_all(players)
+        kinds = ["live"] * live_games + ["stale"] * stale_games + ["finished"] * finished_games
+        for index, kind in enumerate(kinds):
+            machine = models.Machine(name=f"Machine {index}", uid=f"bench-{index}", ip_address="10.0.0.1")
+            game = models.Game(machine=machine, is_active=kind != "finished")
+            session.add_all([machine, game])
+            for number, player in enumerate(rng.sample(players, PLAYERS_PER_GAME), start=1):
+                session.add(models.GamePlayer(game=game, player=player, player_number=number))
+            # Live games' newest state is fresh; the others stopped an hour ago.
+            ends_at = now if kind == "live" else now - timedelta(hours=1)
+            scores = {str(number): 0 for number in range(1, PLAYERS_PER_GAME + 1)}
+            for step in range(states_per_game):
+                player_up = step // 50 % PLAYERS_PER_GAME + 1
+                scores = {**scores, str(player_up): scores[str(player_up)] + rng.randrange(0, 5_000)}
+                session.add(
+                    models.GameState(
+                        game=game,
+                        seconds_elapsed=step,
+                        ball=step * 3 // states_per_game + 1,
+                        player_up=player_up,
+                        scores=scores,
+                        timestamp=ends_at - timedelta(seconds=states_per_game - step),
+                    )
+                )
+        await session.commit()
+
+
+async def _per_game_load() -> dict[int, live._LiveGame]:
+    # One query for the active games, then one per game for its states.
+    async with database.AsyncSessionLocal() as db:
+        games = (
+            (await db.execute(live._games_query().where(models.Game.is_active.is_(True)))).scalars().unique().all()
+        )
+        now = datetime.now(timezone.utc)
+        entries = {}
+        for game in games:
+            entry = live._LiveGame.from_game(game, await live._all_states(db, game))
+            if entry.live_state(now) is not None:
+                entries[game.id] = entry
+        return entries
+
+
+async def _batched_load() -> dict[int, live._LiveGame]:
+    async with database.AsyncSessionLocal() as db:
+        return await live._load_games(db, None)
+
+
+async def _timed(label: str, load, repeat: int):
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = await load()
+            timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    best = min(timings)
+    print(f"{label:<40} {best * 1000:9.1f} ms  {len(statements) // repeat:5d} queries")
+    return result, best
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=50, help="active games with a fresh state")
+    parser.add_argument("--stale", type=int, default=25, help="active games whose last state is stale")
+    parser.add_argument("--finished", type=int, default=200)
+    parser.add_argument("--states", type=int, default=600, help="states per game")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    await _seed(args.games, args.stale, args.finished, args.states, args.seed)
+    print(
+        f"seeded {args.games} live, {args.stale} stale and {args.finished} finished games "
+        f"x {args.states} states in {time.perf_counter() - started:.1f}s"
+    )
+
+    expected, per_game_time = await _timed("per-game state queries", _per_game_load, args.repeat)
+    actual, batched_time = await _timed("batched, stale filtered in SQL", _batched_load, args.repeat)
+    now = datetime.now(timezone.utc)
+    assert sorted(expected) == sorted(actual), "loaders disagree on which games are live"
+    assert all(
+        expected[game_id].live_state(now) == actual[game_id].live_state(now) for game_id in expected
+    ), "loaders built different live states"
+    print(f"{'speedup':<40} {per_game_time / batched_time:9.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
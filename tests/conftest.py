@@ -1,4 +1,4 @@
-"""Global Pytest configuration for diagnostics."""
+"""Global Pytest configuration: diagnostics and shared fixtures."""
 
 import asyncio
 import sys
@@ -6,8 +6,12 @@ import threading
 import time
 from pathlib import Path
 
+import pytest
+from sqlalchemy import event
+
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from api_app import udp
 from api_app.database import engine
 
 
@@ -28,6 +32,39 @@ def _log_marker(label: str) -> None:
     )
 
 
+class _VersionStub:
+    version: str | None = None
+
+    async def __call__(self, ip_address, attempts=2):
+        return self.version
+
+
+@pytest.fixture
+def no_version_fetch(monkeypatch):
+    """Ingest without asking machines over HTTP for their version.
+
+    Reports no version; set ``no_version_fetch.version`` to report one.
+    """
+
+    stub = _VersionStub()
+    monkeypatch.setattr(udp, "_fetch_machine_version", stub)
+    return stub
+
+
+@pytest.fixture
+def query_log():
+    """SQL statements the test engine runs while the test does; ``clear()`` it before a check."""
+
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
 def pytest_sessionstart(session):
     _log_marker("session start")
 
@@ -0,0 +1,102 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("duckdb")
+
+from api_app import analytics, database, models  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database.settings, "ANALYTICS_DIR", str(tmp_path / "analytics"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await database.init_db()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_export_is_incremental_and_skips_live_games():
+    first = await analytics.export_finished_games(batch_size=2)
+    second = await analytics.export_finished_games()
+
+    # The seed has four finished games and one game still in progress.
+    assert first.games_exported == 4
+    assert first.results_exported == 13
+    assert first.states_exported > 0
+    assert first.files_written == 6
+    assert second.games_exported == 0
+
+
+@pytest.mark.asyncio
+async def test_historical_endpoints_read_from_analytics_store(async_client):
+    empty = await async_client.get("/api/v1/analytics/leaderboard")
+    assert empty.status_code == 200
+    assert empty.json() == []
+
+    export = await async_client.post("/api/v1/admin/analytics/export", auth=("admin", "test-admin"))
+    assert export.status_code == 200
+    assert export.json()["games_exported"] == 4
+
+    leaderboard = await async_client.get("/api/v1/analytics/leaderboard", params={"limit": 3})
+    assert leaderboard.status_code == 200
+    top = leaderboard.json()
+    assert [entry["initials"] for entry in top] == ["LUX", "NIN", "SKY"]
+    assert top[0]["score"] == 2_240_000_000_000
+    assert top[1]["games_played"] == 2
+
+    machines = await async_client.get("/api/v1/analytics/machines")
+    assert machines.status_code == 200
+    by_name = {entry["machine_name"]: entry for entry in machines.json()}
+    assert by_name["Gravity Well"]["games_played"] == 2
+    assert by_name["Solar Flare"]["top_score"] == 2_240_000_000_000
+    assert "Nebula Orbit" in by_name
+
+
+@pytest.mark.asyncio
+async def test_export_tracks_a_high_water_mark_and_compacts_parts(async_client, monkeypatch):
+    monkeypatch.setattr(database.settings, "ANALYTICS_COMPACT_PARTS", 2)
+
+    # One game per part; pairs of parts merge, and pairs of merged parts merge again.
+    first = await analytics.export_finished_games(batch_size=1)
+    assert first.games_exported == 4
+    assert first.parts_merged > 0
+    manifest = analytics._read_manifest()
+    for table in ("games", "results", "states"):
+        on_disk = sorted(path.name for path in (analytics.analytics_dir() / table).glob("*.parquet"))
+        assert on_disk == sorted(manifest.files[table])
+        assert len(on_disk) == 1
+    assert len(manifest.open) == 1
+
+    leaderboard = await async_client.get("/api/v1/analytics/leaderboard", params={"limit": 3})
+    assert [entry["initials"] for entry in leaderboard.json()] == ["LUX", "NIN", "SKY"]
+
+    # The game still in progress is exported once it finishes, without rescanning.
+    async with database.AsyncSessionLocal() as session:
+        game = await session.get(models.Game, manifest.open[0])
+        game.is_active = False
+        await session.commit()
+    assert (await analytics.export_finished_games()).games_exported == 1
+    assert analytics._read_manifest().open == []
+    assert (await analytics.export_finished_games()).games_exported == 0
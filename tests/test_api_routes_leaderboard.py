@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 from pathlib import Path
@@ -5,13 +6,14 @@ from pathlib import Path
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
 
 os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
 os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from api_app import database  # noqa: E402
+from api_app import database, models  # noqa: E402
 from api_app.database import Base, engine  # noqa: E402
 from api_app.main import app  # noqa: E402
 
@@ -48,6 +50,35 @@ async def test_leaderboard_summary_has_one_tournament(async_client):
     assert any(game.get("champion") for game in payload.get("games", []))
 
 
+@pytest.mark.asyncio
+async def test_leaderboard_summary_ranks_windows_without_loading_states(async_client):
+    loaded: list[int] = []
+
+    def record_load(target, context):
+        loaded.append(target.id)
+
+    event.listen(models.GameState, "load", record_load)
+    try:
+        response = await async_client.get("/api/v1/leaderboard/summary")
+    finally:
+        event.remove(models.GameState, "load", record_load)
+
+    assert response.status_code == 200
+    assert loaded == []
+
+    games = response.json()["games"]
+    assert [window["slug"] for window in games[0]["windows"]] == [
+        f"game-{games[0]['id']}-{slug}" for slug in ("all-time", "year", "month", "week", "24h")
+    ]
+    for game in games:
+        for window in game["windows"]:
+            scores = [entry["score"] for entry in window["leaderboard"]]
+            assert scores == sorted(scores, reverse=True)
+            assert len({entry["player_id"] for entry in window["leaderboard"]}) == len(scores)
+        if game["champion"]:
+            assert game["champion"] == game["windows"][0]["leaderboard"][0]
+
+
 @pytest.mark.asyncio
 async def test_live_games_surface_seeded_activity(async_client):
     response = await async_client.get("/api/v1/games/live")
@@ -60,3 +91,98 @@ async def test_live_games_surface_seeded_activity(async_client):
     assert live_game["machine_name"] == "Nebula Orbit"
     assert live_game["scores"], "live scores should include player entries"
     assert any(score["is_player_up"] for score in live_game["scores"])
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_summary_cursor_walks_every_board_once(async_client):
+    everything = (await async_client.get("/api/v1/leaderboard/summary")).json()
+    expected = [board["slug"] for board in everything["leaderboards"]]
+
+    seen: list[str] = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await async_client.get("/api/v1/leaderboard/summary", params=params)).json()
+        pages += 1
+        seen.extend(board["slug"] for board in page["leaderboards"])
+        # Only the games on the page are returned, and tournaments ride on page one.
+        assert {game["id"] for game in page["games"]} == {
+            int(board["slug"].split("-")[1]) for board in page["leaderboards"]
+        }
+        assert bool(page["tournaments"]) == (pages == 1)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == -(-everything["total_boards"] // 4)
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_summary_filters_by_machine_and_window(async_client):
+    games = (await async_client.get("/api/v1/leaderboard/summary")).json()["games"]
+    machine_games = (await async_client.get("/api/v1/leaderboard")).json()
+    target = next(game for game in machine_games if game["machine_name"] == "Gravity Well")
+
+    async with database.AsyncSessionLocal() as session:
+        machine_id = (await session.get(models.Game, target["id"])).machine_id
+
+    response = await async_client.get(
+        "/api/v1/leaderboard/summary", params={"machine_id": machine_id, "window": "all-time"}
+    )
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["tournaments"] == []
+    assert payload["total_boards"] == len(payload["leaderboards"])
+    assert all(board["slug"].endswith("-all-time") for board in payload["leaderboards"])
+    assert {game["machine_name"] for game in payload["games"]} == {"Gravity Well"}
+    assert len(payload["games"]) < len(games)
+
+    invalid = await async_client.get("/api/v1/leaderboard/summary", params={"window": "decade"})
+    assert invalid.status_code == 422
+    bad_cursor = await async_client.get("/api/v1/leaderboard/summary", params={"cursor": "nope"})
+    assert bad_cursor.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_game_leaderboard_keyset_pages_match_full_listing(async_client):
+    everything = (await async_client.get("/api/v1/leaderboard")).json()
+
+    collected = []
+    after_id = None
+    while True:
+        params = {"limit": 2}
+        if after_id is not None:
+            params["after_id"] = after_id
+        response = await async_client.get("/api/v1/leaderboard", params=params)
+        assert response.status_code == 200
+        collected.extend(response.json())
+        after_id = response.headers.get("X-Next-After-Id")
+        if after_id is None:
+            break
+
+    assert collected == everything
+
+    machine_id = 1
+    scoped = (await async_client.get("/api/v1/leaderboard", params={"machine_id": machine_id})).json()
+    async with database.AsyncSessionLocal() as session:
+        for game in scoped:
+            assert (await session.get(models.Game, game["id"])).machine_id == machine_id
+
+    future = await async_client.get("/api/v1/leaderboard", params={"since": "2999-01-01T00:00:00Z"})
+    assert future.json() == []
+
+
+@pytest.mark.asyncio
+async def test_game_leaderboard_streams_ndjson(async_client):
+    everything = (await async_client.get("/api/v1/leaderboard")).json()
+
+    async with async_client.stream("GET", "/api/v1/leaderboard", params={"format": "ndjson"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [line async for line in response.aiter_lines() if line]
+
+    assert [json.loads(line) for line in lines] == everything
@@ -0,0 +1,136 @@
+import gzip
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import backup, database  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database.settings, "BACKUP_DIR", str(tmp_path / "backups"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await database.init_db()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def _count_games(path: Path, tmp_path: Path) -> int:
+    if path.suffix == ".gz":
+        restored = tmp_path / "restored.db"
+        restored.write_bytes(gzip.decompress(path.read_bytes()))
+        path = restored
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+
+@pytest.mark.asyncio
+async def test_admin_backup_is_compressed_listed_and_rotated(async_client, monkeypatch, tmp_path):
+    monkeypatch.setattr(database.settings, "BACKUP_KEEP", 2)
+    auth = ("admin", "test-admin")
+
+    names = []
+    for _ in range(3):
+        response = await async_client.post("/api/v1/admin/backups", auth=auth)
+        assert response.status_code == 201
+        names.append(response.json()["name"])
+
+    report = response.json()
+    assert report["compressed"] is True
+    assert report["removed"] == [names[0]]
+    assert report["size_bytes"] < report["database_bytes"]
+
+    listing = await async_client.get("/api/v1/admin/backups", auth=auth)
+    assert listing.status_code == 200
+    assert [entry["name"] for entry in listing.json()] == [names[2], names[1]]
+
+    latest = backup.backup_dir() / names[2]
+    assert _count_games(latest, tmp_path) == 5
+
+
+def _source_with_writer(tmp_path: Path) -> tuple[Path, sqlite3.Connection]:
+    source = tmp_path / "source.db"
+    with sqlite3.connect(source) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE t (payload BLOB)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(os.urandom(512),) for _ in range(2_000)])
+    # A short timeout fails the test if the backup ever holds the source locked.
+    return source, sqlite3.connect(source, timeout=0.1)
+
+
+def test_copy_doubles_the_step_after_a_restart(monkeypatch, tmp_path):
+    source, writer = _source_with_writer(tmp_path)
+    writes = iter(range(3))
+
+    def write_between_steps(seconds):
+        # Simulates ingest committing while the backup sleeps between steps.
+        if next(writes, None) is not None:
+            writer.execute("INSERT INTO t VALUES (x'00')")
+            writer.commit()
+
+    monkeypatch.setattr(backup.time, "sleep", write_between_steps)
+    target = tmp_path / "copy.db"
+    pages, restarts = backup._copy_database(source, target, pages=50, sleep_seconds=0, max_restarts=5)
+    writer.close()
+
+    assert restarts == 3
+    assert pages > 0
+    with sqlite3.connect(target) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2_003
+
+
+def test_copy_finishes_while_writes_keep_landing(tmp_path):
+    source, writer = _source_with_writer(tmp_path)
+    writer.close()
+    started, done = threading.Event(), threading.Event()
+    written = []
+
+    def keep_writing():
+        # Ingest commits on almost every packet; the short timeout fails the
+        # test if the backup ever blocks one.
+        with sqlite3.connect(source, timeout=0.1) as conn:
+            while not done.is_set():
+                conn.execute("INSERT INTO t VALUES (x'00')")
+                conn.commit()
+                written.append(1)
+                started.set()
+
+    thread = threading.Thread(target=keep_writing)
+    thread.start()
+    try:
+        assert started.wait(timeout=5)
+        before = len(written)
+        pages, restarts = backup._copy_database(
+            source, tmp_path / "copy.db", pages=20, sleep_seconds=0.001, max_restarts=2
+        )
+        during = len(written) - before
+    finally:
+        done.set()
+        thread.join()
+
+    assert pages > 0
+    assert during > 0
+    assert thread_errors == []
@@ -0,0 +1,99 @@
+import os
+import sys
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append("/workspace/the-box")
+
+from api_app.main import app  # noqa: E402
+from api_app import database, game_events, live, models, udp  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_ingest_records_ball_transitions_for_per_ball_summaries(async_client, monkeypatch, no_version_fetch):
+    packets = [
+        (0, 1, 1, [0, 0]),
+        (10, 1, 1, [1_000, 0]),
+        (20, 1, 1, [1_500, 0]),
+        (25, 1, 2, [1_500, 0]),
+        (40, 1, 2, [1_500, 800]),
+        (45, 2, 1, [1_500, 800]),
+        (70, 2, 1, [4_000, 800]),
+    ]
+    lookups = []
+    latest_state = game_events._latest_state
+
+    async def counting_latest_state(db, game_id):
+        lookups.append(game_id)
+        return await latest_state(db, game_id)
+
+    monkeypatch.setattr(game_events, "_latest_state", counting_latest_state)
+    for index, (seconds, ball, player_up, scores) in enumerate(packets):
+        if index == 1:
+            # Once a live view has loaded the game, ingest takes the previous state from memory.
+            await live.store.refresh()
+        await udp._handle_game_state_message(
+            {
+                "machine_id": "balls-uid",
+                "gameTimeMs": seconds * 1_000,
+                "ball_in_play": ball,
+                "player_up": player_up,
+                "scores": scores,
+            },
+            "192.0.2.10",
+        )
+
+    assert len(lookups) == 1
+
+    async with database.AsyncSessionLocal() as session:
+        game = (await session.execute(select(models.Game))).scalar_one()
+        events = (await session.execute(select(models.GameEvent).order_by(models.GameEvent.id))).scalars().all()
+    assert [(event.kind, event.seconds_elapsed, event.scores) for event in events] == [
+        ("start", 0, {"1": 0, "2": 0}),
+        ("player_up", 25, {"1": 1_500, "2": 0}),
+        ("ball", 45, {"1": 1_500, "2": 800}),
+    ]
+
+    expected_live = [
+        {"ball": 1, "player_number": 1, "seconds": 25, "points": 1_500, "end_score": 1_500},
+        {"ball": 1, "player_number": 2, "seconds": 20, "points": 800, "end_score": 800},
+        {"ball": 2, "player_number": 1, "seconds": 25, "points": 2_500, "end_score": 4_000},
+    ]
+    response = await async_client.get(f"/api/v1/games/{game.id}/balls")
+    assert response.status_code == 200
+    assert response.json() == expected_live
+
+    await udp._handle_game_state_message({"machine_id": "balls-uid", "game_active": False}, "192.0.2.10")
+    finished = (await async_client.get(f"/api/v1/games/{game.id}/balls")).json()
+    assert finished == expected_live
+
+    # Games without recorded events are summarized from their states.
+    async with database.AsyncSessionLocal() as session:
+        for event in (await session.execute(select(models.GameEvent))).scalars():
+            await session.delete(event)
+        await session.commit()
+    assert (await async_client.get(f"/api/v1/games/{game.id}/balls")).json() == expected_live
+    assert (await async_client.get("/api/v1/games/999/balls")).status_code == 404
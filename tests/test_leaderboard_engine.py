@@ -0,0 +1,183 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import database, leaderboard_engine, models  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _play(machine_uid: str, initials: str, score: int, at: datetime) -> int:
+    async with database.AsyncSessionLocal() as session:
+        machine = (
+            await session.execute(select(models.Machine).where(models.Machine.uid == machine_uid))
+        ).scalar_one_or_none() or models.Machine(name=machine_uid.title(), uid=machine_uid, ip_address="10.0.0.8")
+        player = (
+            await session.execute(select(models.Player).where(models.Player.initials == initials))
+        ).scalar_one_or_none() or models.Player(initials=initials)
+
+        game = models.Game(machine=machine, is_active=False, start_time=at, end_time=at)
+        session.add_all(
+            [
+                game,
+                models.GamePlayer(game=game, player=player, player_number=1),
+                models.GameState(
+                    game=game, seconds_elapsed=60, ball=3, player_up=1, scores={"1": score}, timestamp=at
+                ),
+            ]
+        )
+        await session.commit()
+        return game.id
+
+
+def _scores(board: list) -> list[tuple[str, int]]:
+    return [(entry.initials, entry.score) for entry in board]
+
+
+@pytest.mark.asyncio
+async def test_windows_expire_on_rolling_and_calendar_boundaries():
+    board_engine = leaderboard_engine.LeaderboardEngine(subscribe=False)
+    new_year = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    await _play("east", "ACE", 900, new_year - timedelta(hours=1))
+    await _play("west", "ACE", 100, new_year + timedelta(minutes=10))
+    await _play("west", "BOB", 500, new_year - timedelta(days=40))
+
+    await board_engine.prepare(new_year - timedelta(minutes=30))
+    assert _scores(board_engine.board(leaderboard_engine.GLOBAL_SCOPE, "year")) == [
+        ("ACE", 900),
+        ("BOB", 500),
+    ]
+    assert _scores(board_engine.board(leaderboard_engine.GLOBAL_SCOPE, "month")) == [("ACE", 900)]
+
+    # Year and month roll over; the 24h window still holds the 900.
+    board_engine.advance(new_year + timedelta(minutes=30))
+    assert _scores(board_engine.board(leaderboard_engine.GLOBAL_SCOPE, "year")) == [("ACE", 100)]
+    assert _scores(board_engine.board(leaderboard_engine.GLOBAL_SCOPE, "month")) == [("ACE", 100)]
+    assert _scores(board_engine.board(leaderboard_engine.GLOBAL_SCOPE, "24h")) == [("ACE", 900)]
+    assert _scores(board_engine.board(leaderboard_engine.GLOBAL_SCOPE, "all-time")) == [
+        ("ACE", 900),
+        ("BOB", 500),
+    ]
+
+    board_engine.advance(new_year + timedelta(hours=23, minutes=30))
+    assert _scores(board_engine.board(leaderboard_engine.GLOBAL_SCOPE, "24h")) == [("ACE", 100)]
+    report = await board_engine.check_consistency(new_year + timedelta(hours=23, minutes=30))
+    assert report.consistent
+
+
+@pytest.mark.asyncio
+async def test_ingest_updates_only_touched_games(async_client, monkeypatch):
+    now = datetime.now(timezone.utc)
+    first = await _play("east", "ACE", 1_000, now - timedelta(minutes=5))
+    await _play("west", "BOB", 2_000, now - timedelta(minutes=4))
+
+    response = await async_client.get("/api/v1/leaderboard/windows")
+    assert response.status_code == 200
+    assert [entry["initials"] for entry in response.json()[0]["leaderboard"]] == ["BOB", "ACE"]
+
+    loaded: list[set[int] | None] = []
+    original_load = leaderboard_engine.load_games
+
+    async def tracking_load(db, game_ids=None):
+        loaded.append(game_ids)
+        return await original_load(db, game_ids)
+
+    monkeypatch.setattr(leaderboard_engine, "load_games", tracking_load)
+
+    async with database.AsyncSessionLocal() as session:
+        session.add(
+            models.GameState(
+                game_id=first, seconds_elapsed=90, ball=3, player_up=1, scores={"1": 3_000}, timestamp=now
+            )
+        )
+        await session.commit()
+
+    summary = await async_client.get("/api/v1/leaderboard/summary")
+    assert summary.status_code == 200
+    assert loaded == [{first}]
+    game = next(item for item in summary.json()["games"] if item["id"] == first)
+    assert game["champion"]["score"] == 3_000
+
+    windows = await async_client.get("/api/v1/leaderboard/windows")
+    assert [entry["initials"] for entry in windows.json()[0]["leaderboard"]] == ["ACE", "BOB"]
+
+    check = await async_client.get("/api/v1/admin/leaderboards/check", auth=("admin", "test-admin"))
+    assert check.status_code == 200
+    assert check.json()["consistent"] is True
+    assert check.json()["mismatched_boards"] == []
+
+
+@pytest.mark.asyncio
+async def test_rank_lookup_reports_position_percentile_and_neighbors(async_client):
+    now = datetime.now(timezone.utc)
+    for index, initials in enumerate(["AAA", "BBB", "CCC", "DDD", "EEE"]):
+        await _play("east", initials, 1_000 * (index + 1), now - timedelta(minutes=10 - index))
+    await _play("west", "AAA", 9_000, now - timedelta(minutes=1))
+
+    async with database.AsyncSessionLocal() as session:
+        players = {
+            player.initials: player.id for player in (await session.execute(select(models.Player))).scalars()
+        }
+        machine_id = (
+            await session.execute(select(models.Machine.id).where(models.Machine.uid == "east"))
+        ).scalar_one()
+
+    response = await async_client.get(
+        "/api/v1/leaderboard/rank",
+        params={"player_id": players["CCC"], "machine_id": machine_id, "window": "24h", "neighbors": 1},
+    )
+    assert response.status_code == 200
+    ranking = response.json()
+    assert (ranking["rank"], ranking["total"], ranking["percentile"]) == (3, 5, 50.0)
+    assert [(entry["rank"], entry["initials"]) for entry in ranking["above"]] == [(2, "DDD")]
+    assert [(entry["rank"], entry["initials"]) for entry in ranking["below"]] == [(4, "BBB")]
+
+    # Globally AAA's 9,000 on the other machine puts them first.
+    response = await async_client.get("/api/v1/leaderboard/rank", params={"player_id": players["AAA"]})
+    ranking = response.json()
+    assert (ranking["scope"], ranking["rank"], ranking["entry"]["score"]) == ("global", 1, 9_000)
+    assert ranking["above"] == []
+    assert [entry["initials"] for entry in ranking["below"]] == ["EEE", "DDD"]
+
+    # An improved score moves the player up without a rebuild.
+    await _play("east", "BBB", 4_500, now)
+    response = await async_client.get(
+        "/api/v1/leaderboard/rank", params={"player_id": players["BBB"], "machine_id": machine_id}
+    )
+    assert response.json()["rank"] == 2
+    board = leaderboard_engine.engine._boards[(("machine", machine_id), "all-time")]
+    assert board.ranked == sorted(board.ranked)
+    assert [entry.initials for entry in board.entries()] == ["EEE", "BBB", "DDD", "CCC", "AAA"]
+
+    missing = await async_client.get(
+        "/api/v1/leaderboard/rank", params={"player_id": players["AAA"], "game_id": 10_000}
+    )
+    assert missing.status_code == 404
@@ -1,10 +1,14 @@
+import asyncio
+import json
 import os
 import sys
 from datetime import datetime, timedelta, timezone
 
 import pytest
 import pytest_asyncio
+from fastapi.testclient import TestClient
 from httpx import AsyncClient, ASGITransport
+from starlette.websockets import WebSocketDisconnect
 from sqlalchemy import select
 
 os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
@@ -13,7 +17,7 @@ os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
 sys.path.append("/workspace/the-box")
 
 from api_app.main import app  # noqa: E402
-from api_app import database, models, udp  # noqa: E402
+from api_app import database, live, models, schemas, udp  # noqa: E402
 from api_app.database import Base, engine  # noqa: E402
 
 
@@ -417,6 +421,318 @@ async def test_live_games_track_last_scorer(async_client):
     assert p1["is_player_up"] is False
 
 
+def test_play_stats_accumulate_one_state_at_a_time():
+    states = [
+        models.GameState(seconds_elapsed=0, ball=1, player_up=1, scores={"1": 0, "2": 0}),
+        models.GameState(seconds_elapsed=12, ball=1, player_up=1, scores={"1": 400, "2": 0}),
+        models.GameState(seconds_elapsed=30, ball=1, player_up=1, scores={"1": 900, "2": 0}),
+        models.GameState(seconds_elapsed=41, ball=1, player_up=2, scores={"1": 900, "2": 250}),
+        models.GameState(seconds_elapsed=55, ball=2, player_up=1, scores={"1": 1_500, "2": 250}),
+    ]
+    accumulator = live.PlayStatsAccumulator()
+    for state in states[:3]:
+        accumulator.add(state)
+    assert accumulator.last_scorer == 1
+    assert accumulator.total_seconds(1) == 30
+    assert accumulator.ball_times(1, current_ball=1) == [
+        schemas.BallPlayTime(ball=1, seconds=30, score=900, is_current=True)
+    ]
+
+    for state in states[3:]:
+        accumulator.add(state)
+    assert accumulator.last_scorer == 1
+    assert accumulator.total_seconds(1) == 30
+    assert [(bt.ball, bt.seconds, bt.score) for bt in accumulator.ball_times(1)] == [(1, 30, 900), (2, 0, 600)]
+    assert [(bt.ball, bt.seconds, bt.score) for bt in accumulator.ball_times(2)] == [(1, 0, 250)]
+
+    replayed = live.PlayStatsAccumulator.replay(states)
+    for player_number in (1, 2):
+        assert replayed.total_seconds(player_number) == accumulator.total_seconds(player_number)
+        assert replayed.ball_times(player_number) == accumulator.ball_times(player_number)
+
+
+@pytest.mark.asyncio
+async def test_live_stream_pushes_ingested_states_and_resumes(async_client, monkeypatch):
+    monkeypatch.setattr(database.settings, "LIVE_STREAM_HEARTBEAT_SECONDS", 0.05)
+    async with database.AsyncSessionLocal() as session:
+        game = await _create_game_with_states(
+            session,
+            uid="stream-uid",
+            players=[("STR", "Streamer")],
+            states=[
+                {
+                    "seconds_elapsed": 5,
+                    "ball": 1,
+                    "player_up": 1,
+                    "scores": {"1": 100},
+                    "timestamp": datetime.now(timezone.utc) - timedelta(seconds=5),
+                }
+            ],
+        )
+
+    stream = live.feed.subscribe()
+    snapshot = await asyncio.wait_for(anext(stream), 5)
+    assert snapshot.event == "snapshot"
+    assert [state["scores"][0]["score"] for state in json.loads(snapshot.data)] == [100]
+
+    await udp._handle_game_state_message(
+        {"machine_id": "stream-uid", "gameTimeMs": 9_000, "scores": [2_500], "ball_in_play": 1},
+        "192.0.2.10",
+    )
+    pushed = await asyncio.wait_for(anext(stream), 5)
+    assert (pushed.event, pushed.game_id) == ("state", game.id)
+    assert json.loads(pushed.data)["scores"][0]["score"] == 2_500
+    await stream.aclose()
+
+    # Reconnecting after the snapshot replays only what was missed.
+    resumed = live.feed.subscribe(last_event_id=snapshot.id)
+    assert (await asyncio.wait_for(anext(resumed), 5)).id == pushed.id
+    await resumed.aclose()
+
+    # Other games' events are filtered out; idle streams get heartbeats.
+    filtered = live.feed.subscribe({game.id + 1}, last_event_id=snapshot.id)
+    assert await asyncio.wait_for(anext(filtered), 5) is None
+    await filtered.aclose()
+
+    await udp._handle_game_state_message({"machine_id": "stream-uid", "game_active": False}, "192.0.2.10")
+    ended = live.feed.subscribe(last_event_id=pushed.id)
+    event = await asyncio.wait_for(anext(ended), 5)
+    assert (event.event, json.loads(event.data)) == ("ended", {"game_id": game.id})
+    await ended.aclose()
+    await live.feed.stop()
+
+    invalid = await async_client.get("/api/v1/games/live/stream", headers={"Last-Event-ID": "later"})
+    assert invalid.status_code == 400
+
+
+def _apply_patch(state: dict, patch: dict) -> dict:
+    patched = {**state, **patch.get("set", {}), "scores": []}
+    changes = {entry["player_number"]: entry for entry in patch.get("scores", [])}
+    for entry in state["scores"]:
+        change = dict(changes.get(entry["player_number"], {}))
+        balls = {ball_time["ball"]: ball_time for ball_time in entry["ball_times"]}
+        balls.update((ball_time["ball"], ball_time) for ball_time in change.pop("ball_times", []))
+        patched["scores"].append({**entry, **change, "ball_times": [balls[ball] for ball in sorted(balls)]})
+    return patched
+
+
+@pytest.mark.asyncio
+async def test_live_delta_stream_sends_patches_against_the_snapshot(async_client, no_version_fetch):
+    async with database.AsyncSessionLocal() as session:
+        game = await _create_game_with_states(
+            session,
+            uid="delta-uid",
+            players=[("DEL", "Delta"), ("TWO", "Second")],
+            states=[
+                {
+                    "seconds_elapsed": 5,
+                    "ball": 1,
+                    "player_up": 1,
+                    "scores": {"1": 100, "2": 0},
+                    "timestamp": datetime.now(timezone.utc) - timedelta(seconds=5),
+                }
+            ],
+        )
+
+    stream = live.feed.subscribe(delta=True)
+    snapshot = json.loads((await asyncio.wait_for(anext(stream), 5)).data)
+    assert snapshot["v"] == live.PATCH_VERSION
+    [entry] = snapshot["games"]
+    seq, state = entry["seq"], entry["state"]
+
+    patches = []
+    for message in (
+        {"gameTimeMs": 9_000, "scores": [2_500, 0], "ball_in_play": 1},
+        {"gameTimeMs": 15_000, "scores": [2_500, 700], "ball_in_play": 2},
+    ):
+        await udp._handle_game_state_message({"machine_id": "delta-uid", **message}, "192.0.2.10")
+        event = await asyncio.wait_for(anext(stream), 5)
+        patch = json.loads(event.data)
+        patches.append(patch)
+        assert (event.event, patch["base"], patch["seq"]) == ("patch", seq, event.id)
+        full = await live.store.state(game.id)
+        assert len(event.data) < len(full.model_dump_json())
+        state, seq = _apply_patch(state, patch), patch["seq"]
+        assert state == full.model_dump(mode="json")
+    # The first patch leaves the second player's entry out.
+    assert [entry["player_number"] for entry in patches[0]["scores"]] == [1]
+    await stream.aclose()
+
+    # A delta viewer that falls behind gets the whole state, not a patch
+    # against a frame it never received.
+    async with live.feed.viewer({"live"}, delta=True) as viewer:
+        for score in (3_000, 3_500):
+            await udp._handle_game_state_message({"machine_id": "delta-uid", "scores": [score, 700]}, "192.0.2.10")
+            for _ in range(500):
+                if game.id in viewer.pending:
+                    break
+                await asyncio.sleep(0.01)
+        for _ in range(500):
+            if viewer.dropped:
+                break
+            await asyncio.sleep(0.01)
+        frame = json.loads(viewer.pending[game.id])
+        assert frame["event"] == "state"
+        assert frame["data"]["state"]["scores"][0]["score"] == 3_500
+    await live.feed.stop()
+
+    unsupported = await async_client.get("/api/v1/games/live/stream", params={"delta": 99})
+    assert unsupported.status_code == 400
+
+
+async def _next_frame(viewer: live.Viewer, game_id: int, score: int) -> str:
+    for _ in range(500):
+        frame = viewer.pending.get(game_id)
+        if frame and json.loads(frame)["data"]["scores"][0]["score"] == score:
+            return frame
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"no frame with score {score} for game {game_id}")
+
+
+@pytest.mark.asyncio
+async def test_live_viewers_share_frames_and_skip_intermediate_states(no_version_fetch):
+    state = {"seconds_elapsed": 5, "ball": 1, "player_up": 1, "scores": {"1": 100}}
+    # Ingested states are stamped by the database to the second.
+    seeded_at = datetime.now(timezone.utc) - timedelta(seconds=5)
+    async with database.AsyncSessionLocal() as session:
+        featured = await _create_game_with_states(
+            session, uid="ws-featured", states=[{**state, "timestamp": seeded_at}]
+        )
+        other = await _create_game_with_states(
+            session, uid="ws-other", states=[{**state, "timestamp": seeded_at}]
+        )
+        profile = models.LeaderboardProfile(name="High", slug="high", sql_template="SELECT 1")
+        tournament = models.Tournament(name="Finals", slug="finals", scoring_profile=profile)
+        session.add_all(
+            [profile, tournament, models.TournamentMachine(tournament=tournament, machine_id=featured.machine_id)]
+        )
+        await session.commit()
+        topic = f"tournament:{tournament.id}"
+
+    async with live.feed.viewer({topic}) as slow, live.feed.viewer({"live"}) as everyone:
+        first = await anext(live.feed.frames(slow))
+        assert [game["game_id"] for game in json.loads(first[0])["data"]] == [featured.id]
+
+        for score in (200, 300, 400):
+            await udp._handle_game_state_message({"machine_id": "ws-featured", "scores": [score]}, "192.0.2.10")
+            await _next_frame(everyone, featured.id, score)
+        await udp._handle_game_state_message({"machine_id": "ws-other", "scores": [900]}, "192.0.2.10")
+        await _next_frame(everyone, other.id, 900)
+
+        # The slow viewer kept only the latest state of its one game, and
+        # both viewers hold the same encoded frame.
+        assert list(slow.pending) == [featured.id]
+        assert slow.dropped == 2
+        assert slow.pending[featured.id] is everyone.pending[featured.id]
+        batch = await anext(live.feed.frames(slow))
+        assert [json.loads(frame)["data"]["scores"][0]["score"] for frame in batch] == [400]
+    await live.feed.stop()
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with TestClient(app).websocket_connect("/api/v1/games/live/ws?topic=everything"):
+            pass
+    assert closed.value.code == 1008
+
+
+@pytest.mark.asyncio
+async def test_live_endpoints_serve_ingested_states_from_memory(async_client, no_version_fetch, query_log):
+    async with database.AsyncSessionLocal() as session:
+        game = await _create_game_with_states(
+            session,
+            uid="memory-uid",
+            players=[("MEM", "Memory")],
+            states=[
+                {
+                    "seconds_elapsed": 5,
+                    "ball": 1,
+                    "player_up": 1,
+                    "scores": {"1": 100},
+                    "timestamp": datetime.now(timezone.utc) - timedelta(seconds=5),
+                }
+            ],
+        )
+        player_id = (
+            await session.execute(select(models.GamePlayer.player_id).where(models.GamePlayer.game_id == game.id))
+        ).scalar_one()
+    await live.store.rebuild()
+
+    await udp._handle_game_state_message(
+        {"machine_id": "memory-uid", "gameTimeMs": 20_000, "scores": [4_000], "ball_in_play": 2},
+        "192.0.2.10",
+    )
+
+    query_log.clear()
+    listed = await async_client.get("/api/v1/games/live")
+    single = await async_client.get(f"/api/v1/games/{game.id}/live")
+    assert query_log == []
+    assert listed.json()[0]["scores"][0]["score"] == 4_000
+    assert single.json()["ball"] == 2
+    assert single.json()["scores"][0]["ball_times"] == [
+        {"ball": 1, "seconds": 0, "score": 0, "is_current": False},
+        {"ball": 2, "seconds": 0, "score": 3_900, "is_current": True},
+    ]
+
+    # Writes from elsewhere are picked up on the next read.
+    async with database.AsyncSessionLocal() as session:
+        player = await session.get(models.Player, player_id)
+        player.screen_name = "Renamed"
+        await session.commit()
+    response = await async_client.get("/api/v1/games/live")
+    assert response.json()[0]["scores"][0]["screen_name"] == "Renamed"
+
+    await udp._handle_game_state_message({"machine_id": "memory-uid", "game_active": False}, "192.0.2.10")
+    assert (await async_client.get("/api/v1/games/live")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_live_games_load_states_in_one_query_and_skip_stale_games(query_log):
+    now = datetime.now(timezone.utc)
+    async with database.AsyncSessionLocal() as session:
+        live_ids = []
+        for index in range(3):
+            game = await _create_game_with_states(
+                session,
+                uid=f"batch-{index}",
+                players=[(f"BA{index}", f"Batch {index}")],
+                states=[
+                    {
+                        "seconds_elapsed": second,
+                        "ball": 1,
+                        "player_up": 1,
+                        "scores": {"1": 100 * second},
+                        "timestamp": now - timedelta(seconds=30 - second),
+                    }
+                    for second in range(1, 4)
+                ],
+            )
+            live_ids.append(game.id)
+        stale = await _create_game_with_states(
+            session,
+            uid="batch-stale",
+            states=[
+                {
+                    "seconds_elapsed": 5,
+                    "ball": 1,
+                    "player_up": 1,
+                    "scores": {"1": 50},
+                    "timestamp": now - timedelta(minutes=10),
+                }
+            ],
+        )
+
+    query_log.clear()
+    async with database.AsyncSessionLocal() as session:
+        loaded = await live._load_games(session, None)
+        reloaded = await live._load_games(session, {live_ids[0], stale.id})
+
+    assert sorted(loaded) == live_ids
+    assert sorted(reloaded) == [live_ids[0]]
+    # Games, machines, players and bindings, then every game's states at once.
+    state_queries = [statement for statement in query_log if "FROM game_states" in statement.split("WHERE")[0]]
+    assert len(state_queries) == 2
+    assert loaded[live_ids[1]].live_state(now).scores[0].score == 300
+
+
 @pytest.mark.asyncio
 async def test_game_state_preserves_named_machine(async_client):
     async with database.AsyncSessionLocal() as session:
@@ -459,11 +775,7 @@ async def test_game_state_preserves_named_machine(async_client):
 
 
 @pytest.mark.asyncio
-async def test_ingest_game_state_prefers_reported_ip(monkeypatch):
-    async def fake_version(ip_address, attempts=2):
-        return None
-
-    monkeypatch.setattr(udp, "_fetch_machine_version", fake_version)
+async def test_ingest_game_state_prefers_reported_ip(no_version_fetch):
 
     async with database.AsyncSessionLocal() as session:
         await udp.ingest_game_state(
@@ -0,0 +1,105 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import update
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append("/workspace/the-box")
+
+from api_app.main import app  # noqa: E402
+from api_app import database, models, udp  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_discovered_directory_serves_polls_from_memory_with_etags(async_client, monkeypatch, no_version_fetch, query_log):
+    no_version_fetch.version = "1.2.3"
+    clock = [datetime(2024, 5, 1, 12, 0, 5, tzinfo=timezone.utc)]
+    monkeypatch.setattr(udp, "_utcnow", lambda: clock[0])
+
+    addresses = {"directory-a": "192.0.2.21", "directory-b": "192.0.2.22"}
+
+    async def packet(uid, **fields):
+        await udp._handle_game_state_message(
+            {"machine_id": uid, "gameTimeMs": 1_000, "ball_in_play": 1, "scores": [10], **fields}, addresses[uid]
+        )
+
+    await packet("directory-a")
+    await packet("directory-b")
+    async with database.AsyncSessionLocal() as session:
+        # An older machine record with the same uid and a leftover active game.
+        duplicate = models.Machine(
+            name="Old record", uid="directory-a", ip_address="192.0.2.99", last_seen=datetime(2020, 1, 1)
+        )
+        session.add_all([duplicate, models.Game(machine=duplicate, is_active=True)])
+        # The version check's flush stamps last_seen from the database clock.
+        seen = update(models.Machine).where(models.Machine.ip_address.in_(addresses.values()))
+        await session.execute(seen.values(last_seen=clock[0]))
+        await session.commit()
+
+    response = await async_client.get("/api/v1/games/discovered")
+    assert response.status_code == 200
+    games = response.json()
+    assert [game["machine_uid"] for game in games] == ["directory-b", "directory-a"]
+    assert all(game["machine_version"] == "1.2.3" and not game["has_password"] for game in games)
+    etag = response.headers["ETag"]
+
+    query_log.clear()
+    unchanged = await async_client.get("/api/v1/games/discovered", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert query_log == []
+
+    # A state packet only moves last_seen, which ingest applies in memory and
+    # the directory serves to the minute.
+    clock[0] += timedelta(seconds=30)
+    await packet("directory-a", scores=[20])
+    query_log.clear()
+    unmoved = await async_client.get("/api/v1/games/discovered", headers={"If-None-Match": etag})
+    assert unmoved.status_code == 304
+    assert query_log == []
+
+    clock[0] += timedelta(minutes=1)
+    await packet("directory-a", scores=[30])
+    query_log.clear()
+    moved = await async_client.get("/api/v1/games/discovered", headers={"If-None-Match": etag})
+    assert moved.status_code == 200
+    assert moved.headers["ETag"] != etag
+    assert query_log == []
+    assert [game["machine_uid"] for game in moved.json()] == ["directory-a", "directory-b"]
+    assert moved.json()[0]["machine_last_seen"].startswith("2024-05-01T12:01:00")
+
+    game_id = moved.json()[0]["id"]
+    response = await async_client.put(
+        f"/api/v1/admin/games/{game_id}/password", auth=("admin", "test-admin"), json={"password": "hunter2"}
+    )
+    assert response.status_code == 200
+    games = (await async_client.get("/api/v1/games/discovered")).json()
+    assert [(game["id"], game["has_password"]) for game in games][0] == (game_id, True)
+
+    await packet("directory-b", game_active=False)
+    games = (await async_client.get("/api/v1/games/discovered")).json()
+    assert [game["machine_uid"] for game in games] == ["directory-a"]
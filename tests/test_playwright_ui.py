@@ -230,7 +230,7 @@ def test_blank_leaderboard_renders_without_messages(page: Page, live_server: str
     }
 
     page.route(
-        "**/api/v1/leaderboard/summary",
+        "**/api/v1/leaderboard/summary*",
         lambda route: route.fulfill(
             status=200,
             content_type="application/json",
@@ -0,0 +1,115 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select, text
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import database, models, profiles  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+
+ADMIN = ("admin", "test-admin")
+HIGH_SCORE_SQL = (
+    "SELECT gp.player_id, MAX(value) AS score FROM game_states gs "
+    "CROSS JOIN json_each(gs.scores) AS j "
+    "JOIN game_players gp ON gp.game_id = gs.game_id AND gp.player_number = j.key "
+    "GROUP BY gp.player_id"
+)
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await database.init_db()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def _profile(slug: str, sql_template: str) -> dict:
+    return {"name": slug.title(), "slug": slug, "sql_template": sql_template, "sort_direction": "desc"}
+
+
+@pytest.mark.asyncio
+async def test_profile_is_compiled_and_plan_stored(async_client):
+    response = await async_client.post(
+        "/api/v1/tournaments/profiles", json=_profile("best-ball", HIGH_SCORE_SQL), auth=ADMIN
+    )
+    assert response.status_code == 201
+    payload = response.json()
+    assert payload["compiled_at"] is not None
+    assert any("ix_game_states_game_id_timestamp" in line for line in payload["query_plan"])
+
+    async with database.AsyncSessionLocal() as session:
+        profile = (
+            await session.execute(select(models.LeaderboardProfile).where(models.LeaderboardProfile.slug == "best-ball"))
+        ).scalar_one()
+        assert "scoped_game_states gs" in profile.compiled_sql
+        seeded = (
+            await session.execute(select(models.LeaderboardProfile).where(models.LeaderboardProfile.slug == "high-score"))
+        ).scalar_one()
+        assert seeded.compiled_sql == profile.compiled_sql
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("sql_template", "reason"),
+    [
+        ("DELETE FROM players", "SELECT"),
+        ("SELECT 1 AS player_id, 1 AS score; DROP TABLE players", "single statement"),
+        ("SELECT gp.player_id FROM game_players gp", "invalid"),
+        ("SELECT gp.player_id, load_extension('evil') AS score FROM game_players gp", "invalid"),
+        (
+            "SELECT p.id AS player_id, (SELECT COUNT(*) FROM machines m WHERE m.name = p.initials) AS score "
+            "FROM players p",
+            "'machines' without using an index",
+        ),
+        (
+            # ``+ 0`` keeps SQLite from building an automatic index on either side.
+            "SELECT gp.player_id, MAX(gs.seconds_elapsed) AS score FROM game_players gp, game_states gs "
+            "WHERE gs.ball + 0 = gp.player_number + 0 GROUP BY gp.player_id",
+            "'game_states' for every row",
+        ),
+    ],
+)
+async def test_unsafe_or_unindexed_templates_are_rejected(async_client, sql_template, reason):
+    response = await async_client.post(
+        "/api/v1/tournaments/profiles", json=_profile("rejected", sql_template), auth=ADMIN
+    )
+    assert response.status_code == 400
+    assert reason in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_execution_is_interrupted_after_budget(monkeypatch):
+    slow_sql = profiles.build_statement(
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 50000000) "
+        "SELECT gp.player_id, (SELECT MAX(i) FROM n) AS score FROM game_players gp",
+        "desc",
+    )
+    params = {"machine_ids": None, "player_ids": None, "start_time": None, "end_time": None}
+    monkeypatch.setattr(database.settings, "PROFILE_QUERY_BUDGET_MS", 20)
+
+    async with database.AsyncSessionLocal() as session:
+        with pytest.raises(profiles.ProfileBudgetExceeded):
+            await profiles.execute(session, slow_sql, params)
+        # The connection stays usable and the handler is cleared.
+        assert (await session.execute(text("SELECT COUNT(*) FROM players"))).scalar_one() > 0
+        rows = await profiles.execute(session, profiles.build_statement(HIGH_SCORE_SQL, "desc"), params)
+        assert rows
@@ -0,0 +1,92 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import database, models  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+from api_app.routers import leaderboard as leaderboard_router  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await database.init_db()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_summary_is_computed_once_per_change(async_client, monkeypatch):
+    calls = 0
+    original_summary = leaderboard_router._summary
+
+    async def counting_summary(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return await original_summary(*args, **kwargs)
+
+    monkeypatch.setattr(leaderboard_router, "_summary", counting_summary)
+
+    first = await async_client.get("/api/v1/leaderboard/summary")
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    etag = first.headers["ETag"]
+
+    for _ in range(3):
+        again = await async_client.get("/api/v1/leaderboard/summary")
+        assert again.headers["X-Cache"] == "HIT"
+        assert again.content == first.content
+
+    revalidated = await async_client.get("/api/v1/leaderboard/summary", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag
+    assert calls == 1
+
+    # Query parameters are part of the key.
+    paged = await async_client.get("/api/v1/leaderboard/summary", params={"limit": 2})
+    assert paged.headers["X-Cache"] == "MISS"
+    assert calls == 2
+
+    async with database.AsyncSessionLocal() as session:
+        game = await session.get(models.Game, 1)
+        session.add(
+            models.GameState(game_id=game.id, seconds_elapsed=999, ball=3, player_up=1, scores={"1": 10**13})
+        )
+        await session.commit()
+
+    changed = await async_client.get("/api/v1/leaderboard/summary", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert calls == 3
+
+
+@pytest.mark.asyncio
+async def test_game_leaderboard_honours_if_none_match(async_client):
+    first = await async_client.get("/api/v1/leaderboard")
+    assert first.status_code == 200
+    assert first.json()
+
+    cached = await async_client.get(
+        "/api/v1/leaderboard", headers={"If-None-Match": f'W/{first.headers["ETag"]}, "other"'}
+    )
+    assert cached.status_code == 304
@@ -0,0 +1,134 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import database, models, retention  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(database.settings, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _create_finished_game(started: datetime, initials: str = "ARC") -> int:
+    async with database.AsyncSessionLocal() as session:
+        machine = models.Machine(name="Archive Table", uid=f"archive-{initials}", ip_address="10.0.0.9")
+        player = models.Player(initials=initials, screen_name="Archivist", email="arc@example.com")
+        game = models.Game(
+            machine=machine,
+            is_active=False,
+            start_time=started,
+            end_time=started + timedelta(minutes=20),
+        )
+        session.add_all([machine, player, game, models.GamePlayer(game=game, player=player, player_number=1)])
+
+        # Ball 1 has six rows, ball 2 has four rows; only the edges matter.
+        rows = [(1, 100 * step) for step in range(1, 7)] + [(2, 1_000 + 50 * step) for step in range(1, 5)]
+        for idx, (ball, score) in enumerate(rows):
+            session.add(
+                models.GameState(
+                    game=game,
+                    seconds_elapsed=idx * 10,
+                    ball=ball,
+                    player_up=1,
+                    scores={"1": score},
+                    timestamp=started + timedelta(seconds=idx * 10),
+                )
+            )
+        await session.commit()
+        return game.id
+
+
+async def _state_count(game_id: int) -> int:
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(func.count(models.GameState.id)).where(models.GameState.game_id == game_id)
+        )
+        return result.scalar_one()
+
+
+def test_rows_to_keep_preserves_transitions_and_final_row():
+    states = [
+        models.GameState(id=idx + 1, ball=ball, player_up=player_up, scores={"1": score})
+        for idx, (ball, player_up, score) in enumerate(
+            [(1, 1, 10), (1, 1, 20), (1, 1, 30), (1, 2, 30), (1, 2, 30), (2, 1, 40), (2, 1, 50)]
+        )
+    ]
+
+    assert retention._rows_to_keep(states) == {1, 3, 4, 5, 6, 7}
+
+
+@pytest.mark.asyncio
+async def test_retention_downsamples_old_games_and_archives_timeline(async_client):
+    game_id = await _create_finished_game(datetime.now(timezone.utc) - timedelta(days=400))
+
+    before = await async_client.get("/api/v1/leaderboard")
+
+    report = await retention.run_retention(retention_days=30)
+    assert report.games_compacted == 1
+    assert report.rows_archived == 10
+    assert report.rows_deleted == 6
+    assert report.archived_bytes > 0
+    assert report.remaining_games == 0
+    assert await _state_count(game_id) == 4
+
+    after = await async_client.get("/api/v1/leaderboard")
+    assert after.json() == before.json()
+
+    replay = await async_client.get(f"/api/v1/games/{game_id}/states")
+    assert replay.status_code == 200
+    assert [state["scores"]["1"] for state in replay.json()] == [
+        100, 200, 300, 400, 500, 600, 1_050, 1_100, 1_150, 1_200,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_retention_is_incremental_and_skips_recent_games():
+    old_game = await _create_finished_game(datetime.now(timezone.utc) - timedelta(days=400))
+    recent_game = await _create_finished_game(datetime.now(timezone.utc) - timedelta(days=2), "NEW")
+
+    first = await retention.run_retention(retention_days=30)
+    second = await retention.run_retention(retention_days=30)
+
+    assert first.games_compacted == 1
+    assert second.games_compacted == 0
+    assert await _state_count(old_game) == 4
+    assert await _state_count(recent_game) == 10
+
+
+@pytest.mark.asyncio
+async def test_admin_can_trigger_retention(async_client):
+    await _create_finished_game(datetime.now(timezone.utc) - timedelta(days=400))
+
+    unauthorized = await async_client.post("/api/v1/admin/retention/run")
+    assert unauthorized.status_code == 401
+
+    response = await async_client.post("/api/v1/admin/retention/run", auth=("admin", "test-admin"))
+    assert response.status_code == 200
+    assert response.json()["games_compacted"] == 1
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import database, models, standings  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+
+HIGH_SCORE_SQL = (
+    "SELECT gp.player_id, MAX(value) AS score FROM game_states gs "
+    "CROSS JOIN json_each(gs.scores) AS j "
+    "JOIN game_players gp ON gp.game_id = gs.game_id AND gp.player_number = j.key "
+    "GROUP BY gp.player_id"
+)
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    standings.cache.start()
+    yield
+    await standings.cache.stop()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _seed(now: datetime, *, end_time: datetime | None = None) -> dict[str, int]:
+    async with database.AsyncSessionLocal() as session:
+        enrolled = models.Machine(name="Enrolled", uid="enrolled", ip_address="10.0.0.1")
+        other = models.Machine(name="Other", uid="other", ip_address="10.0.0.2")
+        player = models.Player(initials="ACE")
+        profile = models.LeaderboardProfile(name="High Score", slug="high-score", sql_template=HIGH_SCORE_SQL)
+        tournament = models.Tournament(
+            name="Weekend",
+            slug="weekend",
+            scoring_profile=profile,
+            start_time=now - timedelta(days=1),
+            end_time=end_time,
+            display_until=now + timedelta(days=1),
+            machines=[models.TournamentMachine(machine=enrolled)],
+        )
+        games = {}
+        for key, machine in (("enrolled", enrolled), ("other", other)):
+            game = models.Game(machine=machine, is_active=True, start_time=now - timedelta(hours=1))
+            session.add(models.GamePlayer(game=game, player=player, player_number=1))
+            session.add(
+                models.GameState(
+                    game=game,
+                    seconds_elapsed=10,
+                    ball=1,
+                    player_up=1,
+                    scores={"1": 1_000},
+                    timestamp=now - timedelta(hours=1),
+                )
+            )
+            games[key] = game
+        session.add(tournament)
+        await session.commit()
+        return {key: game.id for key, game in games.items()}
+
+
+async def _add_state(game_id: int, score: int, at: datetime) -> None:
+    async with database.AsyncSessionLocal() as session:
+        session.add(
+            models.GameState(
+                game_id=game_id, seconds_elapsed=30, ball=2, player_up=1, scores={"1": score}, timestamp=at
+            )
+        )
+        await session.commit()
+
+
+async def _tournament_scores(client: AsyncClient) -> list[int]:
+    response = await client.get("/api/v1/leaderboard/summary")
+    assert response.status_code == 200
+    return [entry["score"] for entry in response.json()["tournaments"][0]["leaderboard"]]
+
+
+@pytest.mark.asyncio
+async def test_standings_refresh_in_background_for_enrolled_machines(async_client, monkeypatch):
+    now = datetime.now(timezone.utc)
+    games = await _seed(now)
+
+    computed = []
+    release = asyncio.Event()
+    original = standings.compute_standings
+
+    async def counting(db, tournament):
+        computed.append(tournament.id)
+        if len(computed) > 1:
+            await release.wait()
+        return await original(db, tournament)
+
+    monkeypatch.setattr(standings, "compute_standings", counting)
+    monkeypatch.setattr(database.settings, "RESPONSE_CACHE_TTL_SECONDS", 0)
+
+    assert await _tournament_scores(async_client) == [1_000]
+    assert await _tournament_scores(async_client) == [1_000]
+    assert len(computed) == 1
+
+    # A state on a machine outside the tournament leaves the watermark alone.
+    await _add_state(games["other"], 9_000, now)
+    await standings.cache.wait_idle()
+    assert len(computed) == 1
+
+    await _add_state(games["enrolled"], 5_000, now)
+    # Reads keep serving the cached board while the worker recomputes.
+    assert await _tournament_scores(async_client) == [1_000]
+    release.set()
+    await standings.cache.wait_idle()
+    assert len(computed) == 2
+    assert await _tournament_scores(async_client) == [5_000]
+
+
+@pytest.mark.asyncio
+async def test_finished_tournament_is_frozen(async_client, monkeypatch):
+    now = datetime.now(timezone.utc)
+    games = await _seed(now, end_time=now - timedelta(minutes=5))
+    monkeypatch.setattr(database.settings, "RESPONSE_CACHE_TTL_SECONDS", 0)
+
+    assert await _tournament_scores(async_client) == [1_000]
+
+    # A late state inside the tournament window no longer changes the board.
+    await _add_state(games["enrolled"], 7_000, now - timedelta(minutes=10))
+    await standings.cache.wait_idle()
+    assert await _tournament_scores(async_client) == [1_000]
+
+    async with database.AsyncSessionLocal() as session:
+        tournament = await session.get(models.Tournament, 1)
+        tournament.description = "Edited after the fact"
+        await session.commit()
+
+    # Editing the tournament itself still recomputes it.
+    await _tournament_scores(async_client)
+    await standings.cache.wait_idle()
+    assert await _tournament_scores(async_client) == [7_000]
+
+
+async def _add_tournaments(count: int, now: datetime) -> None:
+    async with database.AsyncSessionLocal() as session:
+        for index in range(count):
+            session.add(
+                models.Tournament(
+                    name=f"Side event {index}",
+                    slug=f"side-{index}",
+                    scoring_profile_id=1,
+                    start_time=now - timedelta(days=1),
+                    display_until=now + timedelta(days=1),
+                )
+            )
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_tournaments_evaluate_concurrently_with_cap_and_timeout(async_client, monkeypatch):
+    await standings.cache.stop()
+    now = datetime.now(timezone.utc)
+    await _seed(now)
+    await _add_tournaments(3, now)
+    monkeypatch.setattr(database.settings, "RESPONSE_CACHE_TTL_SECONDS", 0)
+    monkeypatch.setattr(database.settings, "STANDINGS_CONCURRENCY", 2)
+
+    running = 0
+    peak = 0
+    delay = 0.05
+    original = standings.compute_standings
+
+    async def slow(db, tournament):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            await asyncio.sleep(delay)
+            return await original(db, tournament)
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(standings, "compute_standings", slow)
+
+    response = await async_client.get("/api/v1/leaderboard/summary")
+    boards = response.json()["tournaments"]
+    assert len(boards) == 4
+    assert all(board["leaderboard"][0]["score"] == 1_000 for board in boards)
+    assert peak == 2
+
+    # A profile edit forces a recompute that now overruns its timeout; the
+    # previous standings are served instead of blocking the summary.
+    monkeypatch.setattr(database.settings, "STANDINGS_TIMEOUT_SECONDS", 0.05)
+    delay = 1
+    async with database.AsyncSessionLocal() as session:
+        profile = await session.get(models.LeaderboardProfile, 1)
+        profile.description = "Edited"
+        await session.commit()
+
+    started = asyncio.get_running_loop().time()
+    boards = (await async_client.get("/api/v1/leaderboard/summary")).json()["tournaments"]
+    assert asyncio.get_running_loop().time() - started < delay
+    assert [board["leaderboard"][0]["score"] for board in boards] == [1_000] * 4
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import database, leaderboard_engine, main, sample_data  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+async def _schema_meta() -> dict[str, str]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(text("SELECT key, value FROM schema_meta"))
+        return {key: value for key, value in rows}
+
+
+@pytest.mark.asyncio
+async def test_first_boot_creates_schema_and_records_versions():
+    timings = await database.init_db()
+
+    assert {"schema_check", "schema_create", "seed", "total"} <= set(timings)
+    assert await _schema_meta() == {
+        "schema_version": str(database.SCHEMA_VERSION),
+        "seed_version": str(sample_data.SEED_VERSION),
+    }
+
+
+@pytest.mark.asyncio
+async def test_warm_boot_skips_schema_creation_and_seeding(monkeypatch):
+    await database.init_db()
+
+    async def fail_seed(session):
+        raise AssertionError("seed should be skipped once recorded")
+
+    def fail_create_all(*args, **kwargs):
+        raise AssertionError("create_all should be skipped once recorded")
+
+    monkeypatch.setattr(sample_data, "seed_example_data", fail_seed)
+    monkeypatch.setattr(Base.metadata, "create_all", fail_create_all)
+
+    timings = await database.init_db()
+    assert set(timings) == {"schema_check", "total"}
+
+
+@pytest.mark.asyncio
+async def test_schema_version_bump_applies_upgrades(monkeypatch):
+    await database.init_db()
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP INDEX ix_game_states_game_id_timestamp"))
+
+    monkeypatch.setattr(database, "SCHEMA_VERSION", database.SCHEMA_VERSION + 1)
+    timings = await database.init_db()
+
+    assert "schema_create" in timings
+    assert "seed" not in timings
+    async with engine.connect() as conn:
+        indexes = await conn.execute(text("PRAGMA index_list('game_states')"))
+        assert "ix_game_states_game_id_timestamp" in {row[1] for row in indexes}
+    assert (await _schema_meta())["schema_version"] == str(database.SCHEMA_VERSION)
+
+
+@pytest.mark.asyncio
+async def test_startup_does_not_wait_for_read_models(monkeypatch):
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_rebuild():
+        started.set()
+        await release.wait()
+
+    monkeypatch.setattr(leaderboard_engine.engine, "rebuild", slow_rebuild)
+    async with main.lifespan(main.app):
+        # Ready while the leaderboards are still being built.
+        await asyncio.wait_for(started.wait(), timeout=1)
+        assert not release.is_set()
+        # Shutdown lets the warm-up finish rather than cancelling it mid-query.
+        release.set()
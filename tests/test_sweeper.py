@@ -0,0 +1,105 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append("/workspace/the-box")
+
+from api_app.main import app  # noqa: E402
+from api_app import changes, database, live, models, sweeper  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _game_with_states(session, *, uid: str, started: datetime, timestamps: list[datetime]) -> int:
+    machine = models.Machine(name="Test Machine", uid=uid, ip_address="192.0.2.10", last_seen=timestamps[-1])
+    game = models.Game(machine=machine, is_active=True, start_time=started)
+    states = [
+        models.GameState(
+            game=game, seconds_elapsed=second, ball=1, player_up=1, scores={"1": 100 * second}, timestamp=timestamp
+        )
+        for second, timestamp in enumerate(timestamps, start=1)
+    ]
+    session.add_all([machine, game, *states])
+    await session.commit()
+    return game.id
+
+
+@pytest.mark.asyncio
+async def test_sweeper_closes_silent_games_at_their_last_state(async_client, monkeypatch):
+    now = datetime.now(timezone.utc)
+    last_seen = now - timedelta(minutes=30)
+    async with database.AsyncSessionLocal() as session:
+        silent = [
+            await _game_with_states(
+                session,
+                uid=f"silent-{index}",
+                started=last_seen - timedelta(minutes=5),
+                timestamps=[last_seen - timedelta(seconds=10 - second) for second in range(1, 11)],
+            )
+            for index in range(3)
+        ]
+        playing = await _game_with_states(
+            session, uid="still-playing", started=now - timedelta(minutes=1), timestamps=[now - timedelta(seconds=5)]
+        )
+
+    await live.store.rebuild()
+    published: list[changes.ChangeSet] = []
+    monkeypatch.setattr(changes, "_subscribers", [*changes._subscribers, published.append])
+    monkeypatch.setattr(sweeper, "SWEEP_CHUNK_SIZE", 2)
+    runs = sweeper.metrics.runs
+
+    report = await sweeper.run_sweep(now=now, idle_seconds=15 * 60)
+    assert report.games_closed == 3
+    assert report.timelines_stored == 3
+
+    async with database.AsyncSessionLocal() as session:
+        games = {game.id: game for game in (await session.execute(select(models.Game))).scalars()}
+        ends = (
+            await session.execute(select(models.GameEvent.game_id).where(models.GameEvent.kind == "end"))
+        ).scalars().all()
+        stored = (await session.execute(select(models.GameTimeline.game_id))).scalars().all()
+    for game_id in silent:
+        assert not games[game_id].is_active
+        assert games[game_id].end_time.replace(tzinfo=timezone.utc) == last_seen
+    assert games[playing].is_active
+    assert sorted(ends) == sorted(stored) == silent
+
+    # Read models hear about the closed games only, never a full table.
+    assert [sorted(change.game_ids) for change in published] == [silent[:2], silent[2:]]
+    assert not any(change.full_tables for change in published)
+    assert list(await live.store.states()) == [playing]
+
+    assert (await sweeper.run_sweep(now=now, idle_seconds=15 * 60)).games_closed == 0
+    assert sweeper.metrics.runs == runs + 2
+    assert sweeper.metrics.last_games_closed == 0
+
+    response = await async_client.post("/api/v1/admin/sweeper/run", auth=("admin", "test-admin"))
+    assert response.status_code == 200
+    assert response.json()["games_closed"] == 0
+    response = await async_client.get("/api/v1/admin/sweeper", auth=("admin", "test-admin"))
+    assert response.json()["runs"] == runs + 3
+    assert (await async_client.get("/api/v1/admin/sweeper")).status_code == 401
@@ -0,0 +1,187 @@
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("ADMIN_PASSWORD", "test-admin")
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from api_app import database, models, score_history, timeline, udp  # noqa: E402
+from api_app.database import Base, engine  # noqa: E402
+from api_app.main import app  # noqa: E402
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def _sample_states(count: int = 200) -> list[models.GameState]:
+    start = datetime(2024, 5, 1, 20, 0, tzinfo=timezone.utc)
+    states = []
+    scores = {"1": 0, "2": 0, "3": 0}
+    for idx in range(count):
+        player_up = (idx // 20) % 3 + 1
+        scores[str(player_up)] += 1_250 * (idx % 7)
+        states.append(
+            models.GameState(
+                id=idx + 1,
+                timestamp=start + timedelta(milliseconds=750 * idx),
+                seconds_elapsed=idx,
+                ball=idx // 60 + 1,
+                player_up=player_up,
+                scores=dict(scores),
+            )
+        )
+    return states
+
+
+def test_timeline_round_trip_is_lossless_and_compact():
+    states = _sample_states()
+
+    blob = timeline.encode_states(states)
+    decoded = timeline.decode_timeline(blob, game_id=7)
+
+    assert len(decoded) == len(states)
+    for original, restored in zip(states, decoded):
+        assert restored.timestamp == original.timestamp
+        assert restored.seconds_elapsed == original.seconds_elapsed
+        assert restored.ball == original.ball
+        assert restored.player_up == original.player_up
+        assert restored.scores == original.scores
+        assert restored.game_id == 7
+
+    json_size = sum(len(json.dumps(state.scores)) for state in states)
+    assert len(blob) < json_size / 4
+
+
+@pytest.mark.asyncio
+async def test_finished_game_reads_use_compact_timeline(async_client, no_version_fetch):
+    async with database.AsyncSessionLocal() as session:
+        for score in (1_000, 4_000, 9_000):
+            await udp.ingest_game_state(
+                session,
+                {"machine_id": "compact-uid", "scores": [score, 0], "ball_in_play": 1, "gameTimeMs": score},
+                "10.0.0.5",
+            )
+        game_id = (await session.get(models.GameState, 1)).game_id
+        await udp.ingest_game_state(session, {"machine_id": "compact-uid", "game_active": False}, "10.0.0.5")
+
+    async with database.AsyncSessionLocal() as session:
+        record = await session.get(models.GameTimeline, game_id)
+        assert record is not None
+        assert record.state_count == 3
+
+        # Dropping the opening row (as retention would) must not change replays.
+        await session.delete(await session.get(models.GameState, 1))
+        await session.commit()
+
+    response = await async_client.get(f"/api/v1/games/{game_id}/live")
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["is_active"] is False
+    assert payload["scores"][0]["ball_times"] == [
+        {"ball": 1, "seconds": 8, "score": 8_000, "is_current": True}
+    ]
+
+    async with database.AsyncSessionLocal() as session:
+        session.add(
+            models.GameState(game_id=game_id, seconds_elapsed=20, ball=2, player_up=1, scores={"1": 9_500})
+        )
+        await session.commit()
+
+        # A state written after encoding makes the stored timeline stale.
+        assert await timeline.load_timeline(session, game_id) is None
+
+
+@pytest.mark.asyncio
+async def test_score_timeline_is_downsampled_and_cached_for_finished_games(async_client, monkeypatch):
+    async with database.AsyncSessionLocal() as session:
+        machine = models.Machine(name="Chart", uid="chart-uid", ip_address="10.0.0.9")
+        player = models.Player(initials="CHT", screen_name="Charter")
+        game = models.Game(machine=machine, is_active=False)
+        session.add_all([machine, player, game, models.GamePlayer(game=game, player=player, player_number=1)])
+        await session.flush()
+        states = _sample_states(1_000)
+        for state in states:
+            state.id = None
+            state.game = game
+        session.add_all(states)
+        await session.flush()
+        await timeline.store_timeline(session, game.id, states)
+        await session.commit()
+        game_id, player_id = game.id, player.id
+
+    response = await async_client.get(f"/api/v1/games/{game_id}/timeline", params={"points": 40})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["state_count"], body["is_active"]) == (1_000, False)
+    assert [ball["ball"] for ball in body["balls"]] == list(range(1, 18))
+    series = {entry["player_number"]: entry for entry in body["players"]}
+    assert series[1]["initials"] == "CHT"
+    for player_number, entry in series.items():
+        assert 2 <= len(entry["points"]) <= 40
+        assert entry["points"][-1]["score"] == states[-1].scores[str(player_number)]
+        assert [point["seconds"] for point in entry["points"]] == sorted(point["seconds"] for point in entry["points"])
+
+    # Served from the cache; player names are still read fresh.
+    async def no_load(db, game):
+        raise AssertionError("finished game series should be cached")
+
+    monkeypatch.setattr(score_history, "_load_states", no_load)
+    async with database.AsyncSessionLocal() as session:
+        (await session.get(models.Player, player_id)).initials = "NEW"
+        await session.commit()
+    cached = await async_client.get(f"/api/v1/games/{game_id}/timeline", params={"points": 40})
+    assert cached.json()["players"][0]["initials"] == "NEW"
+    assert cached.json()["players"][0]["points"] == body["players"][0]["points"]
+
+    # A write to the game drops its entries.
+    monkeypatch.undo()
+    async with database.AsyncSessionLocal() as session:
+        session.add(
+            models.GameState(
+                game_id=game_id,
+                timestamp=states[-1].timestamp + timedelta(seconds=1),
+                seconds_elapsed=1_000,
+                ball=17,
+                player_up=1,
+                scores={**states[-1].scores, "1": 99_999_999},
+            )
+        )
+        await session.commit()
+    updated = await async_client.get(f"/api/v1/games/{game_id}/timeline", params={"points": 40})
+    assert updated.json()["state_count"] == 1_001
+    assert updated.json()["players"][0]["points"][-1] == {"seconds": 1_000, "score": 99_999_999}
+
+    assert (await async_client.get("/api/v1/games/999/timeline")).status_code == 404
+    assert (await async_client.get(f"/api/v1/games/{game_id}/timeline", params={"points": 1})).status_code == 422
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    points = [(x, 0) for x in range(100)]
+    points[37] = (37, 500)
+    sampled = score_history.lttb(points, 10)
+    assert len(sampled) == 10
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert (37, 500) in sampled
+    assert score_history.lttb(points[:5], 10) == points[:5]